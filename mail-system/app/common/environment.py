@@ -23,6 +23,13 @@ class Config:
     GPU_HOST = os.getenv("GPU_HOST")
     GPU_MODEL = os.getenv("GPU_MODEL")
     GPU_URL = os.getenv("GPU_URL")
+    # comma-separated list of Ollama URLs to balance requests over (default: GPU_URL)
+    GPU_URLS = os.getenv("GPU_URLS", os.getenv("GPU_URL", ""))
+
+    # classification only needs a short JSON object, so it can run on a smaller model than the answers
+    CLASSIFY_MODEL = os.getenv("CLASSIFY_MODEL")
+    CLASSIFY_MAX_TOKENS = int(os.getenv("CLASSIFY_MAX_TOKENS", "128"))
+    CLASSIFY_TEMPERATURE = float(os.getenv("CLASSIFY_TEMPERATURE", "0.2"))
 
     USE_LOCAL_MODEL = os.getenv("USE_LOCAL_MODEL", "false")
     LOCAL_API_KEY = os.getenv("LOCAL_API_KEY", "lm-studio")
@@ -1,4 +1,5 @@
 import logging
+from typing import Any
 
 from openai import OpenAI
 
@@ -12,6 +13,7 @@ class LocalBaseModel(OpenAIBaseModel):
     max_tokens: int = 800
     temperature: float = 0.3
 
-    def __init__(self, endpoint, api_key: str, **kwargs):
-        client = OpenAI(base_url=endpoint, api_key=api_key)
+    def model_post_init(self, __context: Any) -> None:
+        self._client = OpenAI(base_url=self.endpoint, api_key=self.api_key)
         logging.info("Local lms API key set.")
+        self.init_model()
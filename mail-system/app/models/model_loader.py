@@ -2,6 +2,7 @@ from app.common.environment import config
 from app.models.base_model import BaseModelClient
 from app.models.local_model import LocalBaseModel
 from app.models.ollama_model import OllamaModel
+from app.models.ollama_pool_model import OllamaPoolModel
 from app.models.openai_azure_model import AzureOpenAIBaseModel
 from app.models.openai_model import OpenAIBaseModel
 
@@ -9,16 +10,24 @@ default_model_name = "llama3.1:70b"
 
 
 def get_model_client() -> BaseModelClient:
+    """Returns the client used for email classification (CLASSIFY_MODEL overrides the provider's model)."""
     use_openai = config.USE_OPENAI.lower() == "true"
     local = config.USE_LOCAL_MODEL.lower() == "true"
+    options = {"max_tokens": config.CLASSIFY_MAX_TOKENS, "temperature": config.CLASSIFY_TEMPERATURE}
     if local:
-        return LocalBaseModel(model=config.LOCAL_MODEL,
-                              api_key=config.LOCAL_API_KEY, endpoint=config.LOCAL_ENDPOINT)
+        return LocalBaseModel(model=config.CLASSIFY_MODEL or config.LOCAL_MODEL,
+                              api_key=config.LOCAL_API_KEY, endpoint=config.LOCAL_ENDPOINT, **options)
     elif use_openai:
+        model = config.CLASSIFY_MODEL or config.OPENAI_MODEL
         if not config.USE_AZURE == "true":
-            return OpenAIBaseModel(model=config.OPENAI_MODEL, api_key=config.OPENAI_API_KEY)
+            return OpenAIBaseModel(model=model, api_key=config.OPENAI_API_KEY, **options)
         else:
-            return AzureOpenAIBaseModel(model=config.OPENAI_MODEL, azure_version=config.AZURE_VERSION,
-                                        api_key=config.OPENAI_API_KEY, azure_endpoint=config.AZURE_ENDPOINT)
+            return AzureOpenAIBaseModel(model=model, azure_version=config.AZURE_VERSION,
+                                        api_key=config.OPENAI_API_KEY, azure_endpoint=config.AZURE_ENDPOINT,
+                                        **options)
     else:
-        return OllamaModel(model=config.GPU_MODEL, url=config.GPU_URL)
+        model = config.CLASSIFY_MODEL or config.GPU_MODEL
+        urls = [url.strip() for url in (config.GPU_URLS or "").split(",") if url.strip()]
+        if len(urls) > 1:
+            return OllamaPoolModel(model=model, urls=urls, **options)
+        return OllamaModel(model=model, url=urls[0] if urls else config.GPU_URL, **options)
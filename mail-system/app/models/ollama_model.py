@@ -21,6 +21,8 @@ def create_auth_header() -> Dict[str, str]:
 
 class OllamaModel(BaseModelClient):
     url: str
+    max_tokens: int = 128
+    temperature: float = 0.2
     headers: Optional[Dict[str, str]] = None
     session: requests.Session = None
 
@@ -41,7 +43,8 @@ class OllamaModel(BaseModelClient):
             response = self.session.post(
                 f"{self.url}chat",
                 json={"model": self.model, "messages": prompt, "stream": False,
-                      "options": {"temperature": 0.2, "max_tokens": 128}, "format": "json"},
+                      "options": {"temperature": self.temperature, "num_predict": self.max_tokens},
+                      "format": "json"},
 
                 headers=self.headers,
             )
@@ -0,0 +1,78 @@
+import itertools
+import logging
+import threading
+import time
+from typing import Any, List
+
+from pydantic import ConfigDict, PrivateAttr
+
+from app.models.base_model import BaseModelClient
+from app.models.ollama_model import OllamaModel
+
+
+class OllamaPoolModel(BaseModelClient):
+    """
+    Sends each request to the Ollama host with the fewest in-flight requests.
+    A host whose request fails `max_failures` times in a row is skipped for `ejection_seconds` and then tried again.
+    """
+    urls: List[str]
+    max_tokens: int = 128
+    temperature: float = 0.2
+    max_failures: int = 3
+    ejection_seconds: float = 30.0
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    _hosts: List[OllamaModel] = PrivateAttr(default_factory=list)
+    _in_flight: List[int] = PrivateAttr(default_factory=list)
+    _failures: List[int] = PrivateAttr(default_factory=list)
+    _ejected_until: List[float] = PrivateAttr(default_factory=list)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _rotation: Any = PrivateAttr(default_factory=itertools.count)
+
+    def model_post_init(self, __context: Any) -> None:
+        logging.info(f"Initializing Ollama pool with {len(self.urls)} hosts")
+        # Every OllamaModel warms up its host when created
+        self._hosts = [OllamaModel(model=self.model, url=url, max_tokens=self.max_tokens,
+                                   temperature=self.temperature) for url in self.urls]
+        self._in_flight = [0] * len(self._hosts)
+        self._failures = [0] * len(self._hosts)
+        self._ejected_until = [0.0] * len(self._hosts)
+
+    def _acquire(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [i for i in range(len(self._hosts)) if self._ejected_until[i] <= now]
+            if not candidates:
+                candidates = [min(range(len(self._hosts)), key=lambda i: self._ejected_until[i])]
+            offset = next(self._rotation) % len(candidates)
+            candidates = candidates[offset:] + candidates[:offset]
+            index = min(candidates, key=lambda i: self._in_flight[i])
+            self._in_flight[index] += 1
+        return index
+
+    def _release(self, index: int, succeeded: bool):
+        with self._lock:
+            self._in_flight[index] -= 1
+            if succeeded:
+                self._failures[index] = 0
+                return
+            self._failures[index] += 1
+            if self._failures[index] >= self.max_failures:
+                self._failures[index] = 0
+                self._ejected_until[index] = time.monotonic() + self.ejection_seconds
+                logging.warning(f"Ejecting Ollama host {self.urls[index]} for {self.ejection_seconds:.0f}s")
+
+    def complete(self, prompt: list) -> str:
+        index = self._acquire()
+        result = None
+        try:
+            result = self._hosts[index].complete(prompt)
+            return result
+        finally:
+            # OllamaModel logs errors and returns None instead of raising
+            self._release(index, result is not None)
+
+    def close_session(self):
+        for host in self._hosts:
+            host.close_session()
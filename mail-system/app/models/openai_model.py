@@ -9,6 +9,7 @@ from app.models.base_model import BaseModelClient
 class OpenAIBaseModel(BaseModelClient):
     api_key: str
     temperature: float = 0.3
+    max_tokens: int = 128
     _client: OpenAI
 
     def model_post_init(self, __context: Any) -> None:
@@ -46,6 +47,7 @@ class OpenAIBaseModel(BaseModelClient):
             messages=prompt,
             model=self.model,
             temperature=self.temperature,
+            max_tokens=self.max_tokens,
             response_format={
                 "type": "json_schema",
                 "json_schema": json_schema
@@ -2,8 +2,10 @@ import logging
 
 from fastapi import APIRouter, Depends
 
-from app.utils.dependencies import weaviate_manager, model
+from app.utils.dependencies import weaviate_manager, judge_model, auth_handler, ensure_ready
 from app.utils.environment import config
+from app.utils.metrics import metrics
+from app.utils.usage import usage_ledger
 
 
 admin_router = APIRouter(prefix="/api/admin", tags=["settings", "admin"])
@@ -14,7 +16,19 @@ async def ping():
     return {"answer": "Server running."}
 
 
-@admin_router.get("/hi")
+@admin_router.get("/hi", dependencies=[Depends(ensure_ready)])
 async def ping():
     logging.info("hi")
-    return model.complete([{"role": "user", "content": "Hi"}])
\ No newline at end of file
+    # A short exchange like the judge's, so it goes to the (possibly smaller) judge model
+    return await judge_model.acomplete([{"role": "user", "content": "Hi"}])
+
+
+@admin_router.get("/metrics", dependencies=[Depends(auth_handler.verify_api_key)])
+async def get_metrics():
+    return metrics.snapshot()
+
+
+@admin_router.get("/usage", dependencies=[Depends(auth_handler.verify_api_key)])
+async def get_usage():
+    """Token usage and estimated cost since startup, per organisation, endpoint, pipeline stage and model."""
+    return usage_ledger.snapshot()
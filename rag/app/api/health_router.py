@@ -0,0 +1,27 @@
+from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
+
+from app.utils.circuit_breaker import circuit_breakers
+from app.utils.dependencies import bootstrap_state
+
+health_router = APIRouter(tags=["health"])
+
+
+@health_router.get("/live")
+async def live():
+    """Liveness probe: the process is up and serving requests."""
+    return {"status": "alive"}
+
+
+@health_router.get("/ready")
+async def ready():
+    """
+    Readiness probe: all dependencies are initialized and requests can be answered.
+
+    Open circuit breakers only mark the instance as degraded: the outage affects every instance alike and
+    requests are still answered from the fallbacks, so it stays in rotation.
+    """
+    breakers = circuit_breakers.snapshot()
+    content = {**bootstrap_state.to_dict(), "circuit_breakers": breakers,
+               "degraded": any(breaker["state"] != "closed" for breaker in breakers.values())}
+    return ORJSONResponse(content=content, status_code=200 if bootstrap_state.ready else 503)
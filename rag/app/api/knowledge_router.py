@@ -2,10 +2,10 @@ from typing import List
 import logging
 from fastapi import HTTPException, APIRouter, status, Response, Depends
 from app.data.knowledge_base_requests import AddWebsiteRequest, EditDocumentRequest, EditSampleQuestionRequest, EditWebsiteRequest, AddDocumentRequest, AddSampleQuestionRequest, RefreshContentRequest
-from app.utils.dependencies import injestion_handler, auth_handler
+from app.utils.dependencies import injestion_handler, auth_handler, ensure_ready
 from app.data.database_requests import DatabaseDocumentMetadata
 
-knowledge_router = APIRouter(prefix="/api/knowledge", tags=["knowledge"])
+knowledge_router = APIRouter(prefix="/api/knowledge", tags=["knowledge"], dependencies=[Depends(ensure_ready)])
 
 # === Website Endpoints ===
 
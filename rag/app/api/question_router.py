@@ -1,12 +1,24 @@
 import logging
+from functools import partial
+from typing import Awaitable, Callable
 
 from fastapi import HTTPException, APIRouter, Depends, Query
 
-from app.data.user_requests import UserChat, UserRequest
-from app.utils.dependencies import request_handler, auth_handler
+from app.data.user_requests import UserBatchRequest, UserChat, UserRequest
+from app.utils.dependencies import request_handler, auth_handler, ensure_ready, single_flight, admission_controller
+from app.utils.deadline import deadline_scope
 from app.utils.environment import config
+from app.utils.single_flight import normalize_question
+from app.utils.usage import usage_scope
+
+question_router = APIRouter(prefix="/api/v1/question", tags=["response"], dependencies=[Depends(ensure_ready)])
+
+
+async def admitted(endpoint: str, org_id: int, handle: Callable[[], Awaitable[str]]) -> str:
+    """Runs the handler once the admission controller lets the request in (requests sharing an answer wait once)."""
+    async with admission_controller.slot(endpoint, org_id):
+        return await handle()
 
-question_router = APIRouter(prefix="/api/v1/question", tags=["response"])
 
 @question_router.post("/ask", tags=["email"], dependencies=[Depends(auth_handler.verify_api_key)])
 async def ask(request: UserRequest):
@@ -18,7 +30,12 @@ async def ask(request: UserRequest):
     if not question or not classification:
         raise HTTPException(status_code=400, detail="No question or classification provided")
     
-    answer = request_handler.handle_question(question, classification, language, org_id=org_id)
+    with usage_scope(org_id=org_id, endpoint="ask"), \
+            deadline_scope(config.ASK_DEADLINE_SECONDS, reserve=config.DEADLINE_RESERVE_SECONDS):
+        # Identical questions that arrive while one is being answered share its answer
+        key = ("ask", normalize_question(question), org_id, classification, language)
+        handle = partial(request_handler.handle_question, question, classification, language, org_id=org_id)
+        answer = await single_flight.do("ask", key, partial(admitted, "ask", org_id, handle))
     return {"answer": answer}
 
     # Uncomment to use test mode and calculate RAG metrics
@@ -34,6 +51,26 @@ async def ask(request: UserRequest):
     #     return {"answer": answer}
 
 
+@question_router.post("/ask/batch", tags=["email"], dependencies=[Depends(auth_handler.verify_api_key)])
+async def ask_batch(request: UserBatchRequest):
+    questions = request.questions
+
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions provided")
+    if len(questions) > config.ASK_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {config.ASK_BATCH_MAX_SIZE} questions per batch")
+    if any(not question.message or not question.study_program for question in questions):
+        raise HTTPException(status_code=400, detail="No question or classification provided")
+
+    # The shared embedding call is booked to the organisation of the first question, everything else per question
+    with usage_scope(org_id=questions[0].org_id, endpoint="ask_batch"):
+        answers = await request_handler.handle_questions(
+            questions, max_parallel=config.ASK_BATCH_PARALLELISM,
+            deadline_seconds=config.ASK_DEADLINE_SECONDS, deadline_reserve=config.DEADLINE_RESERVE_SECONDS,
+            admit=partial(admission_controller.slot, "ask"))
+    return {"answers": answers}
+
+
 @question_router.post("/chat", tags=["chatbot"], dependencies=[Depends(auth_handler.verify_api_key)])
 async def chat(
         request: UserChat,
@@ -45,11 +82,22 @@ async def chat(
     if not messages:
         raise HTTPException(status_code=400, detail="No messages have been provided")
 
-    answer = request_handler.handle_chat(
-        messages,
-        study_program=request.study_program,
-        org_id=org_id,
-        filter_by_org=filterByOrg
-    )
+    with usage_scope(org_id=org_id, endpoint="chat"), \
+            deadline_scope(config.CHAT_DEADLINE_SECONDS, reserve=config.DEADLINE_RESERVE_SECONDS):
+        handle = partial(
+            request_handler.handle_chat,
+            messages,
+            study_program=request.study_program,
+            org_id=org_id,
+            filter_by_org=filterByOrg,
+            conversation_id=request.conversationId
+        )
+        # Only first messages are shared, later ones depend on the history and sessions on their own state
+        if len(messages) == 1 and not request.conversationId:
+            key = ("chat", normalize_question(messages[0].message), org_id, (request.study_program or "").lower(),
+                   filterByOrg)
+            answer = await single_flight.do("chat", key, partial(admitted, "chat", org_id, handle))
+        else:
+            answer = await admitted("chat", org_id, handle)
 
     return {"answer": answer}
@@ -28,3 +28,9 @@ class SampleQuestion(BaseModel):
     question: str
     answer: str
     study_programs: List[str]
+    # Vector distance to the question it was retrieved for
+    distance: Optional[float] = None
+    # Rerank score for that question, once reranked
+    relevance_score: Optional[float] = None
+    # Whether the score came from the reranker, not a placeholder of a skipped or failed rerank
+    reranked: bool = False
@@ -9,9 +9,14 @@ class UserChat(BaseModel):
     messages: List[ChatMessage]
     study_program: Optional[str] = None
     orgId: int
+    # With a conversation id the server keeps the history, and messages may contain only the new message
+    conversationId: Optional[str] = None
 
 class UserRequest(BaseModel):
     org_id: int
     message: str
     study_program: str
     language: str
+
+class UserBatchRequest(BaseModel):
+    questions: List[UserRequest]
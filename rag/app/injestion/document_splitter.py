@@ -1,6 +1,11 @@
 from typing import List
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+def create_text_splitter(chunk_size: int, chunk_overlap: int):
+    # langchain is only needed for ingestion, so it is imported on first use to keep startup fast
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
 
 class DocumentSplitter:
     def split_cit_content(self, content: str):
@@ -13,11 +18,11 @@ class DocumentSplitter:
         return result
     
     def split_tum_content(self, content: str, chunk_size: int = 1200, chunk_overlap: int = 200):
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        text_splitter = create_text_splitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
         chunks = text_splitter.split_text(content)
         return chunks
     
     def split_pdf_document(self, content: str, chunk_size: int = 1200, chunk_overlap: int = 200):
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        text_splitter = create_text_splitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
         chunks = text_splitter.split_text(content)
         return chunks
\ No newline at end of file
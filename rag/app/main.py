@@ -1,4 +1,6 @@
+import asyncio
 import logging
+import time
 import uvicorn
 
 from app.utils.setup_logging import setup_logging
@@ -8,6 +10,7 @@ setup_logging()
 from app.api.question_router import question_router
 from app.api.admin_router import admin_router
 from app.api.knowledge_router import knowledge_router
+from app.api.health_router import health_router
 
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
@@ -16,15 +19,21 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import ORJSONResponse
 from starlette.responses import JSONResponse
 
-from app.utils.dependencies import shutdown_model
+from app.utils.admission import AdmissionRejectedError
+from app.utils.deadline import DeadlineExceededError
+from app.utils.dependencies import shutdown_model, bootstrap
+from app.utils.metrics import metrics, start_request_timings, format_server_timing
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logging.info("Starting up the application...")
+    # Dependencies are initialized in the background so the server binds immediately; /ready reports progress
+    bootstrap_task = asyncio.create_task(bootstrap())
     yield
+    bootstrap_task.cancel()
     logging.info("Shutting down models and closing sessions.")
-    shutdown_model()
+    await shutdown_model()
 
 
 app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
@@ -38,6 +47,22 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_timings(request: Request, call_next):
+    timings = start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    duration = time.perf_counter() - start
+    # Labelled by route template, so ids in the path and unknown paths do not each add a series
+    route = request.scope.get("route")
+    path = getattr(route, "path", None) or "unmatched"
+    metrics.observe("request_seconds", duration, path=path)
+    metrics.increment("requests_total", path=path, status=response.status_code)
+    timings["total"] = duration * 1000.0
+    response.headers["Server-Timing"] = format_server_timing(timings)
+    return response
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     exc_str = f"{exc}".replace("\n", " ").replace("   ", " ")
@@ -48,9 +73,23 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
+@app.exception_handler(DeadlineExceededError)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceededError):
+    logging.error(f"{request.url.path}: {exc}")
+    return JSONResponse(content={"detail": str(exc)}, status_code=status.HTTP_504_GATEWAY_TIMEOUT)
+
+
+@app.exception_handler(AdmissionRejectedError)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejectedError):
+    logging.warning(f"{request.url.path}: {exc}")
+    return JSONResponse(content={"detail": str(exc)}, status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={"Retry-After": str(exc.retry_after)})
+
+
 app.include_router(router=question_router)
 app.include_router(router=admin_router)
 app.include_router(router=knowledge_router)
+app.include_router(router=health_router)
 
 if __name__ == "__main__":
     logging.info("Starting FastAPI server")
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import List, Optional, Set
+
+from app.data.user_requests import ChatMessage
+from app.managers.session_store import ConversationSession, SessionStore
+from app.models.base_model import BaseModelClient
+from app.prompt.prompt_manager import PromptManager
+from app.prompt.text_formatter import TextFormatter
+from app.utils.deadline import deadline_scope
+from app.utils.metrics import metrics, stage_timer, start_request_timings
+
+
+class HistorySummarizer:
+    """
+    Keeps the chat history in the prompt and in the history retrieval query bounded: only the last `keep_turns`
+    turns (and the current question) are included verbatim, older messages through a running summary.
+
+    The summary is kept in the conversation session and updated by a (small) model in the background after the
+    answer has been returned, so the next turn finds it ready. Without a session there is no summary and older
+    messages are left out.
+    """
+
+    def __init__(self, model: BaseModelClient, prompt_manager: PromptManager, formatter: TextFormatter,
+                 enabled: bool = False, keep_turns: int = 3, max_summary_chars: int = 1500):
+        """
+        :param model: The model writing the summaries (the "history_rewrite" task model).
+        :param enabled: Whether the history is compacted at all.
+        :param keep_turns: Number of previous question/answer pairs kept verbatim.
+        :param max_summary_chars: Longer summaries are cut at a word boundary.
+        """
+        self.model = model
+        self.prompt_manager = prompt_manager
+        self.formatter = formatter
+        self.enabled = enabled
+        # The previous turns plus the current question
+        self.keep_messages = 2 * keep_turns + 1
+        self.max_summary_chars = max_summary_chars
+        # Keep references to the running summaries, otherwise they may be garbage collected before they finish
+        self._summaries: Set[asyncio.Task] = set()
+        self._summarizing: Set[tuple] = set()
+
+    def format_history(self, session: Optional[ConversationSession], messages: List[ChatMessage],
+                       language: str) -> str:
+        if session is not None:
+            return session.history(self.keep_messages if self.enabled else None, self.formatter)
+        if self.enabled:
+            messages = messages[-self.keep_messages:]
+        return self.formatter.format_chat_history(messages, language)
+
+    def schedule(self, session: ConversationSession, store: Optional[SessionStore] = None):
+        """
+        Starts updating the summary if messages will leave the verbatim history with the next question. The summary
+        is also written to the session in `store`, in case a later turn has replaced it meanwhile.
+        """
+        if not self.enabled or session.key in self._summarizing:
+            return
+        # The next turn adds the question, so its verbatim history starts one message later
+        end = len(session.messages) + 1 - self.keep_messages
+        if end <= session.summarized:
+            return
+        self._summarizing.add(session.key)
+        task = asyncio.create_task(self.summarize(session, end, store))
+        self._summaries.add(task)
+        task.add_done_callback(self._summaries.discard)
+
+    async def summarize(self, session: ConversationSession, end: int, store: Optional[SessionStore] = None):
+        # Runs after the response, its stage must not end up in the request's Server-Timing header
+        start_request_timings()
+        try:
+            messages = self.formatter.format_chat_history(session.messages[session.summarized:end],
+                                                          session.language)
+            prompt = self.prompt_manager.create_history_summary_messages(session.summary, messages,
+                                                                         session.language)
+            # Not bound by the deadline of the request it was started from
+            with deadline_scope(None), stage_timer("history_summary"):
+                summary = (await self.model.acomplete(prompt)).strip()
+        except Exception as e:
+            logging.error(f"Could not summarize the chat history: {e}")
+            metrics.increment("history_summaries_total", result="error")
+            return
+        finally:
+            self._summarizing.discard(session.key)
+        if len(summary) > self.max_summary_chars:
+            cut = summary.rfind(" ", 0, self.max_summary_chars + 1)
+            summary = summary[:cut if cut > 0 else self.max_summary_chars]
+        session.summary, session.summarized = summary, end
+        if store is not None:
+            store.update_summary(session.key, summary, end)
+        metrics.increment("history_summaries_total", result="ok")
@@ -0,0 +1,215 @@
+import logging
+import threading
+import uuid as uuid_lib
+from typing import List, Dict, Optional, Callable, Tuple
+
+import numpy as np
+
+from app.data.database_requests import DatabaseDocument, DatabaseSampleQuestion, DatabaseDocumentMetadata, \
+    SampleQuestion
+from app.managers.weaviate_manager import WeaviateManager, DocumentSchema, QASchema
+from app.models.base_model import BaseModelClient
+from app.post_retrieval.reranker import Reranker
+
+
+class InMemoryCollection:
+    """A minimal thread-safe vector collection with brute-force cosine search."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.objects: Dict[str, Dict] = {}
+        self.vectors: Dict[str, np.ndarray] = {}
+        self.lock = threading.RLock()
+
+    def insert(self, properties: Dict, vector: List[float]) -> str:
+        object_id = str(uuid_lib.uuid4())
+        with self.lock:
+            self.objects[object_id] = dict(properties)
+            self.vectors[object_id] = self._normalize(vector)
+        return object_id
+
+    def update(self, object_id: str, properties: Dict, vector: Optional[List[float]] = None):
+        with self.lock:
+            self.objects[object_id] = dict(properties)
+            if vector is not None:
+                self.vectors[object_id] = self._normalize(vector)
+
+    def delete_where(self, predicate: Callable[[Dict], bool]) -> int:
+        with self.lock:
+            ids = [object_id for object_id, props in self.objects.items() if predicate(props)]
+            for object_id in ids:
+                del self.objects[object_id]
+                del self.vectors[object_id]
+        return len(ids)
+
+    def fetch_where(self, predicate: Callable[[Dict], bool]) -> List[Tuple[str, Dict]]:
+        with self.lock:
+            return [(object_id, dict(props)) for object_id, props in self.objects.items() if predicate(props)]
+
+    def near_vector(self, vector: List[float], predicate: Callable[[Dict], bool], limit: int) -> List[Tuple[Dict, float]]:
+        """Returns up to `limit` (properties, cosine distance) pairs ordered by ascending distance."""
+        with self.lock:
+            candidates = [(object_id, props) for object_id, props in self.objects.items() if predicate(props)]
+            if not candidates:
+                return []
+            matrix = np.stack([self.vectors[object_id] for object_id, _ in candidates])
+        distances = 1.0 - matrix @ self._normalize(vector)
+        order = np.argsort(distances)[:limit]
+        return [(dict(candidates[i][1]), float(distances[i])) for i in order]
+
+    def clear(self):
+        with self.lock:
+            self.objects.clear()
+            self.vectors.clear()
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+
+class InMemoryWeaviateManager(WeaviateManager):
+    """
+    Drop-in replacement for the WeaviateManager that keeps both collections in process memory.
+    Used for offline development, CI and load tests; nothing is persisted.
+    """
+
+    def __init__(self, embedding_model: BaseModelClient, reranker: Reranker):
+        logging.info("Initializing in-memory vector store")
+        self.client = None
+        self.model = embedding_model
+        self.reranker = reranker
+        self.schema_initialized = True
+        self.documents = InMemoryCollection(DocumentSchema.COLLECTION_NAME.value)
+        self.qa_collection = InMemoryCollection(QASchema.COLLECTION_NAME.value)
+
+    def initialize(self):
+        pass
+
+    def close(self):
+        pass
+
+    def document_centroid(self, max_documents: int) -> Optional[List[float]]:
+        with self.documents.lock:
+            vectors = list(self.documents.vectors.values())[:max_documents]
+        return np.mean(np.stack(vectors), axis=0).tolist() if vectors else None
+
+    def get_relevant_context(self, question_embedding: List[float], study_program: str, org_id: Optional[int],
+                             limit=10, filter_by_org: bool = True) -> List[Dict]:
+        study_program = WeaviateManager.normalize_study_program_name(study_program)
+
+        def matches(props: Dict) -> bool:
+            if study_program not in (props.get(DocumentSchema.STUDY_PROGRAMS.value) or []):
+                return False
+            if filter_by_org and org_id is not None:
+                return props.get(DocumentSchema.ORGANISATION_ID.value) == org_id
+            return True
+
+        results = self.documents.near_vector(question_embedding, matches, limit)
+        return [
+            {
+                'content': props[DocumentSchema.CONTENT.value],
+                'link': props.get(DocumentSchema.LINK.value, None),
+                'title': props.get(DocumentSchema.TITLE.value, None),
+                'distance': distance,
+            }
+            for props, distance in results
+        ]
+
+    def retrieve_sample_questions(self, question_embedding: List[float], org_id: int) -> List[SampleQuestion]:
+        results = self.qa_collection.near_vector(
+            question_embedding, lambda props: props.get(QASchema.ORGANISATION_ID.value) == org_id,
+            limit=self.SAMPLE_QUESTION_LIMIT
+        )
+        return [
+            SampleQuestion(topic=props.get(QASchema.TOPIC.value, ""),
+                           question=props.get(QASchema.QUESTION.value, ""),
+                           answer=props.get(QASchema.ANSWER.value, ""),
+                           study_programs=props.get(QASchema.STUDY_PROGRAMS.value, []),
+                           distance=distance)
+            for props, distance in results
+        ]
+
+    def delete_collections(self):
+        self.documents.clear()
+        self.qa_collection.clear()
+        return True
+
+    def delete_collection(self):
+        self.documents.clear()
+        return True
+
+    def add_documents(self, chunks: List[DatabaseDocument]):
+        embeddings = self.model.embed_batch([chunk.content for chunk in chunks]) if chunks else []
+        for chunk, embedding in zip(chunks, embeddings):
+            self.documents.insert(properties={
+                DocumentSchema.KNOWLEDGE_BASE_ID.value: chunk.id,
+                DocumentSchema.CONTENT.value: chunk.content,
+                DocumentSchema.LINK.value: chunk.link,
+                DocumentSchema.TITLE.value: chunk.title,
+                DocumentSchema.STUDY_PROGRAMS.value: chunk.study_programs,
+                DocumentSchema.ORGANISATION_ID.value: chunk.org_id
+            }, vector=embedding)
+        logging.info(f"Added {len(chunks)} documents to the in-memory store")
+
+    def delete_by_kb_id(self, kb_id: str, return_metadata: bool) -> Optional[DatabaseDocumentMetadata]:
+        def matches(props: Dict) -> bool:
+            return props.get(DocumentSchema.KNOWLEDGE_BASE_ID.value) == kb_id
+
+        metadata = None
+        if return_metadata:
+            found = self.documents.fetch_where(matches)
+            if not found:
+                logging.info(f"No documents found with knowledge_base_id: {kb_id}")
+                return None
+            properties = found[0][1]
+            metadata = DatabaseDocumentMetadata(
+                link=properties[DocumentSchema.LINK.value],
+                title=properties[DocumentSchema.TITLE.value],
+                study_programs=properties[DocumentSchema.STUDY_PROGRAMS.value],
+                org_id=properties[DocumentSchema.ORGANISATION_ID.value]
+            )
+        self.documents.delete_where(matches)
+        return metadata
+
+    def delete_documents(self, kb_ids: List[str]):
+        self.documents.delete_where(lambda props: props.get(DocumentSchema.KNOWLEDGE_BASE_ID.value) in kb_ids)
+
+    def update_documents(self, kb_id: str, document: DatabaseDocumentMetadata):
+        found = self.documents.fetch_where(lambda props: props.get(DocumentSchema.KNOWLEDGE_BASE_ID.value) == kb_id)
+        for object_id, properties in found:
+            properties[DocumentSchema.LINK.value] = document.link
+            properties[DocumentSchema.TITLE.value] = document.title
+            properties[DocumentSchema.STUDY_PROGRAMS.value] = document.study_programs
+            self.documents.update(object_id, properties)
+
+    def add_sample_question(self, sample_question: DatabaseSampleQuestion):
+        self.add_sample_questions([sample_question])
+
+    def add_sample_questions(self, questions: List[DatabaseSampleQuestion]):
+        embeddings = self.model.embed_batch([q.question for q in questions]) if questions else []
+        for sq, embedding in zip(questions, embeddings):
+            self.qa_collection.insert(properties={
+                QASchema.KNOWLEDGE_BASE_ID.value: sq.id,
+                QASchema.TOPIC.value: sq.topic,
+                QASchema.STUDY_PROGRAMS.value: sq.study_programs,
+                QASchema.QUESTION.value: sq.question,
+                QASchema.ANSWER.value: sq.answer,
+                QASchema.ORGANISATION_ID.value: sq.org_id
+            }, vector=embedding)
+
+    def update_sample_question(self, sample_question: DatabaseSampleQuestion):
+        embedding = self.model.embed(sample_question.question)
+        found = self.qa_collection.fetch_where(
+            lambda props: props.get(QASchema.KNOWLEDGE_BASE_ID.value) == sample_question.id
+        )
+        for object_id, properties in found:
+            properties[QASchema.TOPIC.value] = sample_question.topic
+            properties[QASchema.STUDY_PROGRAMS.value] = sample_question.study_programs
+            properties[QASchema.QUESTION.value] = sample_question.question
+            properties[QASchema.ANSWER.value] = sample_question.answer
+            self.qa_collection.update(object_id, properties, vector=embedding)
+
+    def delete_sample_questions(self, ids: List[str]):
+        self.qa_collection.delete_where(lambda props: props.get(QASchema.KNOWLEDGE_BASE_ID.value) in ids)
@@ -1,40 +1,80 @@
-from typing import List, Dict, Tuple
+from contextlib import nullcontext
+from typing import AsyncContextManager, Callable, List, Dict, Optional, Tuple
+import asyncio
+import json
 import re
 import logging
 
-from app.data.user_requests import ChatMessage
+from app.data.database_requests import SampleQuestion
+from app.data.user_requests import ChatMessage, UserRequest
+from app.managers.history_summarizer import HistorySummarizer
+from app.managers.session_store import ConversationSession, SessionStore
 from app.managers.weaviate_manager import WeaviateManager
 from app.models.base_model import BaseModelClient
+from app.pre_retrieval.intent_gate import IntentGate
 from app.prompt.prompt_manager import PromptManager
 from app.prompt.text_formatter import TextFormatter
 from app.utils.language_detector import LanguageDetector
+from app.post_retrieval.faq_fast_path import FaqFastPath
 from app.post_retrieval.response_evaluator import ResponseEvaluator
 from app.post_retrieval.reranker import Reranker
+from app.post_retrieval.rerank_policy import RerankPolicy
+from app.utils.deadline import deadline_scope, optional_stage, required_stage
+from app.utils.metrics import metrics, stage_timer
+from app.utils.usage import usage_scope
 
 class RequestHandler:
-    def __init__(self, weaviate_manager: WeaviateManager, reranker: Reranker, formatter: TextFormatter, model: BaseModelClient, prompt_manager: PromptManager, response_evaluator: ResponseEvaluator):
+    def __init__(self, weaviate_manager: WeaviateManager, reranker: Reranker, formatter: TextFormatter, model: BaseModelClient, prompt_manager: PromptManager, response_evaluator: ResponseEvaluator,
+                 fused_judge: bool = False, rerank_policy: Optional[RerankPolicy] = None,
+                 intent_gate: Optional[IntentGate] = None, session_store: Optional[SessionStore] = None,
+                 history_summarizer: Optional[HistorySummarizer] = None,
+                 faq_fast_path: Optional[FaqFastPath] = None):
         self.weaviate_manager = weaviate_manager
         self.reranker = reranker
         self.model = model
         self.prompt_manager = prompt_manager
         self.text_formatter = formatter
         self.response_evaluator = response_evaluator
+        # Generate the answer and the judge verdict in one structured call instead of two sequential ones
+        self.fused_judge = fused_judge
+        # Decides when the vector distances suffice and the reranker can be skipped (never by default)
+        self.rerank_policy = rerank_policy or RerankPolicy()
+        # Answers small talk and off-topic chat messages without retrieval
+        self.intent_gate = intent_gate
+        # Keeps the history of chats that send a conversation id, so a turn only processes its new messages
+        self.session_store = session_store
+        # Bounds the history to the last turns and a summary of the earlier ones (the full history by default)
+        self.history_summarizer = history_summarizer or HistorySummarizer(model=model, prompt_manager=prompt_manager,
+                                                                          formatter=formatter)
+        # Answers near-identical sample questions with their curated answer (never by default)
+        self.faq_fast_path = faq_fast_path or FaqFastPath()
         
     GEN_THRESH = 0.3
     SPEC_THRESH = 0.35
     MAX_GENERAL = 6
     MAX_SPECIFIC = 6
 
-    def handle_question(self, question: str, classification: str, language: str, org_id: int):
-        """Handles the question by fetching relevant documents and generating an answer."""
-        embedding = self.weaviate_manager.get_question_embedding(question=question)
-        
-        general_context_dict = self.weaviate_manager.get_relevant_context(question_embedding=embedding, study_program="general", org_id=org_id)
+    async def handle_question(self, question: str, classification: str, language: str, org_id: int,
+                              embedding: Optional[List[float]] = None):
+        """
+        Handles the question by fetching relevant documents and generating an answer.
+
+        :param embedding: The question's embedding, if it has already been computed (see `handle_questions`).
+        """
+        # Model and reranker calls are awaited natively; the Weaviate client is blocking and runs in threads
+        if embedding is None:
+            with stage_timer("embedding"):
+                embedding = await self.weaviate_manager.aget_question_embedding(question=question)
         
-        specific_context_dict = []
-        if classification != "general":
-            specific_context_dict = self.weaviate_manager.get_relevant_context(question_embedding=embedding,
-                                                                          study_program=classification, org_id=org_id)
+        with stage_timer("retrieval"):
+            general_context_dict = await required_stage("retrieval", asyncio.to_thread(
+                self.weaviate_manager.get_relevant_context, question_embedding=embedding, study_program="general", org_id=org_id))
+            
+            specific_context_dict = []
+            if classification != "general":
+                specific_context_dict = await required_stage("retrieval", asyncio.to_thread(
+                    self.weaviate_manager.get_relevant_context, question_embedding=embedding,
+                    study_program=classification, org_id=org_id))
         
         for x in general_context_dict:
             x['type'] = 'general'
@@ -42,81 +82,238 @@ class RequestHandler:
             x['type'] = 'specific'
         
         all_contexts = general_context_dict + specific_context_dict
-        context_texts = [x['content'] for x in all_contexts]
 
-        rerank_results = self.reranker.rerank_with_cohere(
-            context_list=context_texts, query=question, language=language, top_n=len(all_contexts)
-        )
+        with stage_timer("sample_questions"):
+            sample_question_candidates = await optional_stage("sample_questions", asyncio.to_thread(
+                self.weaviate_manager.retrieve_sample_questions, question_embedding=embedding, org_id=org_id), [])
+
+        with stage_timer("rerank"):
+            rerank_results, sample_questions = await self.rerank_within_deadline(
+                query=question, language=language, contexts=all_contexts,
+                sample_questions=sample_question_candidates, top_n=len(all_contexts))
+
+        faq = self.faq_fast_path.match(sample_questions, language, classification, endpoint="ask")
+        if faq is not None:
+            return self.response_evaluator.finalize_response(FaqFastPath.email_answer(faq, language), True,
+                                                             language)
         
         general_context, specific_context = self.process_and_format_contexts(all_contexts=all_contexts, rerank_results=rerank_results)
-        
-        sample_questions = self.weaviate_manager.get_relevant_sample_questions(question=question, question_embedding=embedding, language=language, org_id=org_id)
         sample_questions_formatted = self.text_formatter.format_sample_questions(sample_questions, language)
-        
-        messages = self.prompt_manager.create_messages(general_context, specific_context, sample_questions_formatted,
-                                                       question, language, classification)
-        
-        answer = self.model.complete(messages)
-        logging.info(f"Answer: {answer}")
+
+        return await self.generate_answer(question, classification, language, general_context, specific_context,
+                                          sample_questions_formatted)
+
+    async def generate_answer(self, question: str, classification: str, language: str, general_context: str,
+                              specific_context: str, sample_questions_formatted: str) -> str:
+        """Generates the answer to an email question from the formatted contexts and checks it with the judge."""
+        answer = None
+        if self.fused_judge:
+            messages = self.prompt_manager.create_fused_messages(general_context, specific_context,
+                                                                 sample_questions_formatted, question, language,
+                                                                 classification)
+            with stage_timer("generation"):
+                answer, verdict = await self.generate_fused(messages)
+            logging.info(f"Answer: {answer} (verdict: {verdict})")
+            if verdict is not None:
+                answer = self.response_evaluator.process_fused_response(question=question, response=answer,
+                                                                        verdict=verdict, language=language)
+                logging.info(f"Answer after processing: {answer}")
+                return answer
+        # Without the fused judge, or if its output could not be parsed: the plain prompt and the separate judge
+        if answer is None:
+            messages = self.prompt_manager.create_messages(general_context, specific_context, sample_questions_formatted,
+                                                           question, language, classification)
+
+            with stage_timer("generation"):
+                answer = await self.model.acomplete(messages)
+            logging.info(f"Answer: {answer}")
                                 
-        answer = self.response_evaluator.process_response(question=question, response=answer, language=language)
+        with stage_timer("evaluation"):
+            answer = await self.response_evaluator.process_response(question=question, response=answer, language=language)
         logging.info(f"Answer after processing: {answer}")
                 
         return answer
-    
-    
-    def handle_chat(self, messages: List[ChatMessage], study_program: str, org_id: int, filter_by_org: bool):
+
+    async def generate_fused(self, messages: List[Dict]) -> Tuple[str, Optional[str]]:
+        """
+        Generates the answer together with the model's verdict on it.
+        Returns:
+            Tuple[Optional[str], Optional[str]]: (answer, verdict); the verdict is None if it is missing or invalid,
+            so the caller falls back to the separate judge, and the answer as well if the output could not be parsed
+            at all (e.g. cut off by max_tokens), so the caller generates it again with the plain prompt. The raw
+            structured output is never an answer.
+        """
+        output = await self.model.acomplete_structured(messages, PromptManager.FUSED_RESPONSE_SCHEMA,
+                                                       name="answer_with_verdict")
+        try:
+            parsed = json.loads(output)
+            answer, verdict = parsed["answer"].strip(), parsed["verdict"]
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            logging.warning(f"Could not parse the structured answer, generating it again with the plain prompt: {e}")
+            metrics.increment("fused_judge_parse_errors_total")
+            return None, None
+        if not answer:
+            logging.warning("The structured answer is empty, generating it again with the plain prompt")
+            metrics.increment("fused_judge_parse_errors_total")
+            return None, None
+        if verdict not in ("OK", "NEEDS_FALSE"):
+            logging.warning(f"Unexpected verdict {verdict!r}, falling back to the judge")
+            return answer, None
+        return answer, verdict
+
+    async def handle_questions(self, batch: List[UserRequest], max_parallel: int,
+                               deadline_seconds: Optional[float] = None, deadline_reserve: float = 0.0,
+                               admit: Optional[Callable[[int], AsyncContextManager]] = None) -> List[Dict]:
+        """
+        Answers a batch of email questions. All questions are embedded in one call; the rest of the pipeline
+        (retrieval, reranking, generation and evaluation) runs for at most `max_parallel` questions at a time, so a
+        batch does not flood the Weaviate threads and the reranker that the chat shares. Each question holds an
+        admission slot of its organisation (with `admit`) and has its own deadline, starting when its turn comes.
+
+        Returns:
+            List[Dict]: One {"answer": .., "error": ..} per question, in order; a failing question does not fail the
+            others.
+        """
+        with stage_timer("embedding"):
+            embeddings = await self.weaviate_manager.aget_question_embeddings(
+                questions=[request.message for request in batch])
+        parallel = asyncio.Semaphore(max_parallel)
+
+        async def answer(index: int, request: UserRequest, embedding: List[float]) -> Dict:
+            try:
+                async with parallel, (admit(request.org_id) if admit else nullcontext()):
+                    with usage_scope(org_id=request.org_id, endpoint="ask_batch"), \
+                            deadline_scope(deadline_seconds, reserve=deadline_reserve):
+                        result = await self.handle_question(request.message, request.study_program.lower(),
+                                                            request.language.lower(), org_id=request.org_id,
+                                                            embedding=embedding)
+            except Exception as e:
+                logging.error(f"Could not answer question {index} of the batch: {e}")
+                metrics.increment("batch_questions_total", result="error")
+                return {"answer": None, "error": str(e) or type(e).__name__}
+            metrics.increment("batch_questions_total", result="ok")
+            return {"answer": result, "error": None}
+
+        return await asyncio.gather(*[answer(index, request, embedding)
+                                      for index, (request, embedding) in enumerate(zip(batch, embeddings))])
+
+    async def handle_chat(self, messages: List[ChatMessage], study_program: str, org_id: int, filter_by_org: bool,
+                          conversation_id: Optional[str] = None):
         """Handles the question by fetching relevant documents and generating an answer."""
+        if conversation_id and self.session_store is not None and self.session_store.enabled:
+            # Turns of one conversation build on each other's session, so they must not overlap
+            async with self.session_store.turn(org_id, conversation_id):
+                # Only the messages the session does not contain yet are formatted and embedded
+                session, new_messages = self.session_store.begin_turn(org_id, conversation_id, messages)
+                return await self.chat_turn(messages, study_program, org_id, filter_by_org, session, new_messages)
+        return await self.chat_turn(messages, study_program, org_id, filter_by_org, None, messages)
+
+    async def chat_turn(self, messages: List[ChatMessage], study_program: str, org_id: int, filter_by_org: bool,
+                        session: Optional[ConversationSession], new_messages: List[ChatMessage]) -> str:
+        """
+        Answers the last message. The session is a working copy that is only stored by `end_turn`, once the answer
+        exists.
+        """
         # The last message is the user's current question
         last_message = messages[-1].message
+        earlier = session.messages + new_messages[:-1] if session is not None else messages[:-1]
+        last_reply = next((cm.message for cm in reversed(earlier) if cm.type.lower() != "user"), None)
+        # Gated replies keep the language of the conversation, a short "ok" says little about it; the session's
+        # language is taken before this turn's message updates it
+        session_language = session.language if session is not None else None
+        if self.intent_gate is not None:
+            gated = self.intent_gate.classify_text(last_message, has_history=bool(earlier), last_reply=last_reply)
+            if gated is not None:
+                intent, gated_language = gated
+                reply_language = self.conversation_language(session_language, earlier) or gated_language
+                return self.end_turn(session, new_messages, self.intent_gate.reply(intent, reply_language),
+                                     reply_language)
+
         if study_program and study_program.lower() != "general":
             question = f"{re.sub(r'-', ' ', study_program).title()}: {last_message}"
         else:
             question = last_message
         
-        last_message_embedding = self.weaviate_manager.get_question_embedding(question=question)
-        chat_history_embedding = None
-
         # Determine language
-        lang = LanguageDetector.get_language(last_message)
-        
+        with stage_timer("language_detection"):
+            lang = LanguageDetector.get_language(last_message)
+
         limit = 10
 
         # Decide whether to retrieve context based on history
         chat_history_embedding = None
         chat_history_query = None
-        if len(messages) > 2:
-            chat_history_query = self.text_formatter.format_chat_history(chat_messages=messages, language=lang)
-            chat_history_embedding = self.weaviate_manager.get_question_embedding(question=chat_history_query)
+        # Contexts of the previous turn, they stand in for the retrieval with the history embedding
+        history_candidates = None
+        if session is not None:
+            session.append(new_messages, lang, self.text_formatter)
+        has_history = len(session.messages if session is not None else messages) > 2
+        if has_history:
             limit = 8
-            
-        general_context_dict = self.weaviate_manager.get_relevant_context(question_embedding=last_message_embedding, study_program="general", 
-                                                                        org_id=org_id, limit=limit, filter_by_org=filter_by_org)
-        general_context_history_dict = []
-        if chat_history_embedding is not None:
-            general_context_history_dict = self.weaviate_manager.get_relevant_context(question_embedding=chat_history_embedding, study_program="general", 
-                                                                            org_id=org_id, limit=limit, filter_by_org=filter_by_org)
-            
-        for x in general_context_dict:
-            x['type'] = 'general'
-        for x in general_context_history_dict:
-            x['type'] = 'general'
+            if session is not None and session.candidates and session.study_program == study_program:
+                history_candidates = session.candidates
+            elif session is None or session.history_embedding is None:
+                chat_history_query = self.history_summarizer.format_history(session, messages, lang)
 
-        # Handle specific context (study program specific)
-        specific_context_dict = []
-        specific_context_history_dict = []
-        if study_program and study_program.lower() != "general":
-            specific_context_dict = self.weaviate_manager.get_relevant_context(
-                question_embedding=last_message_embedding, study_program=study_program,
-                org_id=org_id, limit=limit, filter_by_org=filter_by_org)
+        # Question and history are embedded in one request
+        with stage_timer("embedding"):
+            if chat_history_query is not None:
+                last_message_embedding, chat_history_embedding = await self.weaviate_manager.aget_question_embeddings(
+                    questions=[question, chat_history_query])
+            else:
+                last_message_embedding = await self.weaviate_manager.aget_question_embedding(question=question)
+
+        if session is not None:
             if chat_history_embedding is not None:
-                specific_context_history_dict = self.weaviate_manager.get_relevant_context(
-                    question_embedding=chat_history_embedding, study_program=study_program,
-                    org_id=org_id, limit=limit, filter_by_org=filter_by_org)
-        for x in specific_context_dict:
-            x['type'] = 'specific'
-        for x in specific_context_history_dict:
-            x['type'] = 'specific'
+                session.history_embedding = chat_history_embedding
+            else:
+                session.update_history_embedding(last_message_embedding)
+                if has_history and history_candidates is None:
+                    chat_history_embedding = session.history_embedding
+
+        if self.intent_gate is not None:
+            intent = self.intent_gate.classify_embedding(last_message, last_message_embedding,
+                                                         has_history=bool(earlier), last_reply=last_reply)
+            if intent is not None:
+                reply_language = self.conversation_language(session_language, earlier) or lang
+                return self.end_turn(session, [], self.intent_gate.reply(intent, reply_language), reply_language)
+
+        with stage_timer("retrieval"):
+            general_context_dict = await required_stage("retrieval", asyncio.to_thread(
+                self.weaviate_manager.get_relevant_context, question_embedding=last_message_embedding, study_program="general",
+                org_id=org_id, limit=limit, filter_by_org=filter_by_org))
+            general_context_history_dict = []
+            if history_candidates is not None:
+                general_context_history_dict = [x for x in history_candidates if x['type'] == 'general']
+            elif chat_history_embedding is not None:
+                general_context_history_dict = await optional_stage("history_retrieval", asyncio.to_thread(
+                    self.weaviate_manager.get_relevant_context, question_embedding=chat_history_embedding, study_program="general",
+                    org_id=org_id, limit=limit, filter_by_org=filter_by_org), [])
+            
+            for x in general_context_dict:
+                x['type'] = 'general'
+            for x in general_context_history_dict:
+                x['type'] = 'general'
+
+            # Handle specific context (study program specific)
+            specific_context_dict = []
+            specific_context_history_dict = []
+            if study_program and study_program.lower() != "general":
+                specific_context_dict = await required_stage("retrieval", asyncio.to_thread(
+                    self.weaviate_manager.get_relevant_context,
+                    question_embedding=last_message_embedding, study_program=study_program,
+                    org_id=org_id, limit=limit, filter_by_org=filter_by_org))
+                if history_candidates is not None:
+                    specific_context_history_dict = [x for x in history_candidates if x['type'] == 'specific']
+                elif chat_history_embedding is not None:
+                    specific_context_history_dict = await optional_stage("history_retrieval", asyncio.to_thread(
+                        self.weaviate_manager.get_relevant_context,
+                        question_embedding=chat_history_embedding, study_program=study_program,
+                        org_id=org_id, limit=limit, filter_by_org=filter_by_org), [])
+            for x in specific_context_dict:
+                x['type'] = 'specific'
+            for x in specific_context_history_dict:
+                x['type'] = 'specific'
 
         # Combine and deduplicate all contexts
         all_contexts = (
@@ -125,20 +322,32 @@ class RequestHandler:
             specific_context_dict +
             specific_context_history_dict
         )
+        if session is not None:
+            # The current question's contexts first, so older ones age out of the candidates
+            session.set_candidates(general_context_dict + specific_context_dict + general_context_history_dict +
+                                   specific_context_history_dict, study_program, limit=2 * limit)
         
-        context_texts = [x['content'] for x in all_contexts]
         top_n = min(len(all_contexts), 20)
 
-        rerank_results = self.reranker.rerank_with_cohere(
-            context_list=context_texts, query=question, language=lang, top_n=top_n
-        )
+        with stage_timer("sample_questions"):
+            sample_question_candidates = await optional_stage("sample_questions", asyncio.to_thread(
+                self.weaviate_manager.retrieve_sample_questions, question_embedding=last_message_embedding,
+                org_id=org_id), [])
+
+        with stage_timer("rerank"):
+            # Contexts of the history or the previous turn are at distances to other query vectors
+            rerank_results, sample_questions = await self.rerank_within_deadline(
+                query=question, language=lang, contexts=all_contexts, sample_questions=sample_question_candidates,
+                top_n=top_n, mixed_queries=bool(general_context_history_dict or specific_context_history_dict))
+
+        faq = self.faq_fast_path.match(sample_questions, lang, study_program, endpoint="chat")
+        if faq is not None:
+            return self.end_turn(session, [], faq.answer.strip(), lang)
         
         general_context, specific_context = self.process_and_format_contexts(all_contexts=all_contexts, rerank_results=rerank_results)
-        
-        sample_questions = self.weaviate_manager.get_relevant_sample_questions(question=last_message, question_embedding=last_message_embedding, language=lang, org_id=org_id)
         sample_questions_formatted = self.text_formatter.format_sample_questions(sample_questions, lang)
         
-        history_formatted = self.text_formatter.format_chat_history(messages, lang)
+        history_formatted = self.history_summarizer.format_history(session, messages, lang)
 
         # Create messages for the model
         messages_to_model = self.prompt_manager.create_messages_with_history(
@@ -153,9 +362,80 @@ class RequestHandler:
         )
                 
         # Generate and return the answer
-        return self.model.complete(messages_to_model)
+        with stage_timer("generation"):
+            answer = await self.model.acomplete(messages_to_model)
+        return self.end_turn(session, [], answer, lang)
+
+    @staticmethod
+    def conversation_language(session_language: Optional[str], earlier: List[ChatMessage]) -> Optional[str]:
+        """
+        The language of the conversation before the current message, None for a first message. Only computed for
+        gated replies, detecting it costs a pass over the earlier questions.
+        """
+        if session_language:
+            return session_language
+        questions = " ".join(cm.message for cm in earlier if cm.type.lower() == "user")
+        return LanguageDetector.get_language(questions).lower() if questions else None
+
+    def end_turn(self, session: Optional[ConversationSession], new_messages: List[ChatMessage], answer: str,
+                 language: str) -> str:
+        """Stores the answer (and any messages not yet added) in the session."""
+        if session is not None:
+            session.append(new_messages + [ChatMessage(message=answer, type="assistant")], language,
+                           self.text_formatter)
+            self.session_store.save(session)
+            self.history_summarizer.schedule(session, self.session_store)
+        return answer
     
     
+    async def rerank_within_deadline(self, query: str, language: str, contexts: List[Dict],
+                                     sample_questions: List[SampleQuestion], top_n: int,
+                                     mixed_queries: bool = False) -> Tuple[List[Dict], List[SampleQuestion]]:
+        """Reranking is optional: without enough budget left, the contexts keep their vector order."""
+        fallback = (Reranker.vector_order([x['content'] for x in contexts], top_n), [])
+        return await optional_stage("rerank", self.rerank_contexts_and_sample_questions(
+            query=query, language=language, contexts=contexts, sample_questions=sample_questions, top_n=top_n,
+            mixed_queries=mixed_queries), fallback)
+
+    async def rerank_contexts_and_sample_questions(self, query: str, language: str, contexts: List[Dict],
+                                                   sample_questions: List[SampleQuestion], top_n: int,
+                                                   mixed_queries: bool = False
+                                                   ) -> Tuple[List[Dict], List[SampleQuestion]]:
+        """
+        Scores the context chunks and the sample questions in one rerank request and splits the results by type.
+        Candidate lists the rerank policy considers settled are ranked by their vector distance instead; with
+        `mixed_queries`, the contexts were not all retrieved for the query's embedding and are always reranked.
+        Returns:
+            Tuple[List[Dict], List[SampleQuestion]]: (rerank results of the top_n contexts, the sample questions
+            above the relevance threshold)
+        """
+        context_distances = [x.get('distance') for x in contexts]
+        sample_question_distances = [sq.distance for sq in sample_questions]
+        rerank_contexts = self.rerank_policy.needs_rerank("contexts", context_distances, mixed_queries)
+        rerank_sample_questions = self.rerank_policy.needs_rerank("sample_questions", sample_question_distances)
+
+        documents = [x['content'] for x in contexts] if rerank_contexts else []
+        offset = len(documents)
+        if rerank_sample_questions:
+            documents += self.weaviate_manager.sample_question_documents(sample_questions, language)
+        results = []
+        if documents:
+            results = await self.reranker.arerank_with_cohere(context_list=documents, query=query,
+                                                              language=language, top_n=len(documents))
+
+        if rerank_contexts:
+            context_results = [result for result in results if result['index'] < offset][:top_n]
+        else:
+            context_results = self.rerank_policy.score(context_distances)[:top_n]
+        if rerank_sample_questions:
+            sample_question_results = [
+                {**result, 'index': result['index'] - offset} for result in results if result['index'] >= offset
+            ]
+        else:
+            sample_question_results = self.rerank_policy.score(sample_question_distances)
+        return context_results, self.weaviate_manager.select_sample_questions(sample_questions,
+                                                                              sample_question_results)
+
     def process_and_format_contexts(self, all_contexts: List[Dict], rerank_results: List[Dict]) -> Tuple[str, str]:
         """
         Attaches rerank scores, sorts, filters, deduplicates, and formats general/specific contexts.
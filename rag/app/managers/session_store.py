@@ -0,0 +1,213 @@
+import asyncio
+import copy
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.data.user_requests import ChatMessage
+from app.prompt.text_formatter import TextFormatter
+from app.utils.metrics import metrics
+
+
+class ConversationSession:
+    """
+    What the server keeps of a conversation between turns, so a turn only processes its new messages: the messages
+    and their formatted history lines, a summary of the older messages (see HistorySummarizer), a rolling embedding
+    of the user's questions and the candidate contexts retrieved in the previous turn.
+    """
+
+    # Weight of the earlier questions in the rolling history embedding
+    HISTORY_DECAY = 0.5
+
+    def __init__(self, key: Tuple[int, str]):
+        self.key = key
+        self.messages: List[ChatMessage] = []
+        self.language: Optional[str] = None
+        self.formatted: List[str] = []
+        # Summary of the first `summarized` messages, updated in the background
+        self.summary: Optional[str] = None
+        self.summarized = 0
+        self.history_embedding: Optional[List[float]] = None
+        self.study_program: Optional[str] = None
+        self.candidates: List[Dict] = []
+        self.last_access = time.monotonic()
+        self.size = 0
+
+    def copy(self) -> "ConversationSession":
+        """A working copy for one turn, so a failing turn leaves the stored session unchanged."""
+        clone = copy.copy(self)
+        clone.messages, clone.formatted, clone.candidates = list(self.messages), list(self.formatted), \
+            list(self.candidates)
+        return clone
+
+    def append(self, messages: List[ChatMessage], language: str, formatter: TextFormatter):
+        """Adds messages to the history; the history is only formatted again if the language changed."""
+        language = language.lower()
+        if language != self.language:
+            self.language = language
+            self.formatted = [formatter.format_chat_message(cm, language) for cm in self.messages]
+        self.messages.extend(messages)
+        self.formatted.extend(formatter.format_chat_message(cm, language) for cm in messages)
+
+    def history(self, keep_messages: Optional[int] = None, formatter: Optional[TextFormatter] = None) -> str:
+        """
+        The formatted history; with `keep_messages`, only the last messages verbatim behind the summary of the
+        earlier ones. Messages the summary does not cover yet are left out, so the history stays bounded.
+        """
+        if keep_messages is None:
+            return "\n\n".join(self.formatted)
+        lines = self.formatted[-keep_messages:]
+        if self.summary and formatter is not None:
+            lines = [formatter.format_history_summary(self.summary, self.language)] + lines
+        return "\n\n".join(lines)
+
+    def update_history_embedding(self, question_embedding: List[float]):
+        question = np.asarray(question_embedding, dtype=np.float32)
+        if self.history_embedding is None:
+            rolling = question
+        else:
+            rolling = self.HISTORY_DECAY * np.asarray(self.history_embedding, dtype=np.float32) \
+                      + (1 - self.HISTORY_DECAY) * question
+        norm = np.linalg.norm(rolling)
+        self.history_embedding = (rolling / norm if norm else rolling).tolist()
+
+    def set_candidates(self, contexts: List[Dict], study_program: Optional[str], limit: int):
+        """Keeps up to `limit` distinct contexts, in the order given (the current question's first)."""
+        self.study_program = study_program
+        candidates, seen = [], set()
+        for context in contexts:
+            if context['content'] not in seen:
+                seen.add(context['content'])
+                candidates.append(dict(context))
+        self.candidates = candidates[:limit]
+
+    def estimate_size(self) -> int:
+        """Approximate memory use in bytes (text as UTF-32 worst case, embeddings as Python floats)."""
+        text = sum(len(cm.message) for cm in self.messages) + sum(len(line) for line in self.formatted) \
+               + sum(len(candidate['content']) for candidate in self.candidates) + len(self.summary or "")
+        return 4 * text + 32 * len(self.history_embedding or []) + 200 * (len(self.messages) + len(self.candidates))
+
+
+class SessionStore:
+    """
+    Conversation sessions of this worker process, keyed by organisation and conversation id. Sessions expire
+    `ttl_seconds` after their last turn, and the least recently used ones are evicted when all sessions together
+    exceed `max_bytes`.
+
+    A turn works on a copy of the session (`begin_turn`) that replaces the stored one only once the turn succeeded
+    (`save`); turns of the same conversation run one after another (`turn`).
+    """
+
+    def __init__(self, enabled: bool = True, ttl_seconds: float = 1800, max_bytes: int = 64 * 1024 * 1024):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sessions: "OrderedDict[Tuple[int, str], ConversationSession]" = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        # Turn locks of the conversations with a running turn, and how many turns hold or wait for each
+        self._turn_locks: Dict[Tuple[int, str], Tuple[asyncio.Lock, int]] = {}
+
+    @asynccontextmanager
+    async def turn(self, org_id: int, conversation_id: str):
+        """Waits until no other turn of the conversation runs, and holds it for the block."""
+        key = (org_id, conversation_id)
+        lock, users = self._turn_locks.get(key, (None, 0))
+        lock = lock or asyncio.Lock()
+        self._turn_locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._turn_locks[key]
+            if users == 1:
+                del self._turn_locks[key]
+            else:
+                self._turn_locks[key] = (lock, users - 1)
+
+    def begin_turn(self, org_id: int, conversation_id: str,
+                   messages: List[ChatMessage]) -> Tuple[ConversationSession, List[ChatMessage]]:
+        """
+        Returns a working copy of the conversation's session and the messages it does not contain yet.
+
+        Clients may send only the new messages or, as before, the whole conversation. A whole conversation that
+        does not continue the stored one (or has no stored session, e.g. because another worker served the
+        previous turn) starts the session over.
+        """
+        key = (org_id, conversation_id)
+        with self.lock:
+            self._expire()
+            session = self.sessions.get(key)
+            if session is not None:
+                session.last_access = time.monotonic()
+                self.sessions.move_to_end(key)
+        count = len(session.messages) if session is not None else 0
+        if session is not None and (len(messages) == 1 or
+                                    (len(messages) > count and self._continues(session, messages))):
+            mode = "incremental"
+            session = session.copy()
+            new_messages = messages if len(messages) == 1 else messages[count:]
+        else:
+            mode = "new" if len(messages) == 1 else "rebuilt"
+            session = ConversationSession(key)
+            new_messages = messages
+        metrics.increment("session_turns_total", mode=mode)
+        return session, new_messages
+
+    @staticmethod
+    def _continues(session: ConversationSession, messages: List[ChatMessage]) -> bool:
+        count = len(session.messages)
+        if count == 0:
+            return True
+        stored, sent = session.messages[-1], messages[count - 1]
+        return stored.message.strip() == sent.message.strip() and stored.type.lower() == sent.type.lower()
+
+    def save(self, session: ConversationSession):
+        session.last_access = time.monotonic()
+        with self.lock:
+            previous = self.sessions.pop(session.key, None)
+            if previous is not None:
+                self.total_bytes -= previous.size
+                # A summary that finished while this turn ran was written to the stored session
+                if previous.summarized > session.summarized:
+                    session.summary, session.summarized = previous.summary, previous.summarized
+            session.size = session.estimate_size()
+            self.sessions[session.key] = session
+            self.total_bytes += session.size
+            while self.total_bytes > self.max_bytes and len(self.sessions) > 1:
+                _, evicted = self.sessions.popitem(last=False)
+                self.total_bytes -= evicted.size
+                metrics.increment("sessions_evicted_total", reason="memory")
+            self._report()
+
+    def update_summary(self, key: Tuple[int, str], summary: str, summarized: int):
+        """Stores a summary finished in the background, unless the stored session already has a newer one."""
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is None or session.summarized >= summarized:
+                return
+            session.summary, session.summarized = summary, summarized
+            self.total_bytes -= session.size
+            session.size = session.estimate_size()
+            self.total_bytes += session.size
+            self._report()
+
+    def _expire(self):
+        """Drops expired sessions; they are ordered by last access, so only the front has to be checked."""
+        deadline = time.monotonic() - self.ttl_seconds
+        while self.sessions:
+            key, session = next(iter(self.sessions.items()))
+            if session.last_access > deadline:
+                break
+            self.sessions.pop(key)
+            self.total_bytes -= session.size
+            metrics.increment("sessions_evicted_total", reason="ttl")
+        self._report()
+
+    def _report(self):
+        metrics.set_gauge("sessions_active", len(self.sessions))
+        metrics.set_gauge("sessions_bytes", self.total_bytes)
@@ -1,9 +1,12 @@
 import logging
+import threading
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import List, Union, Tuple, Optional, Dict
+from typing import Callable, List, Union, Tuple, Optional, Dict
 
+import numpy as np
 import weaviate
 import weaviate.classes as wvc
 from weaviate.collections import Collection
@@ -16,7 +19,9 @@ from app.data.database_requests import DatabaseDocument, DatabaseSampleQuestion,
 from app.models.base_model import BaseModelClient
 from app.models.ollama_model import OllamaModel
 from app.post_retrieval.reranker import Reranker
+from app.utils.circuit_breaker import circuit_breakers
 from app.utils.environment import config
+from app.utils.metrics import metrics
 
 
 class DocumentSchema(Enum):
@@ -44,7 +49,8 @@ class QASchema(Enum):
     ANSWER = "answer"
     ORGANISATION_ID = "org_id"
 
-def wait_until_ready(base_url: str, port: int, timeout=180):
+def wait_until_ready(base_url: str, port: int, timeout=180, initial_interval: float = 0.25, max_interval: float = 2.0,
+                     stop_event: Optional[threading.Event] = None):
     if base_url.startswith("http://") or base_url.startswith("https://"):
         origin = base_url.rstrip("/")
     else:
@@ -52,6 +58,7 @@ def wait_until_ready(base_url: str, port: int, timeout=180):
     ready_url = f"{origin}/v1/.well-known/ready"
 
     t0 = time.time()
+    interval = initial_interval
     while time.time() - t0 < timeout:
         try:
             r = requests.get(ready_url, timeout=2)
@@ -61,28 +68,118 @@ def wait_until_ready(base_url: str, port: int, timeout=180):
             logging.info("Weaviate not ready yet: %s %s", r.status_code, r.text[:200])
         except requests.RequestException as e:
             logging.info("Waiting for Weaviate: %s", e)
-        time.sleep(5)
+        # Poll quickly at first so a restarted container becomes ready as soon as Weaviate is
+        if stop_event is not None and stop_event.wait(interval):
+            raise RuntimeError("Stopped waiting for Weaviate")
+        elif stop_event is None:
+            time.sleep(interval)
+        interval = min(interval * 2, max_interval)
     raise RuntimeError(f"Weaviate not ready after {timeout}s (tried {ready_url})")
 
 class WeaviateManager:
+    # Sample questions: candidates retrieved by vector similarity, kept after reranking, minimum relevance score
+    SAMPLE_QUESTION_LIMIT = 5
+    SAMPLE_QUESTION_TOP_N = 3
+    SAMPLE_QUESTION_MIN_SCORE = 0.5
+
     def __init__(self, url: str, embedding_model: BaseModelClient, reranker: Reranker):
-        logging.info("Initializing Weaviate Manager")
-        self.client = weaviate.connect_to_local(host=config.WEAVIATE_URL, port=config.WEAVIATE_PORT)
+        self.url = url
+        self.client = None
         self.model = embedding_model
         self.schema_initialized = False
         self.reranker = reranker
-        
-        wait_until_ready(config.WEAVIATE_URL, config.WEAVIATE_PORT)
+        self.documents: Optional[Collection] = None
+        self.qa_collection: Optional[Collection] = None
+        self._stop_event = threading.Event()
+        # While open, queries are answered from the local index (if enabled) or come back empty
+        self.breaker = circuit_breakers.get("weaviate")
+        self.local_index: Optional["WeaviateManager"] = None
+        self._local_index_thread: Optional[threading.Thread] = None
+
+    def initialize(self):
+        """Connects to Weaviate and prepares both collections. Called once during bootstrap."""
+        logging.info("Initializing Weaviate Manager")
+        wait_until_ready(config.WEAVIATE_URL, config.WEAVIATE_PORT, stop_event=self._stop_event)
+        self.client = weaviate.connect_to_local(host=config.WEAVIATE_URL, port=config.WEAVIATE_PORT)
 
         if config.DELETE_BEFORE_INIT.lower() == "true":
             logging.warning("Deleting existing data before initialization...")
             self.delete_collections()
 
-        self.documents = self.initialize_schema()
-        self.qa_collection = self.initialize_qa_schema()
+        # Both schemas are independent, so they are checked/created in parallel
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            documents = executor.submit(self.initialize_schema)
+            qa_collection = executor.submit(self.initialize_qa_schema)
+            self.documents = documents.result()
+            self.qa_collection = qa_collection.result()
+
+        if config.WEAVIATE_LOCAL_INDEX.lower() == "true" and self._local_index_thread is None:
+            self._local_index_thread = threading.Thread(target=self._refresh_local_index_periodically,
+                                                        name="weaviate-local-index", daemon=True)
+            self._local_index_thread.start()
+
+    def refresh_local_index(self):
+        """Copies both collections with their vectors into an in-memory index used while Weaviate is unavailable."""
+        from app.managers.in_memory_manager import InMemoryWeaviateManager
+        index = InMemoryWeaviateManager(embedding_model=self.model, reranker=self.reranker)
+        for source, target in ((self.documents, index.documents), (self.qa_collection, index.qa_collection)):
+            for item in source.iterator(include_vector=True):
+                vector = self._vector_of(item)
+                if vector:
+                    target.insert(dict(item.properties), vector)
+            metrics.set_gauge("weaviate_local_index_objects", len(target.objects), collection=target.name)
+        self.local_index = index
+        logging.info(f"Refreshed the local index with {len(index.documents.objects)} documents and "
+                     f"{len(index.qa_collection.objects)} sample questions")
+
+    @staticmethod
+    def _vector_of(item) -> Optional[List[float]]:
+        return item.vector.get("default") if isinstance(item.vector, dict) else item.vector
+
+    def document_centroid(self, max_documents: int) -> Optional[List[float]]:
+        """Mean of the normalized embeddings of up to `max_documents` documents, None if there are none."""
+        total, count = None, 0
+        for item in self.documents.iterator(include_vector=True):
+            vector = self._vector_of(item)
+            if not vector:
+                continue
+            array = np.asarray(vector, dtype=np.float32)
+            array /= np.linalg.norm(array) or 1.0
+            total = array if total is None else total + array
+            count += 1
+            if count >= max_documents:
+                break
+        return (total / count).tolist() if count else None
+
+    def _refresh_local_index_periodically(self):
+        while not self._stop_event.is_set():
+            if self.breaker.allow():
+                try:
+                    self.refresh_local_index()
+                    self.breaker.record_success()
+                except Exception as e:
+                    logging.error(f"Refreshing the local index failed: {e}")
+                    self.breaker.record_failure(e)
+            if self._stop_event.wait(config.WEAVIATE_LOCAL_INDEX_REFRESH_SECONDS):
+                return
+
+    def _fallback(self, query: str, search: Callable[["WeaviateManager"], List]) -> List:
+        """Answers a query from the local index when Weaviate is unavailable, or returns no results."""
+        local_index = self.local_index
+        if local_index is None:
+            metrics.increment("weaviate_fallback_total", query=query, source="none")
+            return []
+        metrics.increment("weaviate_fallback_total", query=query, source="local_index")
+        return search(local_index)
+
+    def close(self):
+        self._stop_event.set()
+        if self.client is not None:
+            self.client.close()
+            self.client = None
 
     def __del__(self):
-        self.client.close()
+        self.close()
 
     def initialize_schema(self) -> Collection:
         """Creates the schema in Weaviate for storing documents and embeddings."""
@@ -292,6 +389,15 @@ class WeaviateManager:
         question_embedding = self.model.embed(question)
         return question_embedding
 
+    def get_question_embeddings(self, questions: List[str]) -> List[List[float]]:
+        return self.model.embed_batch(questions)
+
+    async def aget_question_embedding(self, question: str) -> List[float]:
+        return await self.model.aembed(question)
+
+    async def aget_question_embeddings(self, questions: List[str]) -> List[List[float]]:
+        return await self.model.aembed_batch(questions)
+
 
     def get_relevant_context(self, question_embedding: List[float], study_program: str, org_id: Optional[int],
                              limit=10, filter_by_org: bool = True) -> List[Dict]:
@@ -308,6 +414,12 @@ class WeaviateManager:
         Returns:
             List[Dict]: A list of document dictionaries relevant to the query.
         """
+        def fallback() -> List[Dict]:
+            return self._fallback("context", lambda index: index.get_relevant_context(
+                question_embedding, study_program, org_id, limit=limit, filter_by_org=filter_by_org))
+
+        if not self.breaker.allow():
+            return fallback()
         try:
             # Normalize the study program name
             study_program = WeaviateManager.normalize_study_program_name(study_program)
@@ -336,17 +448,21 @@ class WeaviateManager:
                     'content': result.properties[DocumentSchema.CONTENT.value],
                     'link': result.properties.get(DocumentSchema.LINK.value, None),
                     'title': result.properties.get(DocumentSchema.TITLE.value, None),
+                    # Kept for the rerank policy, which may rank by distance instead of calling the reranker
+                    'distance': result.metadata.distance,
                 }
                 for result in query_result.objects
             ]
             
+            self.breaker.record_success()
             return context_list
 
         except Exception as e:
             logging.error(f"Error retrieving relevant context: {e}")
             # tb = traceback.format_exc()
             # logging.error("Traceback:\n%s", tb)
-            return []
+            self.breaker.record_failure(e)
+            return fallback()
 
 
     def get_relevant_sample_questions(self, question: str, question_embedding: List[float], language: str, org_id: int) -> List[SampleQuestion]:
@@ -362,14 +478,22 @@ class WeaviateManager:
         Returns:
             List[SampleQuestion]: A list of SampleQuestion objects, sorted by relevance.
         """
+        sample_questions = self.retrieve_sample_questions(question_embedding=question_embedding, org_id=org_id)
+        return self.rerank_sample_questions(question=question, sample_questions=sample_questions,
+                                            language=language)
+
+    def retrieve_sample_questions(self, question_embedding: List[float], org_id: int) -> List[SampleQuestion]:
+        """Retrieves the sample question candidates by vector similarity, before reranking."""
+        def fallback() -> List[SampleQuestion]:
+            return self._fallback("sample_questions", lambda index: index.retrieve_sample_questions(
+                question_embedding, org_id))
+
+        if not self.breaker.allow():
+            return fallback()
         try:
-            limit = 5
-            top_n = 3
-            min_relevance_score = 0.5
-
             query_result = self.qa_collection.query.near_vector(
                 near_vector=question_embedding,
-                limit=limit,
+                limit=self.SAMPLE_QUESTION_LIMIT,
                 filters=Filter.by_property(QASchema.ORGANISATION_ID.value).equal(org_id),
                 return_metadata=wvc.query.MetadataQuery(certainty=True, score=True, distance=True)
             )
@@ -382,31 +506,52 @@ class WeaviateManager:
                 answer = result.properties.get(QASchema.ANSWER.value, "")
                 study_programs = result.properties.get(QASchema.STUDY_PROGRAMS.value, [])
                 sample_questions.append(SampleQuestion(topic=topic, question=retrieved_question, answer=answer,
-                                                       study_programs=study_programs))
-
-            # Rerank the sample questions using the reranker
-            context_list = [
-                (f"Question: {sq.question}\nAnswer: {sq.answer}" if language == "English"
-                else f"Frage: {sq.question}\nAntwort: {sq.answer}")
-                for sq in sample_questions
-            ]
-            
-            rerank_results = self.reranker.rerank_with_cohere(
-                context_list=context_list, query=question, language=language, top_n=top_n,
-            )
-
-            sorted_sample_questions: List[SampleQuestion] = []
-            for result in rerank_results:
-                idx = result['index']
-                score = result['relevance_score']
-                if score >= min_relevance_score and idx < len(sample_questions):
-                    sorted_sample_questions.append(sample_questions[idx])
-
-            return sorted_sample_questions
+                                                       study_programs=study_programs,
+                                                       distance=result.metadata.distance))
 
         except Exception as e:
             logging.error(f"Error retrieving relevant sample questions: {e}")
-            return []
+            self.breaker.record_failure(e)
+            return fallback()
+
+        self.breaker.record_success()
+        return sample_questions
+
+    def rerank_sample_questions(self, question: str, sample_questions: List[SampleQuestion], language: str,
+                                top_n: Optional[int] = None, min_relevance_score: Optional[float] = None) -> List[SampleQuestion]:
+        """Reranks retrieved sample questions and keeps the top_n above the minimum relevance score."""
+        top_n = self.SAMPLE_QUESTION_TOP_N if top_n is None else top_n
+        rerank_results = self.reranker.rerank_with_cohere(
+            context_list=self.sample_question_documents(sample_questions, language), query=question,
+            language=language, top_n=top_n,
+        )
+        return self.select_sample_questions(sample_questions, rerank_results, top_n=top_n,
+                                            min_relevance_score=min_relevance_score)
+
+    @staticmethod
+    def sample_question_documents(sample_questions: List[SampleQuestion], language: str) -> List[str]:
+        """The texts the sample questions are reranked by."""
+        return [
+            (f"Question: {sq.question}\nAnswer: {sq.answer}" if language == "English"
+            else f"Frage: {sq.question}\nAntwort: {sq.answer}")
+            for sq in sample_questions
+        ]
+
+    @classmethod
+    def select_sample_questions(cls, sample_questions: List[SampleQuestion], rerank_results: List[Dict],
+                                top_n: Optional[int] = None, min_relevance_score: Optional[float] = None) -> List[SampleQuestion]:
+        """Keeps the top_n reranked sample questions that reach the minimum relevance score."""
+        top_n = cls.SAMPLE_QUESTION_TOP_N if top_n is None else top_n
+        min_relevance_score = cls.SAMPLE_QUESTION_MIN_SCORE if min_relevance_score is None else min_relevance_score
+        sorted_sample_questions: List[SampleQuestion] = []
+        for result in rerank_results[:top_n]:
+            idx = result['index']
+            score = result['relevance_score']
+            if score >= min_relevance_score and idx < len(sample_questions):
+                sorted_sample_questions.append(sample_questions[idx].model_copy(
+                    update={'relevance_score': score, 'reranked': result.get('reranked', True)}))
+
+        return sorted_sample_questions
 
     def delete_collections(self):
         """
@@ -0,0 +1,32 @@
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+import httpx
+
+from app.utils.environment import config
+
+# Set by the ResilientModel around a provider call; receives the rate-limit headers of the provider's responses
+rate_limit_listener: ContextVar[Optional[Callable[[httpx.Headers, int], None]]] = ContextVar(
+    "rate_limit_listener", default=None)
+
+
+async def report_rate_limits(response: httpx.Response):
+    listener = rate_limit_listener.get()
+    if listener is not None:
+        listener(response.headers, response.status_code)
+
+
+def model_timeout() -> httpx.Timeout:
+    """Read and connect timeout of every provider request, for the blocking SDK clients as well."""
+    return httpx.Timeout(config.MODEL_TIMEOUT, connect=config.MODEL_CONNECT_TIMEOUT)
+
+
+def create_async_http_client(**kwargs) -> httpx.AsyncClient:
+    """Creates the pooled HTTP client behind the async model interface, sized and timed out per configuration."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=config.MODEL_MAX_CONNECTIONS,
+                            max_keepalive_connections=config.MODEL_MAX_KEEPALIVE_CONNECTIONS),
+        timeout=model_timeout(),
+        event_hooks={"response": [report_rate_limits]},
+        **kwargs
+    )
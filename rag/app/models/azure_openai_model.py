@@ -1,7 +1,9 @@
 import logging
+from typing import Any
 
-from openai.lib.azure import AzureOpenAI
+from openai.lib.azure import AzureOpenAI, AsyncAzureOpenAI
 
+from app.models.async_http import create_async_http_client, model_timeout
 from app.models.openai_base_model import OpenAIBaseModel
 
 
@@ -12,6 +14,12 @@ class AzureOpenAIModel(OpenAIBaseModel):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        # Retries are handled by the ResilientModel around this client
         self._client = AzureOpenAI(api_key=self.api_key, api_version=self.api_version,
-                                   azure_endpoint=self.azure_endpoint)
+                                   azure_endpoint=self.azure_endpoint, timeout=model_timeout(), max_retries=0)
         logging.info("Azure OpenAI client initialized.")
+
+    def create_async_client(self) -> Any:
+        return AsyncAzureOpenAI(api_key=self.api_key, api_version=self.api_version,
+                                azure_endpoint=self.azure_endpoint, http_client=create_async_http_client(),
+                                max_retries=0)
@@ -1,5 +1,6 @@
+import asyncio
 import logging
-from typing import List, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
 from pydantic import BaseModel
 
@@ -22,5 +23,43 @@ class BaseModelClient(BaseModel):
     def embed_batch(self, texts: List[str]) -> List[List[float]]:
         raise NotImplementedError("This method should be implemented by subclasses.")
 
+    # Async interface. Providers override these with native async clients; the defaults run the
+    # blocking methods in a worker thread so every model can be awaited.
+    async def acomplete(self, messages: list) -> str:
+        return await asyncio.to_thread(self.complete, messages)
+
+    async def acomplete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        return await asyncio.to_thread(self.complete_with_tokens, messages)
+
+    async def aembed(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self.embed, text)
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_batch, texts)
+
+    async def acomplete_structured(self, messages: list, schema: Dict, name: str = "response") -> str:
+        """Returns a JSON document following `schema`. Providers without structured output rely on the prompt."""
+        return await self.acomplete(messages)
+
+    async def astream(self, messages: list) -> AsyncIterator[str]:
+        """Yields the completion in chunks as they are generated."""
+        yield await self.acomplete(messages)
+
+    def with_options(self, model: Optional[str] = None, max_tokens: Optional[int] = None,
+                     temperature: Optional[float] = None) -> "BaseModelClient":
+        """Returns a client for the same provider using another model, token limit or temperature for completions.
+        The copy shares the connections of this client."""
+        updates = {key: value for key, value in
+                   (("model", model), ("max_tokens", max_tokens), ("temperature", temperature)) if value is not None}
+        return self.model_copy(update=updates) if updates else self
+
+    def init_model(self):
+        """Prepares the provider for the first request (e.g. loads the model). Called once during bootstrap."""
+        pass
+
     def close_session(self):
         logging.info("Model has been shutdown.")
+
+    async def aclose(self):
+        """Closes the async connection pool. Must be called from the event loop that used it."""
+        pass
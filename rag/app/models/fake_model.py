@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import random
+import re
+import time
+from typing import List, Tuple, Optional, Any, AsyncIterator, Dict
+
+from pydantic import ConfigDict
+
+from app.models.base_model import BaseModelClient
+from app.utils.usage import record_usage
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+DEFAULT_CANNED_ANSWER = (
+    "This is a canned answer from the offline stand-in model. "
+    "Please contact the academic advising team for binding information."
+)
+
+
+class LatencyDistribution:
+    """
+    Samples artificial latencies for the offline stand-in backends.
+
+    The distribution is configured with a compact spec string (all values in milliseconds):
+        "constant:200"          always 200 ms
+        "uniform:100:400"       uniformly between 100 and 400 ms
+        "normal:300:50"         normal with mean 300 ms and std 50 ms (clipped at 0)
+        "lognormal:300:0.5"     log-normal with median 300 ms and sigma 0.5 (heavy tail)
+    """
+
+    KINDS = ("constant", "uniform", "normal", "lognormal")
+
+    def __init__(self, spec: str = "constant:0", seed: Optional[int] = None):
+        self.spec = spec or "constant:0"
+        parts = self.spec.strip().split(":")
+        self.kind = parts[0].lower()
+        if self.kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution '{self.kind}', expected one of {self.KINDS}")
+        self.params = [float(p) for p in parts[1:]] or [0.0]
+        self._random = random.Random(seed)
+
+    def sample(self) -> float:
+        """Returns a latency in seconds."""
+        if self.kind == "constant":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            low, high = self.params[0], self.params[1] if len(self.params) > 1 else self.params[0]
+            ms = self._random.uniform(low, high)
+        elif self.kind == "normal":
+            std = self.params[1] if len(self.params) > 1 else 0.0
+            ms = self._random.gauss(self.params[0], std)
+        else:
+            sigma = self.params[1] if len(self.params) > 1 else 0.5
+            ms = self.params[0] * math.exp(self._random.gauss(0.0, sigma))
+        return max(ms, 0.0) / 1000.0
+
+    def sleep(self):
+        delay = self.sample()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def asleep(self):
+        delay = self.sample()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+class HashEmbedder:
+    """
+    Deterministic feature-hashing embedder. Words and character trigrams are hashed into a fixed
+    number of buckets with a sign bit, and the result is L2-normalised. Texts sharing vocabulary end
+    up close in cosine space, which is enough to exercise retrieval without an embedding service.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if (value >> 63) & 1 else -1.0
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in tokenize(text):
+            index, sign = self._bucket(f"w:{token}")
+            vector[index] += sign * 2.0
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                index, sign = self._bucket(f"t:{padded[i:i + 3]}")
+                vector[index] += sign
+        norm = math.sqrt(sum(v * v for v in vector))
+        if norm == 0:
+            return vector
+        return [v / norm for v in vector]
+
+
+class FakeModel(BaseModelClient):
+    """
+    Offline stand-in for the LLM and embedding providers.
+
+    Modes:
+        canned: answers every prompt with a fixed response; the LLM-as-a-judge prompt is answered with "OK".
+        echo:   answers with the content of the last user message (truncated to max_tokens words).
+    """
+    mode: str = "canned"
+    canned_response: Optional[str] = None
+    embed_dim: int = 384
+    completion_latency: str = "constant:0"
+    embed_latency: str = "constant:0"
+    seed: Optional[int] = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    _embedder: HashEmbedder = None
+    _completion_latency: LatencyDistribution = None
+    _embed_latency: LatencyDistribution = None
+
+    def model_post_init(self, __context: Any) -> None:
+        self._embedder = HashEmbedder(dim=self.embed_dim)
+        self._completion_latency = LatencyDistribution(self.completion_latency, seed=self.seed)
+        self._embed_latency = LatencyDistribution(self.embed_latency, seed=self.seed)
+        logging.info(f"Fake model initialized (mode={self.mode}, embed_dim={self.embed_dim})")
+
+    def _respond(self, messages: list) -> str:
+        system_prompt = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        if "NEEDS_FALSE" in system_prompt:
+            return "OK"
+        if self.mode == "echo":
+            user_messages = [m.get("content", "") for m in messages if m.get("role") == "user"]
+            words = (user_messages[-1] if user_messages else "").split()
+            return " ".join(words[:self.max_tokens])
+        return self.canned_response or DEFAULT_CANNED_ANSWER
+
+    def _answer(self, messages: list, start: float) -> Tuple[str, int]:
+        # Word counts stand in for tokens so usage accounting can be exercised offline
+        answer = self._respond(messages)
+        prompt_tokens = sum(len(tokenize(m.get("content", ""))) for m in messages)
+        completion_tokens = len(tokenize(answer))
+        record_usage(self.model, "completion", prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                     seconds=time.perf_counter() - start)
+        return answer, prompt_tokens + completion_tokens
+
+    def _embed_texts(self, texts: List[str], start: float) -> List[List[float]]:
+        record_usage(self.embed_model, "embedding", prompt_tokens=sum(len(tokenize(text)) for text in texts),
+                     seconds=time.perf_counter() - start)
+        return [self._embedder.embed(text) for text in texts]
+
+    def complete(self, messages: list) -> str:
+        return self.complete_with_tokens(messages)[0]
+
+    def complete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        start = time.perf_counter()
+        self._completion_latency.sleep()
+        return self._answer(messages, start)
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        self._embed_latency.sleep()
+        return self._embed_texts(texts, start)
+
+    async def acomplete(self, messages: list) -> str:
+        return (await self.acomplete_with_tokens(messages))[0]
+
+    async def acomplete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        start = time.perf_counter()
+        await self._completion_latency.asleep()
+        return self._answer(messages, start)
+
+    async def acomplete_structured(self, messages: list, schema: Dict, name: str = "response") -> str:
+        # Enum properties get their first value (e.g. the judge verdict "OK"), all others the regular answer
+        answer = await self.acomplete(messages)
+        return json.dumps({
+            key: prop["enum"][0] if "enum" in prop else answer
+            for key, prop in schema.get("properties", {}).items()
+        })
+
+    async def aembed(self, text: str) -> List[float]:
+        return (await self.aembed_batch([text]))[0]
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        await self._embed_latency.asleep()
+        return self._embed_texts(texts, start)
+
+    async def astream(self, messages: list) -> AsyncIterator[str]:
+        answer = await self.acomplete(messages)
+        for chunk in re.findall(r"\S+\s*", answer):
+            yield chunk
@@ -1,7 +1,9 @@
 import logging
+from typing import Any
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
+from app.models.async_http import create_async_http_client, model_timeout
 from app.models.openai_base_model import OpenAIBaseModel
 
 
@@ -11,5 +13,10 @@ class LocalModel(OpenAIBaseModel):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self._client = OpenAI(base_url=self.endpoint, api_key=self.api_key)
+        # Retries are handled by the ResilientModel around this client
+        self._client = OpenAI(base_url=self.endpoint, api_key=self.api_key, timeout=model_timeout(), max_retries=0)
         logging.info("Local lms API key set.")
+
+    def create_async_client(self) -> Any:
+        return AsyncOpenAI(base_url=self.endpoint, api_key=self.api_key, http_client=create_async_http_client(),
+                           max_retries=0)
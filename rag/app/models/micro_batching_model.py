@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ConfigDict, PrivateAttr, model_validator
+
+from app.models.base_model import BaseModelClient
+from app.utils.metrics import metrics, current_stage
+from app.utils.usage import apportion_usage, capture_usage, current_scope
+
+
+class _PendingEmbedding:
+    __slots__ = ("text", "future", "enqueued_at", "scope", "stage")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+        # The batch is sent from another thread, remember whom to bill for this text
+        self.scope = current_scope()
+        self.stage = current_stage()
+
+
+class MicroBatchingModel(BaseModelClient):
+    """
+    Wraps a model client and coalesces concurrent `embed()` calls into one `embed_batch()` request.
+
+    Calls arriving within `max_wait_ms` of the first queued text (or until `max_batch_size` texts are queued)
+    are sent together and the vectors are handed back to the waiting callers. Completions are passed through.
+    """
+    client: BaseModelClient
+    max_batch_size: int = 16
+    max_wait_ms: float = 5.0
+    max_concurrent_batches: int = 4
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    _queue: Optional[queue.Queue] = PrivateAttr(default=None)
+    _executor: Optional[ThreadPoolExecutor] = PrivateAttr(default=None)
+    _collector: Optional[threading.Thread] = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _pid: Optional[int] = PrivateAttr(default=None)
+
+    @model_validator(mode="before")
+    @classmethod
+    def inherit_model_names(cls, data: Any) -> Any:
+        if isinstance(data, dict) and data.get("client") is not None:
+            data.setdefault("model", data["client"].model)
+            data.setdefault("embed_model", data["client"].embed_model)
+        return data
+
+    def complete(self, messages: list) -> str:
+        return self.client.complete(messages)
+
+    def complete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        return self.client.complete_with_tokens(messages)
+
+    def embed(self, text: str) -> List[float]:
+        return self._submit(text).result()
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        # Bulk requests (e.g. ingestion) are already batched and go straight to the provider
+        if len(texts) >= self.max_batch_size:
+            return self.client.embed_batch(texts)
+        futures = [self._submit(text) for text in texts]
+        return [future.result() for future in futures]
+
+    async def acomplete(self, messages: list) -> str:
+        return await self.client.acomplete(messages)
+
+    async def acomplete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        return await self.client.acomplete_with_tokens(messages)
+
+    async def acomplete_structured(self, messages: list, schema: Dict, name: str = "response") -> str:
+        return await self.client.acomplete_structured(messages, schema, name)
+
+    async def aembed(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self._submit(text))
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) >= self.max_batch_size:
+            return await self.client.aembed_batch(texts)
+        return list(await asyncio.gather(*(asyncio.wrap_future(self._submit(text)) for text in texts)))
+
+    async def astream(self, messages: list) -> AsyncIterator[str]:
+        async for chunk in self.client.astream(messages):
+            yield chunk
+
+    def with_options(self, model: Optional[str] = None, max_tokens: Optional[int] = None,
+                     temperature: Optional[float] = None) -> BaseModelClient:
+        # Clients with other options are only used for completions, which are not batched
+        if model is None and max_tokens is None and temperature is None:
+            return self
+        return self.client.with_options(model=model, max_tokens=max_tokens, temperature=temperature)
+
+    def init_model(self):
+        self.client.init_model()
+
+    def close_session(self):
+        with self._lock:
+            if self._queue is not None and self._pid == os.getpid():
+                self._queue.put(None)
+                self._executor.shutdown(wait=False)
+            self._queue = None
+        self.client.close_session()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def _submit(self, text: str) -> Future:
+        pending = _PendingEmbedding(text)
+        self._ensure_started().put(pending)
+        return pending.future
+
+    def _ensure_started(self) -> queue.Queue:
+        # Threads do not survive a fork, so the collector is started lazily in the process that uses it
+        with self._lock:
+            if self._queue is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_batches,
+                                                    thread_name_prefix="embed-batch")
+                self._collector = threading.Thread(target=self._collect, args=(self._queue, self._executor),
+                                                   name="embed-batch-collector", daemon=True)
+                self._collector.start()
+            return self._queue
+
+    def _collect(self, pending_queue: queue.Queue, executor: ThreadPoolExecutor):
+        max_wait = self.max_wait_ms / 1000.0
+        while True:
+            first = pending_queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = first.enqueued_at + max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = pending_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                executor.submit(self._flush, batch)
+            except RuntimeError:
+                # Executor already shut down, embed in the collector thread
+                self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch: List[_PendingEmbedding]):
+        now = time.perf_counter()
+        for pending in batch:
+            metrics.observe("embed_queue_wait_seconds", now - pending.enqueued_at)
+
+        # Identical texts (e.g. the same FAQ asked concurrently) are embedded once
+        unique_texts: Dict[str, int] = {}
+        for pending in batch:
+            unique_texts.setdefault(pending.text, len(unique_texts))
+        metrics.observe("embed_batch_size", len(unique_texts))
+        metrics.increment("embed_batches_total")
+
+        try:
+            with capture_usage() as records:
+                vectors = self.client.embed_batch(list(unique_texts))
+            shares = [(max(len(pending.text), 1), pending.scope, pending.stage) for pending in batch]
+            for record in records:
+                apportion_usage(record, shares)
+            if vectors is None or len(vectors) != len(unique_texts):
+                raise ValueError(f"Expected {len(unique_texts)} embeddings from the provider")
+        except Exception as e:
+            logging.error(f"Embedding batch of {len(unique_texts)} texts failed: {e}")
+            metrics.increment("embed_batch_errors_total")
+            for pending in batch:
+                if pending.future.set_running_or_notify_cancel():
+                    pending.future.set_exception(e)
+            return
+
+        for pending in batch:
+            # A cancelled `aembed` cancels its future as well; the other callers of the batch still get their vector
+            if pending.future.set_running_or_notify_cancel():
+                pending.future.set_result(vectors[unique_texts[pending.text]])
@@ -1,40 +1,156 @@
+import json
 import logging
+from functools import lru_cache
+from typing import Dict, Optional
 
-from app.models.azure_openai_model import AzureOpenAIModel
 from app.models.base_model import BaseModelClient
-from app.models.local_model import LocalModel
-from app.models.ollama_model import OllamaModel
-from app.models.openai_model import OpenAIModel
 from app.utils.environment import config
 
+# Tasks that can be served by their own model (see TASK_MODELS)
+MODEL_TASKS = ("answer", "judge", "classify", "history_rewrite")
+
 
 def get_model() -> BaseModelClient:
+    """Returns the configured model, with concurrent query embeddings coalesced into batches if enabled."""
+    model = get_provider_model()
+    if config.EMBED_BATCHING.lower() == "true":
+        from app.models.micro_batching_model import MicroBatchingModel
+        logging.info(f"Batching embeddings (window {config.EMBED_BATCH_WINDOW_MS}ms, "
+                     f"max {config.EMBED_BATCH_MAX_SIZE} texts)")
+        model = MicroBatchingModel(client=model, max_wait_ms=config.EMBED_BATCH_WINDOW_MS,
+                                   max_batch_size=config.EMBED_BATCH_MAX_SIZE)
+    return model
+
+
+def get_provider_model() -> BaseModelClient:
     """Select and return the appropriate model based on environment configuration."""
     logging.info('Getting model')
+    providers = [name.strip().lower() for name in (config.MODEL_SPILLOVER or "").split(",") if name.strip()]
+    if len(providers) > 1:
+        from app.models.routing_model import RoutingModel, ProviderRoute
+        logging.info(f"Routing completions over {' -> '.join(providers)} with spillover")
+        max_in_flight = per_provider(config.MODEL_SPILLOVER_MAX_IN_FLIGHT, len(providers), int)
+        budgets = per_provider(config.MODEL_SPILLOVER_LATENCY_BUDGET_MS, len(providers), float)
+        return RoutingModel(routes=[
+            ProviderRoute(name=name, client=create_provider_model(name), max_in_flight=max_in_flight[i],
+                          latency_budget=budgets[i] / 1000.0)
+            for i, name in enumerate(providers)
+        ])
+
     use_ollama = config.USE_OLLAMA.lower() == "true"
     local = config.USE_LOCAL_MODEL.lower() == "true"
-    
-    if local:
+    fake = config.USE_FAKE_MODEL.lower() == "true"
+    if fake:
+        return create_provider_model("fake")
+    elif local:
+        return create_provider_model("local")
+    elif not use_ollama:
+        return create_provider_model("openai" if not config.USE_AZURE == "true" else "azure")
+    else:
+        return create_provider_model("ollama")
+
+
+@lru_cache(maxsize=None)
+def load_task_settings(raw: Optional[str]) -> Dict[str, Dict]:
+    """Parses TASK_MODELS: {"<task>": {"provider": .., "model": .., "max_tokens": .., "temperature": ..}}."""
+    if not raw:
+        return {}
+    try:
+        settings = json.loads(raw)
+    except ValueError as e:
+        logging.error(f"Ignoring invalid TASK_MODELS: {e}")
+        return {}
+    for task in settings:
+        if task not in MODEL_TASKS:
+            logging.warning(f"Ignoring TASK_MODELS entry for unknown task '{task}', expected one of {MODEL_TASKS}")
+    return {task: options for task, options in settings.items() if task in MODEL_TASKS}
+
+
+def get_task_model(task: str, default: BaseModelClient) -> BaseModelClient:
+    """
+    Returns the client for one task. Without an entry in TASK_MODELS this is the default model; otherwise the
+    default (or the entry's provider) with the entry's model, max_tokens and temperature.
+    """
+    settings = load_task_settings(config.TASK_MODELS).get(task)
+    if not settings:
+        return default
+    client = default
+    if settings.get("provider"):
+        client = create_provider_model(settings["provider"].lower())
+    client = client.with_options(model=settings.get("model"), max_tokens=settings.get("max_tokens"),
+                                 temperature=settings.get("temperature"))
+    logging.info(f"Using {client.model} (max_tokens={client.max_tokens}, temperature={client.temperature}) "
+                 f"for task '{task}'")
+    return client
+
+
+def per_provider(values: str, count: int, cast) -> list:
+    """Parses a comma-separated per-provider setting; the last value applies to the remaining providers."""
+    parsed = [cast(value.strip()) for value in values.split(",") if value.strip()]
+    return [parsed[min(i, len(parsed) - 1)] for i in range(count)]
+
+
+def create_provider_model(provider: str) -> BaseModelClient:
+    """Creates the client for one provider with deadlines, retries, hedging and adaptive concurrency around it."""
+    from app.models.resilient_model import ResilientModel
+    hedge_kinds = [kind.strip().lower() for kind in config.MODEL_HEDGING.split(",") if kind.strip()]
+    return ResilientModel(
+        client=create_provider_client(provider), name=provider,
+        timeout=config.MODEL_CALL_TIMEOUT, embed_timeout=config.MODEL_EMBED_TIMEOUT,
+        max_retries=config.MODEL_RETRIES, backoff=config.MODEL_RETRY_BACKOFF_MS / 1000.0,
+        backoff_max=config.MODEL_RETRY_BACKOFF_MAX_MS / 1000.0,
+        hedge_kinds=hedge_kinds, hedge_min_delay=config.MODEL_HEDGE_MIN_DELAY_MS / 1000.0,
+        adaptive_concurrency=config.MODEL_ADAPTIVE_CONCURRENCY.lower() == "true",
+        min_concurrency=config.MODEL_CONCURRENCY_MIN, max_concurrency=config.MODEL_CONCURRENCY_MAX
+    )
+
+
+def create_provider_client(provider: str) -> BaseModelClient:
+    """Creates the client for one provider: fake, local, openai, azure or ollama."""
+    # Provider modules are imported inside the branches so only the selected SDK is loaded at startup
+    if provider == "fake":
+        from app.models.fake_model import FakeModel
+        logging.info(f"Using offline fake model ({config.FAKE_LLM_MODE})")
+        return FakeModel(model="fake-llm", embed_model="fake-embed", mode=config.FAKE_LLM_MODE,
+                         canned_response=config.FAKE_LLM_RESPONSE, embed_dim=config.FAKE_EMBED_DIM,
+                         completion_latency=config.FAKE_LLM_LATENCY, embed_latency=config.FAKE_EMBED_LATENCY,
+                         seed=config.FAKE_SEED)
+
+    elif provider == "local":
+        from app.models.local_model import LocalModel
         logging.info("Using local model")
         return LocalModel(model=config.LOCAL_MODEL, embed_model=config.LOCAL_EMBED_MODEL,
                           api_key=config.LOCAL_API_KEY, endpoint=config.LOCAL_ENDPOINT)
 
-    elif not use_ollama:
-        if not config.USE_AZURE == "true":
-            logging.info("Using OpenAI as model")
-            return OpenAIModel(model=config.OPENAI_MODEL, embed_model=config.OPENAI_EMBEDDING_MODEL,
-                               api_key=config.OPENAI_API_KEY)
-        else:
-            logging.info("Using OpenAI hosted on Azure as model")
-            return AzureOpenAIModel(
-                api_key=config.AZURE_OPENAI_API_KEY,
-                api_version=config.AZURE_OPENAI_VERSION,
-                azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
-                model=config.AZURE_OPENAI_DEPLOYMENT,
-                embed_model=config.AZURE_OPENAI_EMBEDDING_DEPLOYMENT
-            )
-    else:
+    elif provider == "openai":
+        from app.models.openai_model import OpenAIModel
+        logging.info("Using OpenAI as model")
+        return OpenAIModel(model=config.OPENAI_MODEL, embed_model=config.OPENAI_EMBEDDING_MODEL,
+                           api_key=config.OPENAI_API_KEY)
+
+    elif provider == "azure":
+        from app.models.azure_openai_model import AzureOpenAIModel
+        logging.info("Using OpenAI hosted on Azure as model")
+        return AzureOpenAIModel(
+            api_key=config.AZURE_OPENAI_API_KEY,
+            api_version=config.AZURE_OPENAI_VERSION,
+            azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
+            model=config.AZURE_OPENAI_DEPLOYMENT,
+            embed_model=config.AZURE_OPENAI_EMBEDDING_DEPLOYMENT
+        )
+
+    elif provider == "ollama":
         logging.info(f"Using ollama as model: {config.GPU_MODEL} ")
         if not config.GPU_MODEL:
             logging.error("No config gpu model")
-        return OllamaModel(model=config.GPU_MODEL, embed_model=config.GPU_EMBED_MODEL, url=config.GPU_URL)
+        urls = [url.strip() for url in (config.GPU_URLS or "").split(",") if url.strip()]
+        if len(urls) > 1:
+            from app.models.ollama_pool_model import OllamaPoolModel
+            logging.info(f"Balancing requests over {len(urls)} Ollama hosts")
+            return OllamaPoolModel(model=config.GPU_MODEL, embed_model=config.GPU_EMBED_MODEL, urls=urls,
+                                   max_failures=config.GPU_MAX_FAILURES, ejection_seconds=config.GPU_EJECTION_SECONDS,
+                                   health_check_interval=config.GPU_HEALTH_CHECK_INTERVAL)
+        from app.models.ollama_model import OllamaModel
+        return OllamaModel(model=config.GPU_MODEL, embed_model=config.GPU_EMBED_MODEL, url=urls[0] if urls else config.GPU_URL)
+
+    raise ValueError(f"Unknown model provider '{provider}', expected fake, local, openai, azure or ollama")
@@ -1,11 +1,16 @@
+import json
 import logging
-from typing import Dict, Tuple, List, Optional, Any
+import time
+from typing import Dict, Tuple, List, Optional, Any, AsyncIterator
 
+import httpx
 import requests
-from pydantic import ConfigDict
+from pydantic import ConfigDict, PrivateAttr
 
+from app.models.async_http import create_async_http_client
 from app.models.base_model import BaseModelClient
 from app.utils.environment import config
+from app.utils.usage import record_ollama_usage
 
 
 def create_auth_header() -> Dict[str, str]:
@@ -26,65 +31,163 @@ class OllamaModel(BaseModelClient):
     model_config = ConfigDict(arbitrary_types_allowed=True)
     initialized_model: bool = False
 
+    _async_client: Optional[httpx.AsyncClient] = PrivateAttr(default=None)
+
     def model_post_init(self, __context: Any) -> None:
         logging.info("Initializing OllamaModel")
         self.session = requests.Session()
         self.headers = create_auth_header()
-        self.init_model()
 
     def complete(self, messages: list) -> str:
-        try:
-            logging.info("OllamaModel")
-            response = self.session.post(
-                f"{self.url}chat",
-                json={"model": self.model, "messages": messages, "stream": False,
-                      "options": {"logprobs": True, "temperature": self.temperature, "num_predict": self.max_tokens}},
-                headers=self.headers
-            )
-            logging.info(f"Server response time chat: {response.elapsed.total_seconds():.4f} seconds")
-            response_data = response.json()
-            response.raise_for_status()
-            return response_data["message"]["content"]
-        except Exception as e:
-            logging.error(e)
+        logging.info("OllamaModel")
+        start = time.perf_counter()
+        response = self.session.post(
+            f"{self.url}chat",
+            json={"model": self.model, "messages": messages, "stream": False,
+                  "options": {"logprobs": True, "temperature": self.temperature, "num_predict": self.max_tokens}},
+            headers=self.headers,
+            timeout=self._request_timeout()
+        )
+        logging.info(f"Server response time chat: {response.elapsed.total_seconds():.4f} seconds")
+        response.raise_for_status()
+        response_data = response.json()
+        record_ollama_usage(self.model, "completion", response_data, time.perf_counter() - start)
+        return response_data["message"]["content"]
         # confidence = float(response_data['logprobs']['content']) if response_data.get('logprobs') and response_data[
         #     'logprobs'].get('content') is not None else 0.81
         # return response_data["message"]["content"], confidence
 
-    # TODO: Implement getting the tokens
     def complete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        start = time.perf_counter()
         response = self.session.post(
             f"{self.url}chat",
             json={"model": self.model, "messages": messages, "stream": False,
                   "options": {"logprobs": True, "temperature": 0.7}},
-            headers=self.headers
+            headers=self.headers,
+            timeout=self._request_timeout()
         )
-        response_data = response.json()
         response.raise_for_status()
-        return response_data["message"]["content"], -1
+        response_data = response.json()
+        record_ollama_usage(self.model, "completion", response_data, time.perf_counter() - start)
+        total_tokens = response_data.get("prompt_eval_count", 0) + response_data.get("eval_count", 0)
+        return response_data["message"]["content"], total_tokens
 
     def embed(self, text) -> List[float]:
-        try:
-            response = self.session.post(
-                f"{self.url}embeddings",
-                json={"model": self.embed_model, "prompt": text},
-                headers=self.headers
-            )
-            logging.info(f"Server response time embed: {response.elapsed.total_seconds():.4f} seconds")
-            response.raise_for_status()
-            response_data = response.json()
-            return response_data["embedding"]
-        except Exception as e:
-            logging.error(e)
+        start = time.perf_counter()
+        response = self.session.post(
+            f"{self.url}embeddings",
+            json={"model": self.embed_model, "prompt": text},
+            headers=self.headers,
+            timeout=self._request_timeout()
+        )
+        logging.info(f"Server response time embed: {response.elapsed.total_seconds():.4f} seconds")
+        response.raise_for_status()
+        response_data = response.json()
+        # The legacy endpoint does not report token counts
+        record_ollama_usage(self.embed_model, "embedding", response_data, time.perf_counter() - start)
+        return response_data["embedding"]
 
     def embed_batch(self, texts: List[str]) -> List[List[float]]:
-        raise NotImplementedError("TODO: IMPLEMENT THIS METHOD IF POSSIBLE")
+        start = time.perf_counter()
+        response = self.session.post(
+            f"{self.url}embed",
+            json={"model": self.embed_model, "input": texts},
+            headers=self.headers,
+            timeout=self._request_timeout()
+        )
+        logging.info(f"Server response time embed batch ({len(texts)}): {response.elapsed.total_seconds():.4f} seconds")
+        response.raise_for_status()
+        response_data = response.json()
+        record_ollama_usage(self.embed_model, "embedding", response_data, time.perf_counter() - start)
+        return response_data["embeddings"]
+
+    @staticmethod
+    def _request_timeout() -> Tuple[float, float]:
+        # Without a timeout a hung GPU request would block the calling thread forever
+        return config.MODEL_CONNECT_TIMEOUT, config.MODEL_TIMEOUT
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = create_async_http_client(headers=self.headers)
+        return self._async_client
+
+    def _chat_payload(self, messages: list, stream: bool, schema: Optional[Dict] = None) -> Dict[str, Any]:
+        payload = {"model": self.model, "messages": messages, "stream": stream,
+                   "options": {"temperature": self.temperature, "num_predict": self.max_tokens}}
+        if schema is not None:
+            # Ollama constrains the output to the given JSON schema
+            payload["format"] = schema
+        return payload
+
+    async def acomplete(self, messages: list) -> str:
+        return (await self.acomplete_with_tokens(messages))[0]
+
+    async def acomplete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        start = time.perf_counter()
+        response = await self._get_async_client().post(f"{self.url}chat", json=self._chat_payload(messages, False))
+        response.raise_for_status()
+        response_data = response.json()
+        record_ollama_usage(self.model, "completion", response_data, time.perf_counter() - start)
+        total_tokens = response_data.get("prompt_eval_count", 0) + response_data.get("eval_count", 0)
+        return response_data["message"]["content"], total_tokens
+
+    async def acomplete_structured(self, messages: list, schema: Dict, name: str = "response") -> str:
+        start = time.perf_counter()
+        response = await self._get_async_client().post(f"{self.url}chat",
+                                                       json=self._chat_payload(messages, False, schema=schema))
+        response.raise_for_status()
+        response_data = response.json()
+        record_ollama_usage(self.model, "completion", response_data, time.perf_counter() - start)
+        return response_data["message"]["content"]
+
+    async def aembed(self, text: str) -> List[float]:
+        return (await self.aembed_batch([text]))[0]
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        response = await self._get_async_client().post(
+            f"{self.url}embed", json={"model": self.embed_model, "input": texts}
+        )
+        response.raise_for_status()
+        response_data = response.json()
+        record_ollama_usage(self.embed_model, "embedding", response_data, time.perf_counter() - start)
+        return response_data["embeddings"]
+
+    async def astream(self, messages: list) -> AsyncIterator[str]:
+        # Ollama streams one JSON object per line, the last one carries the token counts
+        start = time.perf_counter()
+        async with self._get_async_client().stream(
+                "POST", f"{self.url}chat", json=self._chat_payload(messages, True)) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                content = chunk.get("message", {}).get("content")
+                if content:
+                    yield content
+                if chunk.get("done"):
+                    record_ollama_usage(self.model, "completion", chunk, time.perf_counter() - start)
+                    break
 
     def close_session(self):
         """Close session when done"""
         if self.session:
             self.session.close()
 
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def with_options(self, model: Optional[str] = None, max_tokens: Optional[int] = None,
+                     temperature: Optional[float] = None) -> "OllamaModel":
+        client = super().with_options(model=model, max_tokens=max_tokens, temperature=temperature)
+        if client.model != self.model:
+            # Another model has to be loaded into GPU memory first
+            client.initialized_model = False
+        return client
+
     def init_model(self):
         """Make sure the model is initialized once, not on every request."""
         if not self.initialized_model:
@@ -0,0 +1,246 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import requests
+from pydantic import ConfigDict, PrivateAttr
+
+from app.models.base_model import BaseModelClient
+from app.models.ollama_model import OllamaModel
+from app.utils.metrics import metrics
+
+
+class OllamaHost:
+    """Routing state of one Ollama server in the pool."""
+
+    def __init__(self, client: OllamaModel):
+        self.client = client
+        self.url = client.url
+        self.in_flight = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.warmed_up = False
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+
+class OllamaPoolModel(BaseModelClient):
+    """
+    Spreads requests over several Ollama servers serving the same models.
+
+    Every call goes to the available host with the fewest in-flight requests. A host that fails `max_failures` calls
+    in a row is ejected for `ejection_seconds`; a background health check re-admits it (and warms it up) once it
+    answers again. If every host is ejected, the one that was ejected first is used rather than failing outright.
+    """
+    urls: List[str]
+    max_failures: int = 3
+    ejection_seconds: float = 30.0
+    health_check_interval: float = 10.0
+    health_check_timeout: float = 2.0
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    _hosts: List[OllamaHost] = PrivateAttr(default_factory=list)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _rotation: Any = PrivateAttr(default_factory=itertools.count)
+    _stop_event: threading.Event = PrivateAttr(default_factory=threading.Event)
+    _health_thread: Optional[threading.Thread] = PrivateAttr(default=None)
+    _pid: Optional[int] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        logging.info(f"Initializing Ollama pool with {len(self.urls)} hosts")
+        self._hosts = [
+            OllamaHost(OllamaModel(model=self.model, embed_model=self.embed_model, url=url,
+                                   max_tokens=self.max_tokens, temperature=self.temperature))
+            for url in self.urls
+        ]
+
+    # --- Routing ---
+
+    def _acquire(self) -> OllamaHost:
+        self._ensure_health_checks()
+        with self._lock:
+            candidates = [host for host in self._hosts if host.available]
+            if not candidates:
+                candidates = [min(self._hosts, key=lambda host: host.ejected_until)]
+            # Rotate the starting point so ties are spread evenly
+            offset = next(self._rotation) % len(candidates)
+            rotated = candidates[offset:] + candidates[:offset]
+            host = min(rotated, key=lambda host: host.in_flight)
+            host.in_flight += 1
+            in_flight = host.in_flight
+        metrics.increment("ollama_requests_total", host=host.url)
+        metrics.set_gauge("ollama_in_flight", in_flight, host=host.url)
+        return host
+
+    def _release(self, host: OllamaHost, succeeded: bool):
+        with self._lock:
+            host.in_flight -= 1
+            in_flight = host.in_flight
+            if succeeded:
+                host.failures = 0
+            else:
+                host.failures += 1
+                if host.failures >= self.max_failures and host.available:
+                    self._eject(host, f"{host.failures} consecutive failures")
+        metrics.set_gauge("ollama_in_flight", in_flight, host=host.url)
+
+    def _eject(self, host: OllamaHost, reason: str):
+        host.ejected_until = time.monotonic() + self.ejection_seconds
+        logging.warning(f"Ejecting Ollama host {host.url} for {self.ejection_seconds:.0f}s: {reason}")
+        metrics.increment("ollama_ejections_total", host=host.url)
+        metrics.set_gauge("ollama_host_available", 0, host=host.url)
+
+    def _readmit(self, host: OllamaHost):
+        with self._lock:
+            was_ejected = not host.available
+            host.ejected_until = 0.0
+            host.failures = 0
+        if was_ejected:
+            logging.info(f"Ollama host {host.url} is healthy again")
+        metrics.set_gauge("ollama_host_available", 1, host=host.url)
+
+    def _call(self, method: str, *args):
+        host = self._acquire()
+        succeeded = False
+        try:
+            result = getattr(host.client, method)(*args)
+            succeeded = True
+            return result
+        finally:
+            self._release(host, succeeded)
+
+    async def _acall(self, method: str, *args):
+        host = self._acquire()
+        succeeded = False
+        try:
+            result = await getattr(host.client, method)(*args)
+            succeeded = True
+            return result
+        finally:
+            self._release(host, succeeded)
+
+    # --- Model interface ---
+
+    def complete(self, messages: list) -> str:
+        return self._call("complete", messages)
+
+    def complete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        return self._call("complete_with_tokens", messages)
+
+    def embed(self, text: str) -> List[float]:
+        return self._call("embed", text)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self._call("embed_batch", texts)
+
+    async def acomplete(self, messages: list) -> str:
+        return await self._acall("acomplete", messages)
+
+    async def acomplete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        return await self._acall("acomplete_with_tokens", messages)
+
+    async def acomplete_structured(self, messages: list, schema: Dict, name: str = "response") -> str:
+        return await self._acall("acomplete_structured", messages, schema, name)
+
+    async def aembed(self, text: str) -> List[float]:
+        return await self._acall("aembed", text)
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        return await self._acall("aembed_batch", texts)
+
+    async def astream(self, messages: list) -> AsyncIterator[str]:
+        host = self._acquire()
+        succeeded = False
+        try:
+            async for chunk in host.client.astream(messages):
+                yield chunk
+            succeeded = True
+        finally:
+            self._release(host, succeeded)
+
+    def with_options(self, model: Optional[str] = None, max_tokens: Optional[int] = None,
+                     temperature: Optional[float] = None) -> "OllamaPoolModel":
+        updates = {key: value for key, value in
+                   (("model", model), ("max_tokens", max_tokens), ("temperature", temperature)) if value is not None}
+        if not updates:
+            return self
+        # A separate pool, as the hosts may have to load another model and are tracked per model
+        return OllamaPoolModel(**{**self.model_dump(), **updates})
+
+    # --- Warm-up and health checks ---
+
+    def _warm_up(self, host: OllamaHost):
+        start = time.perf_counter()
+        host.client.complete([{"role": "user", "content": "Hi"}])
+        host.client.initialized_model = True
+        host.warmed_up = True
+        logging.info(f"Warmed up Ollama host {host.url} in {time.perf_counter() - start:.2f}s")
+
+    def init_model(self):
+        """Loads the model on every host in parallel. Hosts that fail are ejected; fails only if none is usable."""
+        def warm_up(host: OllamaHost) -> bool:
+            try:
+                self._warm_up(host)
+                self._readmit(host)
+                return True
+            except Exception as e:
+                with self._lock:
+                    self._eject(host, str(e))
+                return False
+
+        with ThreadPoolExecutor(max_workers=len(self._hosts)) as executor:
+            results = list(executor.map(warm_up, self._hosts))
+        if not any(results):
+            raise RuntimeError("No Ollama host could be warmed up")
+        self._ensure_health_checks()
+
+    def check_host(self, host: OllamaHost) -> bool:
+        try:
+            response = requests.get(f"{host.url}tags", headers=host.client.headers, timeout=self.health_check_timeout)
+            response.raise_for_status()
+            return True
+        except Exception as e:
+            logging.debug(f"Health check of {host.url} failed: {e}")
+            return False
+
+    def _run_health_checks(self, stop_event: threading.Event):
+        while not stop_event.wait(self.health_check_interval):
+            for host in self._hosts:
+                if self.check_host(host):
+                    if not host.available or not host.warmed_up:
+                        try:
+                            self._warm_up(host)
+                        except Exception as e:
+                            logging.warning(f"Ollama host {host.url} is up but warm-up failed: {e}")
+                            continue
+                    self._readmit(host)
+                elif host.available:
+                    with self._lock:
+                        self._eject(host, "health check failed")
+
+    def _ensure_health_checks(self):
+        # Threads do not survive a fork, so the checker is started lazily in the process that routes requests
+        with self._lock:
+            if self._health_thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop_event = threading.Event()
+            self._health_thread = threading.Thread(target=self._run_health_checks, args=(self._stop_event,),
+                                                   name="ollama-health-check", daemon=True)
+            self._health_thread.start()
+
+    def close_session(self):
+        self._stop_event.set()
+        for host in self._hosts:
+            host.client.close_session()
+
+    async def aclose(self):
+        for host in self._hosts:
+            await host.client.aclose()
@@ -1,38 +1,56 @@
 import logging
-from typing import Any, List, Tuple
+import time
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
 from app.models.base_model import BaseModelClient
+from app.utils.usage import record_openai_usage
 
 
 class OpenAIBaseModel(BaseModelClient):
     _client: Any
+    _async_client: Any = None
+
+    def create_async_client(self) -> Any:
+        """Returns the provider's async SDK client. Called lazily so the pool is bound to the serving event loop."""
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    def _get_async_client(self) -> Any:
+        if self._async_client is None:
+            self._async_client = self.create_async_client()
+        return self._async_client
 
     def complete(self, messages: list) -> str:
+        start = time.perf_counter()
         response = self._client.chat.completions.create(
             model=self.model,
             messages=messages,
             max_tokens=self.max_tokens,
             temperature=self.temperature
         )
+        record_openai_usage(self.model, "completion", response.usage, time.perf_counter() - start)
         return response.choices[0].message.content
 
     def complete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        start = time.perf_counter()
         response = self._client.chat.completions.create(
             model=self.model,
             messages=messages,
             max_tokens=self.max_tokens,
             temperature=self.temperature
         )
+        record_openai_usage(self.model, "completion", response.usage, time.perf_counter() - start)
         content = response.choices[0].message.content
         total_tokens = response.usage.total_tokens if hasattr(response, 'usage') else None
         return content, total_tokens
 
     def embed(self, text: str) -> List[float]:
         try:
+            start = time.perf_counter()
             response = self._client.embeddings.create(
                 model=self.embed_model,
                 input=text
             )
+            record_openai_usage(self.embed_model, "embedding", response.usage, time.perf_counter() - start)
             return response.data[0].embedding
         except Exception as e:
             logging.error("Error occurred while creating embeddings: %s", str(e))
@@ -40,8 +58,88 @@ class OpenAIBaseModel(BaseModelClient):
             raise
 
     def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
         response = self._client.embeddings.create(
             model=self.embed_model,
             input=texts
         )
+        record_openai_usage(self.embed_model, "embedding", response.usage, time.perf_counter() - start)
         return [item.embedding for item in response.data]
+
+    async def acomplete(self, messages: list) -> str:
+        start = time.perf_counter()
+        response = await self._get_async_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature
+        )
+        record_openai_usage(self.model, "completion", response.usage, time.perf_counter() - start)
+        return response.choices[0].message.content
+
+    async def acomplete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        start = time.perf_counter()
+        response = await self._get_async_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature
+        )
+        record_openai_usage(self.model, "completion", response.usage, time.perf_counter() - start)
+        content = response.choices[0].message.content
+        total_tokens = response.usage.total_tokens if response.usage else None
+        return content, total_tokens
+
+    async def acomplete_structured(self, messages: list, schema: Dict, name: str = "response") -> str:
+        start = time.perf_counter()
+        response = await self._get_async_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            response_format={"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+        )
+        record_openai_usage(self.model, "completion", response.usage, time.perf_counter() - start)
+        return response.choices[0].message.content
+
+    async def aembed(self, text: str) -> List[float]:
+        start = time.perf_counter()
+        response = await self._get_async_client().embeddings.create(
+            model=self.embed_model,
+            input=text
+        )
+        record_openai_usage(self.embed_model, "embedding", response.usage, time.perf_counter() - start)
+        return response.data[0].embedding
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        response = await self._get_async_client().embeddings.create(
+            model=self.embed_model,
+            input=texts
+        )
+        record_openai_usage(self.embed_model, "embedding", response.usage, time.perf_counter() - start)
+        return [item.embedding for item in response.data]
+
+    async def astream(self, messages: list) -> AsyncIterator[str]:
+        start = time.perf_counter()
+        stream = await self._get_async_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        usage = None
+        async for chunk in stream:
+            # The final chunk carries the usage and no choices
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        record_openai_usage(self.model, "completion", usage, time.perf_counter() - start)
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
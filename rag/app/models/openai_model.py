@@ -1,7 +1,9 @@
 import logging
+from typing import Any
 
 import openai
 
+from app.models.async_http import create_async_http_client, model_timeout
 from app.models.openai_base_model import OpenAIBaseModel
 
 
@@ -14,7 +16,9 @@ class OpenAIModel(OpenAIBaseModel):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        openai.api_key = self.api_key
-        openai.api_type = "openai"
-        self._client = openai
+        # Retries are handled by the ResilientModel around this client
+        self._client = openai.OpenAI(api_key=self.api_key, timeout=model_timeout(), max_retries=0)
         logging.info("OpenAI API key set.")
+
+    def create_async_client(self) -> Any:
+        return openai.AsyncOpenAI(api_key=self.api_key, http_client=create_async_http_client(), max_retries=0)
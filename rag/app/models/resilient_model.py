@@ -0,0 +1,473 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, ClassVar, Deque, Dict, List, Optional, Tuple
+
+import httpx
+from pydantic import ConfigDict, PrivateAttr, model_validator
+
+from app.models.async_http import rate_limit_listener
+from app.models.base_model import BaseModelClient
+from app.utils.circuit_breaker import (TRANSIENT_ERRORS, CircuitBreaker, CircuitOpenError, circuit_breakers,
+                                       is_backend_failure, status_code_of)
+from app.utils.deadline import current_deadline, deadline_exceeded
+from app.utils.metrics import Histogram, current_stage, metrics
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: BaseException) -> bool:
+    return isinstance(error, TRANSIENT_ERRORS) or status_code_of(error) in RETRYABLE_STATUS_CODES
+
+
+def retry_after_of(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for one provider that follows its feedback (AIMD): every successful call raises the limit
+    slightly, rate limiting (a 429 or little remaining request/token budget in the rate-limit headers) halves it.
+    Callers over the limit wait in FIFO order; both threads and coroutines can acquire a slot.
+    """
+
+    DECREASE_FACTOR = 0.5
+    # Share of the provider's request or token budget below which it counts as congested
+    LOW_REMAINING = 0.1
+    # One burst of 429s should only halve the limit once
+    DECREASE_COOLDOWN = 1.0
+
+    def __init__(self, name: str, minimum: int, maximum: int):
+        self.name = name
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._waiters: Deque[Tuple[Optional[asyncio.AbstractEventLoop], Any]] = deque()
+        self._last_decrease = 0.0
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def _dispatch(self):
+        # Called with the lock held: hands free slots to the waiters in order
+        while self._waiters and self._has_capacity():
+            loop, waiter = self._waiters.popleft()
+            self.in_flight += 1
+            if loop is None:
+                waiter.set()
+                continue
+            try:
+                loop.call_soon_threadsafe(self._grant, waiter)
+            except RuntimeError:
+                # The waiter's event loop is closed
+                self.in_flight -= 1
+
+    def _grant(self, future: asyncio.Future):
+        if future.done():
+            # The waiter gave up after the slot was handed to it
+            self.release()
+        else:
+            future.set_result(None)
+
+    async def acquire_async(self, timeout: float):
+        with self._lock:
+            if not self._waiters and self._has_capacity():
+                self.in_flight += 1
+                return
+            future = asyncio.get_running_loop().create_future()
+            waiter = (asyncio.get_running_loop(), future)
+            self._waiters.append(waiter)
+        await asyncio.wait({future}, timeout=timeout)
+        with self._lock:
+            if future.done():
+                return
+            future.cancel()
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        metrics.increment("model_concurrency_timeouts_total", provider=self.name)
+        raise TimeoutError(f"No free slot for {self.name} within {timeout:.1f}s (limit {int(self.limit)})")
+
+    def acquire(self, timeout: float):
+        with self._lock:
+            if not self._waiters and self._has_capacity():
+                self.in_flight += 1
+                return
+            event = threading.Event()
+            waiter = (None, event)
+            self._waiters.append(waiter)
+        event.wait(timeout)
+        with self._lock:
+            if event.is_set():
+                return
+            self._waiters.remove(waiter)
+        metrics.increment("model_concurrency_timeouts_total", provider=self.name)
+        raise TimeoutError(f"No free slot for {self.name} within {timeout:.1f}s (limit {int(self.limit)})")
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._dispatch()
+
+    def succeeded(self):
+        with self._lock:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._dispatch()
+            limit = self.limit
+        metrics.set_gauge("model_concurrency_limit", int(limit), provider=self.name)
+
+    def congested(self, reason: str):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_decrease < self.DECREASE_COOLDOWN:
+                return
+            self._last_decrease = now
+            self.limit = max(self.minimum, self.limit * self.DECREASE_FACTOR)
+            limit = self.limit
+        logging.warning(f"{self.name} is rate limiting ({reason}), lowering the concurrency limit to {int(limit)}")
+        metrics.increment("model_rate_limited_total", provider=self.name, reason=reason)
+        metrics.set_gauge("model_concurrency_limit", int(limit), provider=self.name)
+
+    def observe_headers(self, headers: httpx.Headers, status_code: int):
+        """Feedback from a provider response, see `rate_limit_listener`."""
+        if status_code == 429:
+            self.congested("429")
+            return
+        for budget in ("requests", "tokens"):
+            try:
+                limit = float(headers[f"x-ratelimit-limit-{budget}"])
+                remaining = float(headers[f"x-ratelimit-remaining-{budget}"])
+            except (KeyError, ValueError):
+                continue
+            if limit > 0 and remaining / limit < self.LOW_REMAINING:
+                self.congested(f"low_remaining_{budget}")
+                return
+
+
+class ResilientModel(BaseModelClient):
+    """
+    Wraps a provider client with per-attempt deadlines, retries with jittered exponential backoff on retryable
+    errors (timeouts, connection errors, 408/409/425/429/5xx) and, for the call kinds in `hedge_kinds`, a
+    duplicate request when the first one is slower than the recent p95 of that kind (the first answer wins).
+    An `AdaptiveLimiter` bounds the concurrent calls to the provider and backs off when it signals rate limiting.
+    After repeated timeouts, connection errors or 5xx responses the provider's circuit breaker opens and calls fail
+    fast with CircuitOpenError (which the RoutingModel answers by spilling over to the next provider).
+
+    Deadlines are only enforced for the async interface; the blocking methods rely on the client's own timeouts.
+    Within a request deadline (see app.utils.deadline), attempts are shortened to the remaining budget and raise
+    DeadlineExceededError when it runs out; retries that would not fit are not started.
+    """
+    client: BaseModelClient
+    name: str = "model"
+    timeout: float = 60.0
+    embed_timeout: float = 10.0
+    max_retries: int = 2
+    backoff: float = 0.2
+    backoff_max: float = 5.0
+    hedge_kinds: List[str] = []
+    hedge_min_delay: float = 0.5
+    adaptive_concurrency: bool = True
+    min_concurrency: int = 2
+    max_concurrency: int = 64
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    # Hedging needs a reliable p95 first
+    HEDGE_MIN_SAMPLES: ClassVar[int] = 20
+
+    _limiter: Optional[AdaptiveLimiter] = PrivateAttr(default=None)
+    _breaker: Optional[CircuitBreaker] = PrivateAttr(default=None)
+    _latencies: Dict[Tuple[str, str], Histogram] = PrivateAttr(default_factory=dict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @model_validator(mode="before")
+    @classmethod
+    def inherit_model_names(cls, data: Any) -> Any:
+        if isinstance(data, dict) and data.get("client") is not None:
+            data.setdefault("model", data["client"].model)
+            data.setdefault("embed_model", data["client"].embed_model)
+        return data
+
+    def model_post_init(self, __context: Any) -> None:
+        if self.adaptive_concurrency:
+            self._limiter = AdaptiveLimiter(self.name, self.min_concurrency, self.max_concurrency)
+        self._breaker = circuit_breakers.get(f"model:{self.name}")
+
+    # --- Latency tracking ---
+
+    def _model_name(self, kind: str) -> str:
+        return self.client.model if kind == "completion" else self.client.embed_model
+
+    def _observe_latency(self, kind: str, seconds: float):
+        key = (kind, self._model_name(kind))
+        with self._lock:
+            histogram = self._latencies.get(key)
+            if histogram is None:
+                histogram = self._latencies[key] = Histogram(window=512)
+            histogram.observe(seconds)
+
+    def _hedge_delay(self, kind: str) -> Optional[float]:
+        if kind not in self.hedge_kinds:
+            return None
+        with self._lock:
+            histogram = self._latencies.get((kind, self._model_name(kind)))
+            if histogram is None or len(histogram.recent) < self.HEDGE_MIN_SAMPLES:
+                return None
+            p95 = histogram.percentile(95)
+        return max(p95, self.hedge_min_delay)
+
+    def _backoff_delay(self, attempt: int, error: BaseException) -> float:
+        # Full jitter spreads the retries of concurrent callers; a Retry-After from the provider takes precedence
+        delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (attempt - 1)))
+        retry_after = retry_after_of(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def _record_outcome(self, error: Optional[BaseException] = None):
+        if error is not None and is_backend_failure(error):
+            self._breaker.record_failure(error)
+        else:
+            # The provider answered, even if it rejected the request
+            self._breaker.record_success()
+
+    async def _aadmit(self, timeout: float):
+        """
+        Takes a concurrency slot, then asks the breaker. In this order, because a half-open breaker admits a single
+        probe, which must not be held by a call that times out waiting for a slot and never reports an outcome.
+        """
+        if self._limiter is not None:
+            await self._limiter.acquire_async(timeout)
+        try:
+            self._breaker.before_call()
+        except CircuitOpenError:
+            if self._limiter is not None:
+                self._limiter.release()
+            raise
+
+    def _admit(self, timeout: float):
+        """Blocking variant of `_aadmit`."""
+        if self._limiter is not None:
+            self._limiter.acquire(timeout)
+        try:
+            self._breaker.before_call()
+        except CircuitOpenError:
+            if self._limiter is not None:
+                self._limiter.release()
+            raise
+
+    def _should_retry(self, kind: str, method: str, attempt: int, error: Exception) -> bool:
+        if attempt >= self.max_retries or not is_retryable(error):
+            return False
+        logging.warning(f"{self.name} {method} failed ({type(error).__name__}: {error}), "
+                        f"retry {attempt + 1}/{self.max_retries}")
+        metrics.increment("model_retries_total", provider=self.name, kind=kind)
+        return True
+
+    # --- Async calls ---
+
+    async def _aattempt(self, kind: str, method: str, *args):
+        timeout = self.timeout if kind == "completion" else self.embed_timeout
+        # The request's deadline shortens the attempt; running into it is no fault of the provider
+        deadline = current_deadline()
+        budget_bound = deadline is not None and deadline.remaining() < timeout
+        if budget_bound:
+            timeout = deadline.remaining()
+            if timeout <= 0:
+                raise deadline_exceeded(current_stage() or kind)
+        try:
+            await self._aadmit(timeout)
+        except TimeoutError:
+            if budget_bound:
+                raise deadline_exceeded(current_stage() or kind) from None
+            raise
+        # The wait for a slot counts against the request's budget, not against the call timeout
+        if deadline is not None and deadline.remaining() < timeout:
+            budget_bound = True
+            timeout = deadline.remaining()
+        token = rate_limit_listener.set(self._limiter.observe_headers if self._limiter is not None else None)
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(getattr(self.client, method)(*args), timeout)
+        except asyncio.TimeoutError:
+            if budget_bound:
+                raise deadline_exceeded(current_stage() or kind) from None
+            metrics.increment("model_timeouts_total", provider=self.name, kind=kind)
+            error = TimeoutError(f"{self.name} {method} exceeded its deadline of {timeout:.1f}s")
+            self._record_outcome(error)
+            raise error from None
+        except Exception as e:
+            self._record_outcome(e)
+            if self._limiter is not None and status_code_of(e) == 429:
+                self._limiter.congested("429")
+            raise
+        else:
+            self._record_outcome()
+            self._observe_latency(kind, time.perf_counter() - start)
+            if self._limiter is not None:
+                self._limiter.succeeded()
+            return result
+        finally:
+            rate_limit_listener.reset(token)
+            if self._limiter is not None:
+                self._limiter.release()
+
+    async def _ahedged(self, kind: str, method: str, *args):
+        delay = self._hedge_delay(kind)
+        if delay is None:
+            return await self._aattempt(kind, method, *args)
+
+        primary = asyncio.ensure_future(self._aattempt(kind, method, *args))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        metrics.increment("model_hedges_total", provider=self.name, kind=kind)
+        hedge = asyncio.ensure_future(self._aattempt(kind, method, *args))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            metrics.increment("model_hedge_wins_total", provider=self.name, kind=kind)
+                        return task.result()
+            raise primary.exception()
+        finally:
+            for task in (primary, hedge):
+                if not task.done():
+                    task.cancel()
+
+    async def _acall(self, kind: str, method: str, *args):
+        attempt = 0
+        while True:
+            try:
+                return await self._ahedged(kind, method, *args)
+            except Exception as e:
+                if not self._should_retry(kind, method, attempt, e):
+                    raise
+                attempt += 1
+                delay = self._backoff_delay(attempt, e)
+                deadline = current_deadline()
+                if deadline is not None and deadline.remaining() <= delay:
+                    raise
+                await asyncio.sleep(delay)
+
+    # --- Blocking calls ---
+
+    def _attempt(self, kind: str, method: str, *args):
+        timeout = self.timeout if kind == "completion" else self.embed_timeout
+        self._admit(timeout)
+        start = time.perf_counter()
+        try:
+            result = getattr(self.client, method)(*args)
+        except Exception as e:
+            self._record_outcome(e)
+            if self._limiter is not None and status_code_of(e) == 429:
+                self._limiter.congested("429")
+            raise
+        else:
+            self._record_outcome()
+            self._observe_latency(kind, time.perf_counter() - start)
+            if self._limiter is not None:
+                self._limiter.succeeded()
+            return result
+        finally:
+            if self._limiter is not None:
+                self._limiter.release()
+
+    def _call(self, kind: str, method: str, *args):
+        attempt = 0
+        while True:
+            try:
+                return self._attempt(kind, method, *args)
+            except Exception as e:
+                if not self._should_retry(kind, method, attempt, e):
+                    raise
+                attempt += 1
+                time.sleep(self._backoff_delay(attempt, e))
+
+    # --- Model interface ---
+
+    def complete(self, messages: list) -> str:
+        return self._call("completion", "complete", messages)
+
+    def complete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        return self._call("completion", "complete_with_tokens", messages)
+
+    def embed(self, text: str) -> List[float]:
+        return self._call("embedding", "embed", text)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self._call("embedding", "embed_batch", texts)
+
+    async def acomplete(self, messages: list) -> str:
+        return await self._acall("completion", "acomplete", messages)
+
+    async def acomplete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        return await self._acall("completion", "acomplete_with_tokens", messages)
+
+    async def acomplete_structured(self, messages: list, schema: Dict, name: str = "response") -> str:
+        return await self._acall("completion", "acomplete_structured", messages, schema, name)
+
+    async def aembed(self, text: str) -> List[float]:
+        return await self._acall("embedding", "aembed", text)
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        return await self._acall("embedding", "aembed_batch", texts)
+
+    async def astream(self, messages: list) -> AsyncIterator[str]:
+        # Only retried until the first chunk arrives, the caller may already have sent the earlier ones
+        attempt = 0
+        while True:
+            await self._aadmit(self.timeout)
+            yielded = False
+            try:
+                async for chunk in self.client.astream(messages):
+                    if not yielded:
+                        self._record_outcome()
+                    yielded = True
+                    yield chunk
+                if not yielded:
+                    self._record_outcome()
+                if self._limiter is not None:
+                    self._limiter.succeeded()
+                return
+            except Exception as e:
+                if not yielded:
+                    self._record_outcome(e)
+                if yielded or not self._should_retry("completion", "astream", attempt, e):
+                    raise
+                attempt += 1
+                delay = self._backoff_delay(attempt, e)
+            finally:
+                if self._limiter is not None:
+                    self._limiter.release()
+            await asyncio.sleep(delay)
+
+    def with_options(self, model: Optional[str] = None, max_tokens: Optional[int] = None,
+                     temperature: Optional[float] = None) -> "ResilientModel":
+        client = self.client.with_options(model=model, max_tokens=max_tokens, temperature=temperature)
+        if client is self.client:
+            return self
+        # Same provider, so the concurrency limit and circuit breaker are shared; latencies are tracked per model
+        return self.model_copy(update={"client": client, "model": client.model})
+
+    def init_model(self):
+        self.client.init_model()
+
+    def close_session(self):
+        self.client.close_session()
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,214 @@
+import logging
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ConfigDict, PrivateAttr, model_validator
+
+from app.models.base_model import BaseModelClient
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.metrics import metrics
+
+
+class ProviderRoute:
+    """One provider behind the RoutingModel with its load limits and recent latency."""
+
+    LATENCY_SMOOTHING = 0.2
+    # Latency samples older than this are ignored, so a provider that was skipped gets probed again
+    LATENCY_MAX_AGE = 60.0
+
+    def __init__(self, name: str, client: BaseModelClient, max_in_flight: int, latency_budget: float):
+        self.name = name
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.latency_budget = latency_budget
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self.latency_updated_at = 0.0
+
+    def recent_latency(self) -> Optional[float]:
+        if self.latency is None or time.monotonic() - self.latency_updated_at > self.LATENCY_MAX_AGE:
+            return None
+        return self.latency
+
+    def within_budget(self) -> bool:
+        latency = self.recent_latency()
+        return self.in_flight < self.max_in_flight and (latency is None or latency <= self.latency_budget)
+
+    def load(self) -> float:
+        return self.in_flight / max(self.max_in_flight, 1)
+
+    def observe_latency(self, seconds: float):
+        if self.recent_latency() is None:
+            self.latency = seconds
+        else:
+            self.latency += self.LATENCY_SMOOTHING * (seconds - self.latency)
+        self.latency_updated_at = time.monotonic()
+
+
+class RoutingModel(BaseModelClient):
+    """
+    Sends each completion to the first provider (in order of preference, i.e. cheapest first) whose in-flight
+    requests and recent latency are within its budget, and spills over to the next one otherwise. When every
+    provider is over budget the relatively least loaded one is used.
+
+    Embeddings always go to the first provider: vectors from different embedding models are not comparable
+    with the ones stored in Weaviate.
+    """
+    routes: List[ProviderRoute]
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @model_validator(mode="before")
+    @classmethod
+    def inherit_model_names(cls, data: Any) -> Any:
+        if isinstance(data, dict) and data.get("routes"):
+            primary = data["routes"][0].client
+            data.setdefault("model", primary.model)
+            data.setdefault("embed_model", primary.embed_model)
+        return data
+
+    @property
+    def primary(self) -> BaseModelClient:
+        return self.routes[0].client
+
+    def _select(self, exclude: Tuple[ProviderRoute, ...] = ()) -> ProviderRoute:
+        with self._lock:
+            candidates = [route for route in self.routes if route not in exclude]
+            route = next((route for route in candidates if route.within_budget()), None)
+            if route is None:
+                route = min(candidates, key=lambda candidate: candidate.load())
+            route.in_flight += 1
+            in_flight = route.in_flight
+        metrics.increment("model_route_total", provider=route.name)
+        if route is not self.routes[0]:
+            metrics.increment("model_spillover_total", provider=route.name)
+        metrics.set_gauge("model_route_in_flight", in_flight, provider=route.name)
+        return route
+
+    def _finish(self, route: ProviderRoute, start: float, succeeded: bool):
+        duration = time.perf_counter() - start
+        with self._lock:
+            route.in_flight -= 1
+            in_flight = route.in_flight
+            if succeeded:
+                route.observe_latency(duration)
+        metrics.set_gauge("model_route_in_flight", in_flight, provider=route.name)
+        if succeeded:
+            metrics.observe("model_route_seconds", duration, provider=route.name)
+        else:
+            metrics.increment("model_route_errors_total", provider=route.name)
+
+    def _call(self, method: str, *args):
+        tried: Tuple[ProviderRoute, ...] = ()
+        while True:
+            route = self._select(tried)
+            tried += (route,)
+            start = time.perf_counter()
+            succeeded = False
+            try:
+                result = getattr(route.client, method)(*args)
+                succeeded = True
+                return result
+            except CircuitOpenError:
+                if len(tried) == len(self.routes):
+                    raise
+            finally:
+                self._finish(route, start, succeeded)
+
+    async def _acall(self, method: str, *args):
+        tried: Tuple[ProviderRoute, ...] = ()
+        while True:
+            route = self._select(tried)
+            tried += (route,)
+            start = time.perf_counter()
+            succeeded = False
+            try:
+                result = await getattr(route.client, method)(*args)
+                succeeded = True
+                return result
+            except CircuitOpenError:
+                if len(tried) == len(self.routes):
+                    raise
+            finally:
+                self._finish(route, start, succeeded)
+
+    def complete(self, messages: list) -> str:
+        return self._call("complete", messages)
+
+    def complete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        return self._call("complete_with_tokens", messages)
+
+    async def acomplete(self, messages: list) -> str:
+        return await self._acall("acomplete", messages)
+
+    async def acomplete_with_tokens(self, messages: list) -> Tuple[str, int]:
+        return await self._acall("acomplete_with_tokens", messages)
+
+    async def acomplete_structured(self, messages: list, schema: Dict, name: str = "response") -> str:
+        return await self._acall("acomplete_structured", messages, schema, name)
+
+    async def astream(self, messages: list) -> AsyncIterator[str]:
+        tried: Tuple[ProviderRoute, ...] = ()
+        while True:
+            route = self._select(tried)
+            tried += (route,)
+            start = time.perf_counter()
+            succeeded = False
+            try:
+                async for chunk in route.client.astream(messages):
+                    yield chunk
+                succeeded = True
+                return
+            except CircuitOpenError:
+                # Raised before the first chunk, so the next provider can still answer
+                if len(tried) == len(self.routes):
+                    raise
+            finally:
+                self._finish(route, start, succeeded)
+
+    def embed(self, text: str) -> List[float]:
+        return self.primary.embed(text)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.primary.embed_batch(texts)
+
+    async def aembed(self, text: str) -> List[float]:
+        return await self.primary.aembed(text)
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        return await self.primary.aembed_batch(texts)
+
+    def with_options(self, model: Optional[str] = None, max_tokens: Optional[int] = None,
+                     temperature: Optional[float] = None) -> "RoutingModel":
+        if model is None and max_tokens is None and temperature is None:
+            return self
+        # Model names are provider specific, so only the primary provider switches models
+        return RoutingModel(routes=[
+            ProviderRoute(name=route.name, max_in_flight=route.max_in_flight, latency_budget=route.latency_budget,
+                          client=route.client.with_options(model=model if i == 0 else None, max_tokens=max_tokens,
+                                                           temperature=temperature))
+            for i, route in enumerate(self.routes)
+        ])
+
+    def init_model(self):
+        errors = []
+        for route in self.routes:
+            try:
+                route.client.init_model()
+            except Exception as e:
+                logging.error(f"Initializing provider {route.name} failed: {e}")
+                errors.append(route.name)
+        # Without the primary provider there are no embeddings, the fallbacks are optional
+        if self.routes[0].name in errors:
+            raise RuntimeError(f"Primary provider {self.routes[0].name} could not be initialized")
+
+    def close_session(self):
+        for route in self.routes:
+            route.client.close_session()
+
+    async def aclose(self):
+        for route in self.routes:
+            await route.client.aclose()
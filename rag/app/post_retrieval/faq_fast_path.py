@@ -0,0 +1,77 @@
+import logging
+from typing import Dict, List, Optional
+
+from app.data.database_requests import SampleQuestion
+from app.managers.weaviate_manager import WeaviateManager
+from app.utils.language_detector import LanguageDetector
+from app.utils.metrics import metrics
+
+# Greeting and closing of email answers, as the email prompt asks the model to write them
+EMAIL_TEMPLATES: Dict[str, str] = {
+    "english": "Dear Student,\n\n{answer}\n\nBest regards, Academic Advising",
+    "german": "Liebe(r) Studierende(r),\n\n{answer}\n\nViele Grüße, Ihre Studienberatung",
+}
+GREETINGS = ("dear", "hello", "hi ", "liebe", "hallo", "guten tag", "sehr geehrte")
+CLOSINGS = ("best regards", "kind regards", "viele grüße", "beste grüße", "mit freundlichen grüßen")
+
+
+class FaqFastPath:
+    """
+    Answers questions that are practically identical to a curated sample question with the advisors' answer, without
+    generation and judge. The best reranked sample question has to reach `min_score` with the reranker and be within
+    `max_distance` of the question by embedding. The placeholder scores of a skipped or failed rerank never match.
+    Its answer also has to be in the question's language and apply to the study program.
+
+    Both thresholds depend on the reranker and embedding model; the observed scores of the best sample questions are
+    recorded in `faq_fast_path_score` for calibration.
+    """
+
+    def __init__(self, enabled: bool = False, min_score: float = 0.9, max_distance: float = 0.1):
+        self.enabled = enabled
+        self.min_score = min_score
+        self.max_distance = max_distance
+
+    def match(self, sample_questions: List[SampleQuestion], language: str, study_program: Optional[str],
+              endpoint: str) -> Optional[SampleQuestion]:
+        """The sample question whose answer can be returned directly, if any (sample questions in rerank order)."""
+        if not self.enabled:
+            return None
+        reason = self._miss_reason(sample_questions, language, study_program)
+        metrics.increment("faq_fast_path_total", endpoint=endpoint, result=reason or "hit")
+        if reason is not None:
+            return None
+        best = sample_questions[0]
+        logging.info(f"FAQ fast path: answering with sample question '{best.question}' "
+                     f"(score {best.relevance_score:.3f}, distance {best.distance:.3f})")
+        return best
+
+    def _miss_reason(self, sample_questions: List[SampleQuestion], language: str,
+                     study_program: Optional[str]) -> Optional[str]:
+        if not sample_questions:
+            return "no_candidates"
+        best = sample_questions[0]
+        if best.relevance_score is None or not best.reranked:
+            return "not_reranked"
+        metrics.observe("faq_fast_path_score", best.relevance_score)
+        if best.relevance_score < self.min_score:
+            return "score"
+        if best.distance is None or best.distance > self.max_distance:
+            return "distance"
+        # Stored study programs are hyphenated, the requests may name them with spaces
+        programs = {WeaviateManager.normalize_study_program_name(program) for program in best.study_programs}
+        program = WeaviateManager.normalize_study_program_name(study_program or "general")
+        if programs and "general" not in programs and program not in programs:
+            return "study_program"
+        if LanguageDetector.get_language(best.answer).lower() != language.lower():
+            return "language"
+        return None
+
+    @staticmethod
+    def email_answer(sample_question: SampleQuestion, language: str) -> str:
+        """The curated answer with the greeting and closing of an email, unless it already has them."""
+        answer = sample_question.answer.strip()
+        lowered = answer.lower()
+        if lowered.startswith(GREETINGS) or any(closing in lowered for closing in CLOSINGS):
+            return answer
+        template = EMAIL_TEMPLATES.get(language.lower(), EMAIL_TEMPLATES["english"])
+        return template.format(answer=answer)
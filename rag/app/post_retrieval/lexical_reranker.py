@@ -0,0 +1,58 @@
+import math
+from typing import List, Dict, Optional
+
+from app.models.base_model import BaseModelClient
+from app.models.fake_model import LatencyDistribution, tokenize
+from app.post_retrieval.reranker import Reranker
+
+
+class LexicalReranker(Reranker):
+    def __init__(self, model: BaseModelClient, latency: str = "constant:0", seed: Optional[int] = None):
+        """
+        Offline stand-in for the Cohere reranker that scores documents by IDF-weighted query term coverage.
+
+        Args:
+            model: The embedding model, kept for interface parity with the Cohere reranker.
+            latency (str): Latency distribution spec, see `LatencyDistribution`.
+            seed (Optional[int]): Seed for the latency sampling.
+        """
+        super().__init__(model=model, api_key_en=None, api_key_multi=None)
+        self.latency = LatencyDistribution(latency, seed=seed)
+
+    def rerank_with_cohere(self, context_list: List[str], query: str, language: str, top_n: int = 5) -> List[Dict]:
+        """
+        Scores each document with the IDF-weighted share of query terms it contains. Scores lie in [0, 1],
+        so the relevance thresholds tuned for Cohere stay meaningful.
+
+        Returns:
+            List[Dict]: The top_n results as {'index', 'relevance_score'} sorted by descending score.
+        """
+        if not context_list:
+            return []
+        self.latency.sleep()
+        return self.score(context_list, query, top_n)
+
+    async def arerank_with_cohere(self, context_list: List[str], query: str, language: str,
+                                  top_n: int = 5) -> List[Dict]:
+        if not context_list:
+            return []
+        await self.latency.asleep()
+        return self.score(context_list, query, top_n)
+
+    @staticmethod
+    def score(context_list: List[str], query: str, top_n: int) -> List[Dict]:
+        query_terms = set(tokenize(query))
+        documents = [set(tokenize(text)) for text in context_list]
+        num_docs = len(documents)
+        weights = {
+            term: math.log(1 + (num_docs + 1) / (1 + sum(1 for doc in documents if term in doc)))
+            for term in query_terms
+        }
+        total_weight = sum(weights.values()) or 1.0
+
+        results = [
+            {'index': index, 'relevance_score': sum(weights[t] for t in query_terms if t in doc) / total_weight}
+            for index, doc in enumerate(documents)
+        ]
+        results.sort(key=lambda result: result['relevance_score'], reverse=True)
+        return results[:top_n]
@@ -0,0 +1,78 @@
+import logging
+from typing import Dict, List, Optional
+
+from app.utils.metrics import metrics
+
+
+class RerankPolicy:
+    """
+    Decides per candidate list whether the reranker is needed or the vector distances already settle the ranking:
+    when there are only a few candidates, when even the nearest one is too far away to be relevant, or when a clear
+    jump in distance (as with Weaviate's autocut) leaves only a few candidates in front.
+
+    Without reranking, candidates in front of the jump and within `max_distance` count as relevant (score 1.0),
+    all others as irrelevant (score 0.0), so the relevance thresholds tuned for Cohere apply unchanged.
+
+    Only distances to the same query vector can be compared, so lists that mix in candidates retrieved for another
+    query (the chat history, or an earlier turn) are always reranked.
+    """
+
+    def __init__(self, enabled: bool = False, max_candidates: int = 2, max_distance: float = 0.45,
+                 gap: float = 0.1):
+        """
+        :param enabled: Whether reranking may be skipped at all.
+        :param max_candidates: Lists with at most this many (relevant) candidates are not reranked.
+        :param max_distance: Cosine distance up to which a candidate counts as relevant without reranking.
+        :param gap: Increase in distance between neighbouring candidates that separates relevant from irrelevant.
+        """
+        self.enabled = enabled
+        self.max_candidates = max_candidates
+        self.max_distance = max_distance
+        self.gap = gap
+
+    def autocut(self, distances: List[float]) -> int:
+        """Number of nearest candidates before the first jump of at least `gap` in distance."""
+        ordered = sorted(distances)
+        for i in range(1, len(ordered)):
+            if ordered[i] - ordered[i - 1] >= self.gap:
+                return i
+        return len(ordered)
+
+    def skip_reason(self, distances: List[Optional[float]]) -> Optional[str]:
+        """Why reranking can be skipped for these candidates, or None if it is needed."""
+        if not self.enabled or not distances or any(distance is None for distance in distances):
+            return None
+        if len(distances) <= self.max_candidates:
+            return "few_candidates"
+        if min(distances) > self.max_distance:
+            return "no_match"
+        if self.autocut(distances) <= self.max_candidates:
+            return "clear_gap"
+        return None
+
+    def needs_rerank(self, group: str, distances: List[Optional[float]], mixed_queries: bool = False) -> bool:
+        """
+        Applies the policy to one candidate list and counts the decision.
+
+        :param mixed_queries: Whether the distances were measured against different query vectors.
+        """
+        if not distances:
+            return False
+        if mixed_queries:
+            metrics.increment("rerank_policy_total", group=group, decision="mixed_queries")
+            return True
+        reason = self.skip_reason(distances)
+        metrics.increment("rerank_policy_total", group=group, decision=reason or "rerank")
+        if reason is not None:
+            logging.info(f"Skipping reranking of {len(distances)} {group} ({reason})")
+        return reason is None
+
+    def score(self, distances: List[float]) -> List[Dict]:
+        """Results in the reranker's format, ordered by distance; the scores are marked as placeholders."""
+        cut = self.autocut(distances)
+        order = sorted(range(len(distances)), key=lambda index: distances[index])
+        return [
+            {'index': index, 'relevance_score': 1.0 if rank < cut and distances[index] <= self.max_distance else 0.0,
+             'reranked': False}
+            for rank, index in enumerate(order)
+        ]
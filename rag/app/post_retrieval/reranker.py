@@ -1,9 +1,10 @@
-import numpy as np
 import logging
-import cohere
 from app.models.base_model import BaseModelClient
-from typing import List, Dict
-import requests
+from app.utils.circuit_breaker import circuit_breakers, is_backend_failure
+from app.utils.environment import config
+from app.utils.metrics import metrics
+from typing import Any, List, Dict, Optional, Tuple
+import httpx
 
 class DocumentWithEmbedding:
     def __init__(self, embedding: List[float], content: str):
@@ -34,6 +35,93 @@ class Reranker:
         self.rerank_url_multi = "https://rerank-35.swedencentral.models.ai.azure.com/v1/rerank"
         # self.rerank_model = "rerank-multilingual-v3.0"
         # self.rerank_modelEn = "rerank-english-v3.0"
+        # While open, reranking is skipped and the documents keep their vector order
+        self.breaker = circuit_breakers.get("reranker")
+        # Keep-alive connection pools, so requests skip the TCP and TLS handshake; the async one is created lazily
+        # on the event loop that uses it
+        self.session = httpx.Client(limits=self._limits(), timeout=self._timeout())
+        self._async_session: Optional[httpx.AsyncClient] = None
+
+    # Rough token estimate for the document budget; the exact count depends on Cohere's tokenizer
+    CHARS_PER_TOKEN = 4
+
+    @staticmethod
+    def _limits() -> httpx.Limits:
+        return httpx.Limits(max_connections=config.RERANK_MAX_CONNECTIONS,
+                            max_keepalive_connections=config.RERANK_MAX_CONNECTIONS)
+
+    @staticmethod
+    def _timeout() -> httpx.Timeout:
+        return httpx.Timeout(config.RERANK_TIMEOUT, connect=config.MODEL_CONNECT_TIMEOUT)
+
+    def _get_async_session(self) -> httpx.AsyncClient:
+        if self._async_session is None:
+            self._async_session = httpx.AsyncClient(limits=self._limits(), timeout=self._timeout())
+        return self._async_session
+
+    def initialize(self):
+        """Checks the reranker configuration. Called once during bootstrap."""
+        if not self.api_key_en or not self.api_key_multi:
+            logging.warning("No Cohere API key configured, reranking requests will fail and fall back to vector order.")
+
+    @classmethod
+    def truncate_document(cls, text: str, max_tokens: int) -> str:
+        """Cuts a document to roughly `max_tokens` tokens at a word boundary; the reranker only needs the prefix."""
+        max_chars = max_tokens * cls.CHARS_PER_TOKEN
+        if max_tokens <= 0 or len(text) <= max_chars:
+            return text
+        cut = text.rfind(" ", 0, max_chars + 1)
+        return text[:cut if cut > 0 else max_chars]
+
+    def _build_request(self, context_list: List[str], query: str, language: str,
+                       top_n: int) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        # Determine the correct endpoint URL and API key based on language
+        if language.lower() == "english":
+            rerank_url = self.rerank_url_en
+            api_key = self.api_key_en
+        else:
+            rerank_url = self.rerank_url_multi
+            api_key = self.api_key_multi
+
+        headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        }
+
+        payload = {
+            'query': query,
+            'documents': [self.truncate_document(text, config.RERANK_MAX_TOKENS) for text in context_list],
+            'top_n': top_n,
+            'return_documents': False
+        }
+        return rerank_url, headers, payload
+
+    def _parse_response(self, response: httpx.Response, context_list: List[str], top_n: int) -> List[Dict]:
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            logging.error(f"Error during Cohere re-ranking: {response.status_code} {response.text}")
+            self._record_outcome(e)
+            return self.vector_order(context_list, top_n)
+        results = response.json().get('results', [])
+        self._record_outcome()
+        return results
+
+    def _record_outcome(self, error: Optional[BaseException] = None):
+        # Same policy as the model breakers: rate limiting and rejected requests do not count against Cohere
+        if error is not None and is_backend_failure(error):
+            self.breaker.record_failure(error)
+        else:
+            self.breaker.record_success()
+
+    def _skip(self, context_list: List[str], top_n: int) -> Optional[List[Dict]]:
+        """The result to use without calling Cohere, or None if it should be called."""
+        if not context_list:
+            return []
+        if not self.breaker.allow():
+            metrics.increment("rerank_skipped_total", reason="circuit_open")
+            return self.vector_order(context_list, top_n)
+        return None
 
     def rerank_with_cohere(self, context_list: List[str], query: str, language: str, top_n: int = 5) -> List[Dict]:
         """
@@ -48,38 +136,47 @@ class Reranker:
         Returns:
             List[Dict]: A list of the re-ranked document contents based on relevance.
         """
+        skipped = self._skip(context_list, top_n)
+        if skipped is not None:
+            return skipped
         try:
-            if not context_list:
-                return []
-            
-            # Determine the correct endpoint URL and API key based on language
-            if language.lower() == "english":
-                rerank_url = self.rerank_url_en
-                api_key = self.api_key_en
-            else:
-                rerank_url = self.rerank_url_multi
-                api_key = self.api_key_multi
-                
-            headers = {
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            }
-
-            payload = {
-                'query': query,
-                'documents': context_list,
-                'top_n': top_n,
-                'return_documents': False
-            }
-
-            response = requests.post(rerank_url, headers=headers, json=payload)
-            if response.status_code != 200:
-                logging.error(f"Error during Cohere re-ranking: {response.status_code} {response.text}")
-                return [{'index': i, 'relevance_score': 1.0} for i in range(min(top_n, len(context_list)))]
-
-            results = response.json().get('results', [])
-            return results
+            rerank_url, headers, payload = self._build_request(context_list, query, language, top_n)
+            response = self.session.post(rerank_url, headers=headers, json=payload)
+            return self._parse_response(response, context_list, top_n)
+        except Exception as e:
+            logging.error(f"Error during Cohere re-ranking: {e}")
+            self._record_outcome(e)
+            return self.vector_order(context_list, top_n)
 
+    async def arerank_with_cohere(self, context_list: List[str], query: str, language: str,
+                                  top_n: int = 5) -> List[Dict]:
+        """Async variant of `rerank_with_cohere` on the pooled async client."""
+        skipped = self._skip(context_list, top_n)
+        if skipped is not None:
+            return skipped
+        try:
+            rerank_url, headers, payload = self._build_request(context_list, query, language, top_n)
+            response = await self._get_async_session().post(rerank_url, headers=headers, json=payload)
+            return self._parse_response(response, context_list, top_n)
         except Exception as e:
             logging.error(f"Error during Cohere re-ranking: {e}")
-            return [{'index': i, 'relevance_score': 1.0} for i in range(min(top_n, len(context_list)))]
\ No newline at end of file
+            self._record_outcome(e)
+            return self.vector_order(context_list, top_n)
+
+    @staticmethod
+    def vector_order(context_list: List[str], top_n: int) -> List[Dict]:
+        """
+        Fallback ranking: the first `top_n` documents in the order the vector search returned them. The placeholder
+        scores are marked with `reranked: False`.
+        """
+        return [{'index': i, 'relevance_score': 1.0, 'reranked': False} for i in range(min(top_n, len(context_list)))]
+
+    def close(self):
+        self.session.close()
+
+    async def aclose(self):
+        """Closes the async connection pool. Must be called from the event loop that used it."""
+        if self._async_session is not None:
+            await self._async_session.aclose()
+            self._async_session = None
+
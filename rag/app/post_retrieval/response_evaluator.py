@@ -1,30 +1,73 @@
+import asyncio
 import logging
+import random
+from typing import Optional, Set
 
 from app.models.base_model import BaseModelClient
 from app.prompt.prompt_manager import PromptManager
+from app.utils.deadline import deadline_scope
+from app.utils.metrics import metrics
 
 
 class ResponseEvaluator:
-    def __init__(self, model: BaseModelClient, prompt_manager: PromptManager):
+    def __init__(self, model: BaseModelClient, prompt_manager: PromptManager, audit_rate: float = 0.0):
+        """
+        :param audit_rate: Share of fused answers (see `process_fused_response`) that are additionally checked by the
+            separate LLM-as-a-judge call in the background to monitor how well the self-assessment agrees with it.
+        """
         self.model = model
         self.prompt_manager = prompt_manager
+        self.audit_rate = audit_rate
+        # Keep references to the running audits, otherwise they may be garbage collected before they finish
+        self._audits: Set[asyncio.Task] = set()
 
-    def process_response(self, question: str, response: str, language: str) -> str:
+    async def process_response(self, question: str, response: str, language: str) -> str:
         if response != "False":
-            response_valid: bool = self.evaluate_response(question=question, response=response, language=language)
-            if response_valid:
-                if language == "german":
-                    response += "\n\n**Diese Antwort wurde automatisch generiert.**"
-                else:
-                    response += "\n\n**This answer was automatically generated.**"
-            else:
-                response = "False"
+            response_valid: bool = await self.evaluate_response(question=question, response=response, language=language)
+            response = self.finalize_response(response, response_valid, language)
         return response
 
-    def evaluate_response(self, question: str, response: str, language: str) -> bool:
+    def process_fused_response(self, question: str, response: str, verdict: Optional[str], language: str) -> str:
+        """Applies the verdict the model returned together with its answer instead of asking the judge separately."""
+        if response == "False":
+            return response
+        response_valid = verdict == "OK"
+        if not response_valid:
+            logging.error("The model does not consider its own answer appropriate.")
+        if self.audit_rate > 0 and random.random() < self.audit_rate:
+            task = asyncio.create_task(self.audit_verdict(question, response, response_valid, language))
+            self._audits.add(task)
+            task.add_done_callback(self._audits.discard)
+        return self.finalize_response(response, response_valid, language)
+
+    async def audit_verdict(self, question: str, response: str, fused_valid: bool, language: str):
+        """Runs the separate judge on a fused answer and records whether both verdicts agree."""
+        try:
+            # Runs after the response and is not bound by the request's deadline
+            with deadline_scope(None):
+                judge_valid = await self.evaluate_response(question=question, response=response, language=language)
+        except Exception as e:
+            logging.error(f"Judge audit failed: {e}")
+            metrics.increment("fused_judge_audit_errors_total")
+            return
+        agreement = "agree" if judge_valid == fused_valid else "disagree"
+        if agreement == "disagree":
+            logging.warning(f"Fused verdict ({'OK' if fused_valid else 'NEEDS_FALSE'}) disagrees with the judge "
+                            f"for question: {question}")
+        metrics.increment("fused_judge_audit_total", agreement=agreement)
+
+    @staticmethod
+    def finalize_response(response: str, response_valid: bool, language: str) -> str:
+        if not response_valid:
+            return "False"
+        if language == "german":
+            return response + "\n\n**Diese Antwort wurde automatisch generiert.**"
+        return response + "\n\n**This answer was automatically generated.**"
+
+    async def evaluate_response(self, question: str, response: str, language: str) -> bool:
         prompt = self.prompt_manager.create_response_evaluation_messages(question=question, answer=response,
                                                                          language=language)
-        output = self.model.complete(prompt).strip()
+        output = (await self.model.acomplete(prompt)).strip()
 
         if "OK" in output:
             return True
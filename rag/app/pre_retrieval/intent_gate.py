@@ -0,0 +1,201 @@
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.managers.weaviate_manager import WeaviateManager
+from app.utils.metrics import metrics
+
+GREETING = "greeting"
+THANKS = "thanks"
+GOODBYE = "goodbye"
+ACKNOWLEDGEMENT = "acknowledgement"
+SMALL_TALK = "small_talk"
+OFF_TOPIC = "off_topic"
+
+# A message consisting only of these words (and at least one anchor) is small talk; earlier intents win,
+# so "ok thanks" is thanks and "hi, thank you" is thanks as well
+INTENT_ANCHORS: List[Tuple[str, set]] = [
+    (THANKS, {"thanks", "thank", "thx", "ty", "danke", "dankeschön", "dank", "merci", "cheers"}),
+    (GOODBYE, {"bye", "goodbye", "tschüss", "tschüs", "ciao", "wiedersehen"}),
+    (GREETING, {"hi", "hello", "hey", "hallo", "moin", "servus", "hiya", "morning", "evening"}),
+    (ACKNOWLEDGEMENT, {"ok", "okay", "alright", "cool", "great", "super", "perfect", "perfekt", "prima", "klar",
+                       "understood", "verstanden", "nice", "gut"}),
+]
+FILLER_WORDS = {
+    "a", "lot", "so", "much", "very", "you", "for", "the", "your", "help", "and", "good", "got", "it", "see",
+    "later", "there", "all", "everyone", "vielen", "sehr", "schön", "für", "die", "ihre", "deine", "hilfe", "und",
+    "guten", "tag", "auf", "bis", "dann", "alles", "ja", "yes", "oh", "ah", "na", "gott", "grüß", "liebe", "lieben",
+    # Not anchors: "bis morgen" is no greeting
+    "morgen", "abend",
+}
+GERMAN_WORDS = {
+    "danke", "dankeschön", "dank", "tschüss", "tschüs", "wiedersehen", "hallo", "moin", "morgen", "abend", "perfekt",
+    "prima", "klar", "verstanden", "gut", "vielen", "sehr", "schön", "für", "die", "ihre", "deine", "hilfe", "und",
+    "guten", "tag", "auf", "bis", "dann", "alles", "ja", "grüß", "gott", "liebe", "lieben", "servus",
+}
+
+# Compared by embedding with short messages the word rules do not cover
+PROTOTYPES: Dict[str, List[str]] = {
+    GREETING: ["Hello!", "Hi there", "Good morning", "Hallo!", "Guten Tag", "Hallo zusammen"],
+    THANKS: ["Thank you very much!", "Thanks a lot for your help", "Vielen Dank!", "Danke für die Hilfe"],
+    GOODBYE: ["Goodbye!", "See you later", "Tschüss!", "Auf Wiedersehen"],
+    ACKNOWLEDGEMENT: ["Ok, got it", "Alright, that helps", "Okay, verstanden", "Alles klar"],
+    SMALL_TALK: ["How are you?", "Who are you?", "What is your name?", "Are you a bot?", "Wie geht es dir?",
+                 "Wer bist du?", "Bist du ein Bot?"],
+}
+
+REPLIES: Dict[str, Dict[str, str]] = {
+    GREETING: {
+        "english": "Hello! I am the assistant of the TUM School of Computation, Information and Technology's "
+                   "academic advising service. How can I help you with your studies?",
+        "german": "Hallo! Ich bin der Assistent der Studienberatung der TUM School of Computation, Information "
+                  "and Technology. Wie kann ich Ihnen bei Ihrem Studium helfen?",
+    },
+    THANKS: {
+        "english": "You're welcome! Let me know if you have any other questions about your studies.",
+        "german": "Gern geschehen! Melden Sie sich gerne, wenn Sie weitere Fragen zu Ihrem Studium haben.",
+    },
+    GOODBYE: {
+        "english": "Goodbye, and good luck with your studies!",
+        "german": "Auf Wiedersehen und viel Erfolg im Studium!",
+    },
+    ACKNOWLEDGEMENT: {
+        "english": "Great! Is there anything else I can help you with?",
+        "german": "Prima! Kann ich Ihnen sonst noch weiterhelfen?",
+    },
+    SMALL_TALK: {
+        "english": "I am an automated assistant of the TUM School of Computation, Information and Technology's "
+                   "academic advising service and answer questions about studying at the school. "
+                   "What would you like to know?",
+        "german": "Ich bin ein automatisierter Assistent der Studienberatung der TUM School of Computation, "
+                  "Information and Technology und beantworte Fragen rund um das Studium. Was möchten Sie wissen?",
+    },
+    # Same wording as the chat prompt uses for unrelated questions
+    OFF_TOPIC: {
+        "english": "I am here to assist with questions about studying at TUM School of Computation, Information "
+                   "and Technology. Please ask a study-related question.",
+        "german": "Ich helfe gerne bei Fragen zum Studium an der TUM School of Computation, Information and "
+                  "Technology. Bitte stellen Sie eine studienbezogene Frage.",
+    },
+}
+
+
+class IntentGate:
+    """
+    Recognizes chat messages that need no retrieval before the pipeline runs: greetings, thanks, goodbyes,
+    acknowledgements and small talk (by word rules, then by embedding similarity to prototype phrases for short
+    messages) and, optionally, requests far away from the knowledge base (by similarity to the centroid of the
+    document embeddings). These are answered with a templated reply.
+
+    Acknowledgements are only gated in a conversation's first message: later, "ok" or "yes" usually answers the
+    assistant's own follow-up question and needs a real answer.
+    """
+
+    def __init__(self, weaviate_manager: WeaviateManager, enabled: bool = False, max_words: int = 8,
+                 prototype_similarity: float = 0.85, off_topic_similarity: float = 0.0,
+                 centroid_sample: int = 2000):
+        """
+        :param weaviate_manager: Provides the embedding model and the document embeddings for the centroid.
+        :param enabled: Whether messages are gated at all.
+        :param max_words: Only messages up to this many words are compared with the small talk prototypes.
+        :param prototype_similarity: Cosine similarity to a prototype above which a short message is small talk.
+        :param off_topic_similarity: Cosine similarity to the knowledge base centroid below which the first message
+            of a conversation is off-topic; 0 disables the check (see the intent_gate_centroid_similarity metric).
+        :param centroid_sample: Maximum number of documents averaged into the centroid.
+        """
+        self.weaviate_manager = weaviate_manager
+        self.enabled = enabled
+        self.max_words = max_words
+        self.prototype_similarity = prototype_similarity
+        self.off_topic_similarity = off_topic_similarity
+        self.centroid_sample = centroid_sample
+        self.prototype_intents: List[str] = []
+        self.prototype_matrix: Optional[np.ndarray] = None
+        self.centroid: Optional[np.ndarray] = None
+
+    def initialize(self):
+        """Embeds the prototypes and computes the knowledge base centroid. Without them only the word rules apply."""
+        if not self.enabled:
+            return
+        phrases = [(intent, phrase) for intent, examples in PROTOTYPES.items() for phrase in examples]
+        try:
+            embeddings = self.weaviate_manager.get_question_embeddings([phrase for _, phrase in phrases])
+            self.prototype_matrix = np.stack([self._normalize(embedding) for embedding in embeddings])
+            self.prototype_intents = [intent for intent, _ in phrases]
+        except Exception as e:
+            logging.warning(f"Could not embed the intent prototypes, only the word rules are used: {e}")
+        if self.off_topic_similarity <= 0:
+            return
+        try:
+            centroid = self.weaviate_manager.document_centroid(self.centroid_sample)
+            self.centroid = self._normalize(centroid) if centroid is not None else None
+        except Exception as e:
+            logging.warning(f"Could not compute the knowledge base centroid, off-topic detection is disabled: {e}")
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    @staticmethod
+    def _words(message: str) -> List[str]:
+        return re.findall(r"\w+", message.lower())
+
+    @staticmethod
+    def gates_acknowledgement(has_history: bool, last_reply: Optional[str]) -> bool:
+        return not has_history and not (last_reply or "").rstrip().endswith("?")
+
+    def classify_text(self, message: str, has_history: bool = False,
+                      last_reply: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """
+        Word rules, before language detection and embedding. Returns (intent, language of the message words) or
+        None; the conversation's language, if known, should be preferred for the reply.
+
+        :param has_history: Whether the conversation has earlier messages.
+        :param last_reply: The assistant's last message, if any.
+        """
+        if not self.enabled:
+            return None
+        words = self._words(message)
+        if not words or len(words) > self.max_words:
+            return None
+        anchors = set().union(*(anchor_words for _, anchor_words in INTENT_ANCHORS))
+        if any(word not in anchors and word not in FILLER_WORDS for word in words):
+            return None
+        intent = next((intent for intent, anchor_words in INTENT_ANCHORS if anchor_words & set(words)), None)
+        if intent is None or (intent == ACKNOWLEDGEMENT and not self.gates_acknowledgement(has_history, last_reply)):
+            return None
+        language = "german" if GERMAN_WORDS & set(words) else "english"
+        metrics.increment("intent_gate_total", intent=intent, method="rules")
+        return intent, language
+
+    def classify_embedding(self, message: str, embedding: List[float], has_history: bool,
+                           last_reply: Optional[str] = None) -> Optional[str]:
+        """Prototype and centroid similarity of the already computed question embedding."""
+        if not self.enabled:
+            return None
+        vector = self._normalize(embedding)
+        if self.prototype_matrix is not None and len(self._words(message)) <= self.max_words:
+            similarities = self.prototype_matrix @ vector
+            best = int(np.argmax(similarities))
+            intent = self.prototype_intents[best]
+            if similarities[best] >= self.prototype_similarity and \
+                    (intent != ACKNOWLEDGEMENT or self.gates_acknowledgement(has_history, last_reply)):
+                metrics.increment("intent_gate_total", intent=intent, method="prototype")
+                return intent
+        # Follow-up questions only make sense with the history, so only first messages are checked
+        if self.centroid is not None and not has_history:
+            similarity = float(self.centroid @ vector)
+            metrics.observe("intent_gate_centroid_similarity", similarity)
+            if similarity < self.off_topic_similarity:
+                metrics.increment("intent_gate_total", intent=OFF_TOPIC, method="centroid")
+                return OFF_TOPIC
+        return None
+
+    @staticmethod
+    def reply(intent: str, language: str) -> str:
+        replies = REPLIES[intent]
+        return replies["german"] if language.lower() == "german" else replies["english"]
@@ -3,6 +3,17 @@ from app.prompt.text_formatter import TextFormatter
 
 
 class PromptManager:
+    # Structured output of the single-call mode: the answer plus the model's own judge verdict
+    FUSED_RESPONSE_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "answer": {"type": "string"},
+            "verdict": {"type": "string", "enum": ["OK", "NEEDS_FALSE"]},
+        },
+        "required": ["answer", "verdict"],
+        "additionalProperties": False,
+    }
+
     def __init__(self, formatter: TextFormatter):
         self.formatter = formatter
         
@@ -302,6 +313,62 @@ class PromptManager:
     --------------------
     **Antwort des Systems:**
     {answer}
+    """
+
+        self.history_summary_prompt_template = """
+    You keep a running summary of a conversation between a student and the academic advising assistant of the TUM School of CIT.
+
+    **Your Task:**
+    - Update the existing summary with the new messages below.
+    - Keep everything that may matter for later questions: the student's situation (study program, semester, nationality, deadlines mentioned), what was asked and the key facts of the answers.
+    - Leave out greetings and phrasing.
+    - Write at most 120 words in English, in plain sentences without headings or lists.
+    - Output only the updated summary.
+
+    --------------------
+    **Existing Summary:**
+    {summary}
+
+    --------------------
+    **New Messages:**
+    {messages}
+    """
+
+        self.history_summary_prompt_template_de = """
+    Sie führen eine fortlaufende Zusammenfassung eines Gesprächs zwischen einem Studierenden und dem Assistenten der Studienberatung der TUM School of CIT.
+
+    **Ihre Aufgabe:**
+    - Ergänzen Sie die bisherige Zusammenfassung um die folgenden neuen Nachrichten.
+    - Behalten Sie alles, was für spätere Fragen wichtig sein kann: die Situation des Studierenden (Studiengang, Semester, Staatsangehörigkeit, genannte Fristen), was gefragt wurde und die wesentlichen Fakten der Antworten.
+    - Lassen Sie Begrüßungen und Formulierungen weg.
+    - Schreiben Sie höchstens 120 Wörter auf Deutsch, in ganzen Sätzen ohne Überschriften oder Listen.
+    - Geben Sie nur die aktualisierte Zusammenfassung aus.
+
+    --------------------
+    **Bisherige Zusammenfassung:**
+    {summary}
+
+    --------------------
+    **Neue Nachrichten:**
+    {messages}
+    """
+
+        self.fused_output_instructions = """
+    --------------------
+
+    **Output format:**
+    Return a JSON object with two fields:
+    - "answer": your response to the student as described above, or exactly "False".
+    - "verdict": review your own answer before returning it. Output "NEEDS_FALSE" if the answer indicates uncertainty, missing information or an inability to fully answer the question (e.g. "I cannot say for sure", "I don't have enough information", "It might be this or that") and should therefore have been "False". Otherwise output "OK".
+    """
+
+        self.fused_output_instructions_de = """
+    --------------------
+
+    **Ausgabeformat:**
+    Geben Sie ein JSON-Objekt mit zwei Feldern zurück:
+    - "answer": Ihre Antwort an die Studierenden wie oben beschrieben oder exakt "False".
+    - "verdict": Überprüfen Sie Ihre eigene Antwort, bevor Sie sie zurückgeben. Geben Sie "NEEDS_FALSE" aus, wenn die Antwort auf Unsicherheit, fehlende Informationen oder die Unfähigkeit hindeutet, die Frage vollständig zu beantworten (z. B. „Ich bin mir nicht sicher“, „Mir liegen nicht genügend Informationen vor“, „Es könnte sein, dass …“) und daher "False" hätte lauten müssen. Andernfalls geben Sie "OK" aus.
     """
 
     def create_messages(self, general_context: str, specific_context: str, sample_questions: str, question: str,
@@ -373,6 +440,16 @@ class PromptManager:
             {"role": "user", "content": user_content}
         ]
         
+    def create_fused_messages(self, general_context: str, specific_context: str, sample_questions: str, question: str,
+                              language: str, study_program):
+        """Answer prompt that additionally asks for a self-assessment verdict as JSON (see FUSED_RESPONSE_SCHEMA)."""
+        messages = self.create_messages(general_context, specific_context, sample_questions, question, language,
+                                        study_program)
+        instructions = self.fused_output_instructions if language.lower() == "english" \
+            else self.fused_output_instructions_de
+        messages[-1]["content"] += instructions
+        return messages
+
     def create_response_evaluation_messages(self, question: str, answer: str, language: str): 
         if language.lower() == "english":
             system_content = (
@@ -395,4 +472,18 @@ class PromptManager:
         return [
             {"role": "system", "content": system_content},
             {"role": "user", "content": user_content}
-        ]
\ No newline at end of file
+        ]
+
+    def create_history_summary_messages(self, summary: str, messages: str, language: str):
+        """Prompt that folds the messages that leave the verbatim history into the running summary."""
+        if language.lower() == "english":
+            user_content = self.history_summary_prompt_template.format(
+                summary=summary or "No summary yet.",
+                messages=messages
+            )
+        else:
+            user_content = self.history_summary_prompt_template_de.format(
+                summary=summary or "Noch keine Zusammenfassung.",
+                messages=messages
+            )
+        return [{"role": "user", "content": user_content}]
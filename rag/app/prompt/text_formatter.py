@@ -83,6 +83,15 @@ class TextFormatter:
         return combined_string
 
     def format_chat_history(self, chat_messages: List[ChatMessage], language: str) -> str:
+        # Format messages
+        formatted_strings = [self.format_chat_message(cm, language) for cm in chat_messages]
+
+        # Join formatted messages with separator
+        combined_string = "\n\n".join(formatted_strings)
+        return combined_string
+
+    @staticmethod
+    def format_chat_message(chat_message: ChatMessage, language: str) -> str:
         # Determine labels based on language
         if language.lower() == "english":
             advisor_label = "TUM AI Assistant"
@@ -91,16 +100,14 @@ class TextFormatter:
             advisor_label = "TUM KI Assistent"
             student_label = "Student"
 
-        # Format messages
-        formatted_strings = []
-        for cm in chat_messages:
-            sender = student_label if cm.type.lower() == "user" else advisor_label
-            formatted_string = f'{sender}: "{cm.message.strip()}"'
-            formatted_strings.append(formatted_string)
+        sender = student_label if chat_message.type.lower() == "user" else advisor_label
+        return f'{sender}: "{chat_message.message.strip()}"'
 
-        # Join formatted messages with separator
-        combined_string = "\n\n".join(formatted_strings)
-        return combined_string
+    @staticmethod
+    def format_history_summary(summary: str, language: str) -> str:
+        if language.lower() == "english":
+            return f'Summary of the earlier conversation: "{summary.strip()}"'
+        return f'Zusammenfassung des bisherigen Gesprächs: "{summary.strip()}"'
 
     # Format the study program
     def format_study_program(self, study_program: str, language: str) -> str:
@@ -0,0 +1,138 @@
+"""
+Production entry point: `python -m app.server`
+
+Runs the FastAPI app in several uvicorn worker processes (uvloop + httptools) under gunicorn. The app is imported
+once in the master before forking (`preload_app`), so code, prompt templates and other read-only state are shared
+copy-on-write between the workers. Network clients are only opened in each worker's lifespan, after the fork.
+The one-time remote initialization (Weaviate schemas, model warm-up) runs once per deployment in a short-lived helper
+process instead of in every worker, but only if it finishes within PREPARE_TIMEOUT_SECONDS: the port is never held back
+waiting for Weaviate or the model, that is left to each worker's bootstrap and reported by /ready.
+"""
+import logging
+import math
+import multiprocessing
+import os
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+from app.utils.environment import config
+from app.utils.setup_logging import setup_logging
+
+
+class AngelosWorker(UvicornWorker):
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "timeout_graceful_shutdown": config.GRACEFUL_TIMEOUT,
+    }
+
+
+def available_cpus() -> int:
+    """Number of CPUs this process may use, honouring CPU affinity and cgroup (container) quotas."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            limit, period = file.read().split()
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as quota_file, \
+                    open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as period_file:
+                limit, period = int(quota_file.read()), int(period_file.read())
+                if limit > 0:
+                    quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def worker_count() -> int:
+    if config.WEB_CONCURRENCY:
+        return max(1, int(config.WEB_CONCURRENCY))
+    if config.USE_IN_MEMORY_DB.lower() == "true":
+        logging.warning("In-memory vector store is not shared between processes, running a single worker.")
+        return 1
+    # The workers are async and I/O bound, so one worker per core keeps all cores busy
+    return available_cpus()
+
+
+def prepare_shared_state():
+    """Creates the Weaviate schemas and warms up the model once, before any worker starts."""
+    setup_logging()
+    from app.utils.dependencies import model, weaviate_manager, init_task_models
+    weaviate_manager.initialize()
+    model.init_model()
+    init_task_models()
+    weaviate_manager.close()
+    model.close_session()
+
+
+def prepare_with_timeout(timeout: float):
+    """
+    Prepares the shared state if that is done within `timeout` seconds. Otherwise (Weaviate or the model are not
+    reachable yet) the helper is stopped and the workers initialize their dependencies in the background themselves,
+    so the port is bound and /live answers right away.
+    """
+    # Run the remote initialization in a separate (spawned) process so the master never holds
+    # connections or gRPC state that would be inherited by the forked workers
+    helper = multiprocessing.get_context("spawn").Process(target=prepare_shared_state, name="prepare-shared-state")
+    helper.start()
+    helper.join(timeout)
+    if helper.is_alive():
+        logging.warning(f"Preparing shared state did not finish within {timeout}s, "
+                        f"every worker initializes its dependencies itself")
+        helper.terminate()
+        helper.join()
+    elif helper.exitcode == 0:
+        logging.info("Shared state prepared, workers will skip schema deletion and model warm-up")
+        config.SHARED_STATE_PREPARED = "true"
+        config.DELETE_BEFORE_INIT = "false"
+    else:
+        logging.warning("Preparing shared state failed, every worker initializes its dependencies itself")
+
+
+class ProductionServer(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app.main import app
+        return app
+
+
+def main():
+    setup_logging()
+    workers = worker_count()
+
+    if config.PREPARE_TIMEOUT_SECONDS > 0:
+        prepare_with_timeout(config.PREPARE_TIMEOUT_SECONDS)
+
+    logging.info(f"Starting production server with {workers} worker(s) on {config.HOST}:{config.PORT}")
+    ProductionServer({
+        "bind": f"{config.HOST}:{config.PORT}",
+        "workers": workers,
+        "worker_class": "app.server.AngelosWorker",
+        "preload_app": True,
+        "graceful_timeout": config.GRACEFUL_TIMEOUT,
+        "timeout": config.WORKER_TIMEOUT,
+        "keepalive": config.KEEP_ALIVE,
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from app.utils.deadline import bounded_timeout
+from app.utils.metrics import metrics, stage_timer
+
+
+class AdmissionRejectedError(Exception):
+    """The request was not admitted because the queues are full or its turn did not come in time."""
+
+    def __init__(self, endpoint: str, reason: str, retry_after: int):
+        super().__init__(f"Too many requests for '{endpoint}' ({reason}), retry after {retry_after}s")
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_weights(raw: Optional[str]) -> Dict[str, float]:
+    """Parses ADMISSION_WEIGHTS: comma-separated `<endpoint>:<weight>` pairs."""
+    weights = {}
+    for entry in (raw or "").split(","):
+        if not entry.strip():
+            continue
+        try:
+            endpoint, weight = entry.split(":")
+            weights[endpoint.strip().lower()] = float(weight)
+        except ValueError:
+            logging.error(f"Ignoring invalid ADMISSION_WEIGHTS entry '{entry}'")
+    return weights
+
+
+class AdmissionController:
+    """
+    Limits the question endpoints to `max_concurrent` requests in the pipeline at once. Requests beyond that wait in
+    a queue per organisation and endpoint (a flow), and free slots are handed out by weighted fair queueing: every
+    waiting request gets a virtual finish time of 1 / weight after its flow's previous one, and the earliest is
+    admitted next. A burst of one organisation therefore only delays that organisation, and an endpoint with a
+    higher weight (the interactive chat) is served more often than one with a lower weight (the mail system).
+
+    A request is rejected immediately when its flow already has `max_queue_per_flow` requests waiting or all queues
+    together have `max_queue`, and after waiting `max_wait_seconds` (or the rest of its deadline) without a slot.
+    """
+
+    def __init__(self, enabled: bool = True, max_concurrent: int = 16, max_queue: int = 64,
+                 max_queue_per_flow: int = 16, max_wait_seconds: float = 10.0,
+                 weights: Optional[Dict[str, float]] = None):
+        self.enabled = enabled
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_flow = max_queue_per_flow
+        self.max_wait_seconds = max_wait_seconds
+        self.weights = weights or {}
+        self.in_flight = 0
+        # (finish time, sequence number, flow, future) of the waiting requests; withdrawn ones are skipped lazily
+        self._queue: List[Tuple[float, int, Hashable, asyncio.Future]] = []
+        self._queued: Dict[Hashable, int] = {}
+        self._endpoints = set(self.weights)
+        self._finish: Dict[Hashable, float] = {}
+        self._virtual_time = 0.0
+        self._sequence = itertools.count()
+        # Moving average of the time a request holds its slot, for the Retry-After estimate
+        self._service_seconds = 1.0
+
+    @property
+    def queued(self) -> int:
+        return sum(self._queued.values())
+
+    @asynccontextmanager
+    async def slot(self, endpoint: str, org_id: Optional[int]):
+        """Holds one of the slots for the block, waiting for it if necessary."""
+        if not self.enabled:
+            yield
+            return
+        await self._acquire(endpoint, org_id)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_seconds += 0.1 * (time.monotonic() - start - self._service_seconds)
+            self._release()
+
+    async def _acquire(self, endpoint: str, org_id: Optional[int]):
+        if self.in_flight < self.max_concurrent and not self.queued:
+            self.in_flight += 1
+            metrics.increment("admission_total", endpoint=endpoint, result="admitted")
+            self._report()
+            return
+
+        flow = (endpoint, org_id)
+        self._endpoints.add(endpoint)
+        if self.queued >= self.max_queue or self._queued.get(flow, 0) >= self.max_queue_per_flow:
+            raise self._reject(endpoint, "queue_full")
+        finish = max(self._virtual_time, self._finish.get(flow, 0.0)) + 1.0 / self.weights.get(endpoint, 1.0)
+        self._finish[flow] = finish
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (finish, next(self._sequence), flow, future))
+        self._queued[flow] = self._queued.get(flow, 0) + 1
+        self._report()
+
+        start = time.monotonic()
+        try:
+            with stage_timer("queue"):
+                await asyncio.wait_for(asyncio.shield(future), bounded_timeout(self.max_wait_seconds))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the request gave up, pass it on
+                self._release()
+            else:
+                future.cancel()
+                self._withdraw(flow)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._reject(endpoint, "timeout") from None
+        finally:
+            metrics.observe("admission_wait_seconds", time.monotonic() - start, endpoint=endpoint)
+        metrics.increment("admission_total", endpoint=endpoint, result="queued")
+
+    def _release(self):
+        """Hands the slot to the waiting request with the earliest finish time, or frees it."""
+        while self._queue:
+            finish, _, flow, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            self._withdraw(flow)
+            self._virtual_time = finish
+            future.set_result(None)
+            return
+        self.in_flight -= 1
+        self._report()
+
+    def _withdraw(self, flow: Hashable):
+        self._queued[flow] -= 1
+        if not self._queued[flow]:
+            del self._queued[flow]
+            # An idle flow starts again at the current virtual time, it does not save up credit
+            self._finish.pop(flow, None)
+        self._report()
+
+    def _reject(self, endpoint: str, reason: str) -> AdmissionRejectedError:
+        metrics.increment("admission_total", endpoint=endpoint, result=f"rejected_{reason}")
+        # Time until the requests in front of a new one would have been served
+        retry_after = max(1, math.ceil(self._service_seconds * (self.queued + 1) / self.max_concurrent))
+        return AdmissionRejectedError(endpoint, reason, retry_after)
+
+    def _report(self):
+        metrics.set_gauge("admission_in_flight", self.in_flight)
+        for endpoint in self._endpoints:
+            depth = sum(count for (flow_endpoint, _), count in self._queued.items() if flow_endpoint == endpoint)
+            metrics.set_gauge("admission_queue_depth", depth, endpoint=endpoint)
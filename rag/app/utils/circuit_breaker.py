@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+import httpx
+import openai
+import requests
+
+from app.utils.environment import config
+from app.utils.metrics import metrics
+
+# Timeouts and connection errors of httpx, requests and the OpenAI SDK
+TRANSIENT_ERRORS = (TimeoutError, asyncio.TimeoutError, ConnectionError, httpx.TransportError,
+                    requests.ConnectionError, requests.Timeout, openai.APIConnectionError)
+
+
+def status_code_of(error: BaseException) -> Optional[int]:
+    """HTTP status of a failed call, for the errors of httpx, requests and the OpenAI SDK alike."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Errors that count against a dependency's circuit breaker; rate limiting and rejected requests do not."""
+    status = status_code_of(error)
+    return isinstance(error, TRANSIENT_ERRORS) or status == 408 or (status is not None and status >= 500)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a remote dependency after `failure_threshold` consecutive failures. While open, calls fail fast
+    (callers fall back); after `recovery_seconds` the breaker is half-open and lets one probe call through, whose
+    outcome closes or re-opens it.
+
+    Every call that was allowed must be followed by `record_success()` or `record_failure()`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.recovery_seconds = recovery_seconds
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started_at: Optional[float] = None
+        self._last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._update_state(time.monotonic())
+            return self._state
+
+    def _update_state(self, now: float):
+        if self._state == self.OPEN and now - self._opened_at >= self.recovery_seconds:
+            self._transition(self.HALF_OPEN)
+
+    def _transition(self, state: str):
+        # Called with the lock held
+        if state == self._state:
+            return
+        previous, self._state = self._state, state
+        self._probe_started_at = None
+        if state == self.OPEN:
+            logging.warning(f"Circuit breaker {self.name} opened after {self._failures} failures: {self._last_error}")
+        else:
+            logging.info(f"Circuit breaker {self.name}: {previous} -> {state}")
+        metrics.increment("circuit_breaker_transitions_total", breaker=self.name, state=state)
+        metrics.set_gauge("circuit_breaker_state", self._STATE_VALUES[state], breaker=self.name)
+
+    def allow(self) -> bool:
+        """Whether the dependency may be called now; counts a rejection otherwise."""
+        now = time.monotonic()
+        with self._lock:
+            self._update_state(now)
+            if self._state == self.CLOSED:
+                return True
+            # Half-open: one probe at a time; a probe that never reported back is replaced after the recovery time
+            if self._state == self.HALF_OPEN and (self._probe_started_at is None
+                                                  or now - self._probe_started_at >= self.recovery_seconds):
+                self._probe_started_at = now
+                return True
+        metrics.increment("circuit_breaker_rejected_total", breaker=self.name)
+        return False
+
+    def before_call(self):
+        """Like `allow`, but raises CircuitOpenError when the call must not be made."""
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit breaker {self.name} is open")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._transition(self.CLOSED)
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        with self._lock:
+            self._failures += 1
+            if error is not None:
+                self._last_error = f"{type(error).__name__}: {error}"
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self._state == self.OPEN:
+                    self._probe_started_at = None
+                self._transition(self.OPEN)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            self._update_state(time.monotonic())
+            return {"state": self._state, "consecutive_failures": self._failures, "last_error": self._last_error}
+
+
+class CircuitBreakerRegistry:
+    """All breakers of the process by name, so dependencies sharing a backend share its breaker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(
+                    name, failure_threshold=config.BREAKER_FAILURE_THRESHOLD,
+                    recovery_seconds=config.BREAKER_RECOVERY_SECONDS)
+            return breaker
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.to_dict() for breaker in breakers}
+
+
+circuit_breakers = CircuitBreakerRegistry()
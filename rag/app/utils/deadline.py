@@ -0,0 +1,110 @@
+import asyncio
+import inspect
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+
+from app.utils.metrics import metrics
+
+T = TypeVar("T")
+
+# Optional stages are skipped when less than this would be left for them
+MIN_STAGE_SECONDS = 0.1
+
+
+class DeadlineExceededError(Exception):
+    """The request's time budget ran out in a required stage. Not retryable and no fault of the provider."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded in stage '{stage}'")
+        self.stage = stage
+
+
+class Deadline:
+    """
+    The time budget of one request. Optional stages may only use what is left after the `reserve` for the required
+    stages that follow them (generation, evaluation); required stages may use all of the remaining time.
+    """
+
+    def __init__(self, seconds: float, reserve: float = 0.0):
+        self.seconds = seconds
+        self.reserve = reserve
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def optional_budget(self) -> float:
+        return self.remaining() - self.reserve
+
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float], reserve: float = 0.0):
+    """Applies a deadline to everything within the block (including awaited tasks and threads); none if not set."""
+    token = _deadline.set(Deadline(seconds, reserve) if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _deadline.get()
+
+
+def bounded_timeout(timeout: float) -> float:
+    """`timeout`, shortened to the remaining budget of the current request."""
+    deadline = _deadline.get()
+    return timeout if deadline is None else min(timeout, deadline.remaining())
+
+
+def _discard(awaitable: Awaitable):
+    if inspect.iscoroutine(awaitable):
+        awaitable.close()
+
+
+def degrade(stage: str, reason: str):
+    logging.warning(f"Degrading stage '{stage}' ({reason})")
+    metrics.increment("degraded_stages_total", stage=stage, reason=reason)
+
+
+async def optional_stage(stage: str, awaitable: Awaitable[T], fallback: T) -> T:
+    """Runs an optional stage within the budget left for it; skipped or cut off, it returns the fallback."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return await awaitable
+    budget = deadline.optional_budget()
+    if budget < MIN_STAGE_SECONDS:
+        _discard(awaitable)
+        degrade(stage, "skipped")
+        return fallback
+    try:
+        return await asyncio.wait_for(awaitable, budget)
+    except asyncio.TimeoutError:
+        degrade(stage, "cut_off")
+        return fallback
+
+
+async def required_stage(stage: str, awaitable: Awaitable[T]) -> T:
+    """Runs a required stage within the remaining budget, raises DeadlineExceededError when it runs out."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return await awaitable
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        _discard(awaitable)
+        raise deadline_exceeded(stage)
+    try:
+        return await asyncio.wait_for(awaitable, remaining)
+    except asyncio.TimeoutError:
+        raise deadline_exceeded(stage) from None
+
+
+def deadline_exceeded(stage: str) -> DeadlineExceededError:
+    metrics.increment("deadline_exceeded_total", stage=stage)
+    return DeadlineExceededError(stage)
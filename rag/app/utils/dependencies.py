@@ -1,28 +1,176 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+
 from app.managers.request_handler import RequestHandler
 from app.managers.weaviate_manager import WeaviateManager
 from app.managers.auth_handler import AuthHandler
+from app.managers.history_summarizer import HistorySummarizer
+from app.managers.session_store import SessionStore
+from app.post_retrieval.faq_fast_path import FaqFastPath
 from app.post_retrieval.reranker import Reranker
+from app.post_retrieval.rerank_policy import RerankPolicy
 from app.post_retrieval.response_evaluator import ResponseEvaluator
-from app.models.model_loader import get_model
+from app.models.base_model import BaseModelClient
+from app.models.model_loader import get_model, get_task_model
+from app.pre_retrieval.intent_gate import IntentGate
 from app.prompt.prompt_manager import PromptManager
 from app.prompt.text_formatter import TextFormatter
 from app.injestion.document_splitter import DocumentSplitter
 from app.injestion.injestion_handler import InjestionHandler
+from app.utils.admission import AdmissionController, parse_weights
 from app.utils.environment import config
+from app.utils.language_detector import LanguageDetector
+from app.utils.single_flight import SingleFlight
+
+
+def create_reranker(model: BaseModelClient) -> Reranker:
+    if config.USE_FAKE_RERANKER.lower() == "true":
+        from app.post_retrieval.lexical_reranker import LexicalReranker
+        return LexicalReranker(model=model, latency=config.FAKE_RERANK_LATENCY, seed=config.FAKE_SEED)
+    return Reranker(model=model, api_key_en=config.COHERE_API_KEY, api_key_multi=config.COHERE_API_KEY)
+
+
+def create_weaviate_manager(model: BaseModelClient, reranker: Reranker) -> WeaviateManager:
+    if config.USE_IN_MEMORY_DB.lower() == "true":
+        from app.managers.in_memory_manager import InMemoryWeaviateManager
+        return InMemoryWeaviateManager(embedding_model=model, reranker=reranker)
+    return WeaviateManager(config.WEAVIATE_URL, embedding_model=model, reranker=reranker)
 
-# Initialize resources  
+
+# Initialize resources. Construction is cheap and performs no network I/O;
+# connections and warm-up happen in `bootstrap()` once the server is running.
 model = get_model()
+# Clients for the individual tasks; they fall back to `model` unless TASK_MODELS configures them
+answer_model = get_task_model("answer", model)
+judge_model = get_task_model("judge", model)
+history_model = get_task_model("history_rewrite", model)
+task_models = {"answer": answer_model, "judge": judge_model, "history_rewrite": history_model}
 formatter = TextFormatter()
-reranker = Reranker(model=model, api_key_en=config.COHERE_API_KEY, api_key_multi=config.COHERE_API_KEY)
-weaviate_manager = WeaviateManager(config.WEAVIATE_URL, embedding_model=model, reranker=reranker)
+reranker = create_reranker(model)
+weaviate_manager = create_weaviate_manager(model, reranker)
 prompt_manager = PromptManager(formatter=formatter)
 document_splitter = DocumentSplitter()
-response_evaluator = ResponseEvaluator(prompt_manager=prompt_manager, model=model)
-request_handler = RequestHandler(weaviate_manager=weaviate_manager, reranker=reranker, formatter=formatter, model=model, prompt_manager=prompt_manager, response_evaluator=response_evaluator)
+response_evaluator = ResponseEvaluator(prompt_manager=prompt_manager, model=judge_model,
+                                       audit_rate=float(config.FUSED_JUDGE_AUDIT_RATE))
+intent_gate = IntentGate(weaviate_manager, enabled=config.INTENT_GATE.lower() == "true",
+                         max_words=config.INTENT_GATE_MAX_WORDS,
+                         prototype_similarity=config.INTENT_GATE_PROTOTYPE_SIMILARITY,
+                         off_topic_similarity=config.INTENT_GATE_OFF_TOPIC_SIMILARITY)
+request_handler = RequestHandler(weaviate_manager=weaviate_manager, reranker=reranker, formatter=formatter, model=answer_model, prompt_manager=prompt_manager, response_evaluator=response_evaluator,
+                                 fused_judge=config.FUSED_JUDGE.lower() == "true",
+                                 rerank_policy=RerankPolicy(enabled=config.RERANK_SKIP.lower() == "true",
+                                                            max_candidates=config.RERANK_SKIP_MAX_CANDIDATES,
+                                                            max_distance=config.RERANK_SKIP_MAX_DISTANCE,
+                                                            gap=config.RERANK_SKIP_GAP),
+                                 intent_gate=intent_gate,
+                                 session_store=SessionStore(enabled=config.SESSIONS.lower() == "true",
+                                                            ttl_seconds=config.SESSION_TTL_SECONDS,
+                                                            max_bytes=config.SESSION_MAX_MB * 1024 * 1024),
+                                 history_summarizer=HistorySummarizer(
+                                     model=history_model, prompt_manager=prompt_manager, formatter=formatter,
+                                     enabled=config.HISTORY_SUMMARY.lower() == "true",
+                                     keep_turns=config.HISTORY_KEEP_TURNS,
+                                     max_summary_chars=config.HISTORY_SUMMARY_MAX_CHARS),
+                                 faq_fast_path=FaqFastPath(enabled=config.FAQ_FAST_PATH.lower() == "true",
+                                                           min_score=config.FAQ_MIN_SCORE,
+                                                           max_distance=config.FAQ_MAX_DISTANCE))
 auth_handler = AuthHandler(angelos_api_key=config.ANGELOS_APP_API_KEY)
+single_flight = SingleFlight(enabled=config.SINGLE_FLIGHT.lower() == "true")
+admission_controller = AdmissionController(enabled=config.ADMISSION_CONTROL.lower() == "true",
+                                           max_concurrent=config.ADMISSION_MAX_CONCURRENT,
+                                           max_queue=config.ADMISSION_MAX_QUEUE,
+                                           max_queue_per_flow=config.ADMISSION_MAX_QUEUE_PER_ORG,
+                                           max_wait_seconds=config.ADMISSION_MAX_WAIT_SECONDS,
+                                           weights=parse_weights(config.ADMISSION_WEIGHTS))
 injestion_handler = InjestionHandler(weaviate_manager=weaviate_manager, document_splitter=document_splitter)
 
 
+class BootstrapState:
+    """Tracks the initialization of the remote dependencies for the readiness probe."""
+
+    def __init__(self):
+        self.ready = False
+        self.started_at: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.components: Dict[str, str] = {}
+
+    def to_dict(self) -> Dict:
+        return {"ready": self.ready, "bootstrap_seconds": self.duration, "components": dict(self.components)}
+
+
+bootstrap_state = BootstrapState()
+
+
+async def initialize_component(name: str, initializer: Callable[[], None], retry_delay: float):
+    """Runs a blocking initializer in a worker thread, retrying until it succeeds."""
+    attempt = 1
+    while True:
+        bootstrap_state.components[name] = "initializing"
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(initializer)
+            bootstrap_state.components[name] = "ready"
+            logging.info(f"Initialized {name} in {time.perf_counter() - start:.2f}s")
+            return
+        except Exception as e:
+            bootstrap_state.components[name] = f"failed: {e}"
+            logging.error(f"Failed to initialize {name} (attempt {attempt}): {e}")
+            attempt += 1
+            await asyncio.sleep(retry_delay)
+
+
+async def bootstrap(retry_delay: float = 5.0):
+    """Initializes the model client, the vector database and the reranker concurrently."""
+    bootstrap_state.started_at = time.perf_counter()
+    # The production launcher warms up the model once before forking the workers
+    shared_state_prepared = config.SHARED_STATE_PREPARED.lower() == "true"
+    model_initializer = model.init_model if not shared_state_prepared else (lambda: None)
+    task_models_initializer = init_task_models if not shared_state_prepared else (lambda: None)
+    await asyncio.gather(
+        initialize_component("model", model_initializer, retry_delay),
+        initialize_component("task_models", task_models_initializer, retry_delay),
+        initialize_component("weaviate", weaviate_manager.initialize, retry_delay),
+        initialize_component("reranker", reranker.initialize, retry_delay),
+        initialize_component("language_detector", LanguageDetector.initialize, retry_delay),
+    )
+    # Needs the embedding model and the documents
+    await initialize_component("intent_gate", intent_gate.initialize, retry_delay)
+    bootstrap_state.duration = time.perf_counter() - bootstrap_state.started_at
+    bootstrap_state.ready = True
+    logging.info(f"Application ready after {bootstrap_state.duration:.2f}s")
+
+
+async def ensure_ready():
+    """Rejects requests with 503 until the bootstrap has finished."""
+    if not bootstrap_state.ready:
+        raise HTTPException(status_code=503, detail="Service is starting up", headers={"Retry-After": "5"})
+
+
+def separate_task_models():
+    """The task clients that are not the default model itself and need their own warm-up and shutdown."""
+    separate = []
+    for client in task_models.values():
+        if client is not model and all(client is not other for other in separate):
+            separate.append(client)
+    return separate
+
+
+def init_task_models():
+    for client in separate_task_models():
+        client.init_model()
+
+
 # Provide a shutdown mechanism for the model
-def shutdown_model():
+async def shutdown_model():
+    for client in separate_task_models():
+        await client.aclose()
+        client.close_session()
+    await model.aclose()
     model.close_session()
+    await reranker.aclose()
+    reranker.close()
+    weaviate_manager.close()
@@ -10,6 +10,9 @@ class Config:
     # Weaviate Database
     WEAVIATE_URL = os.getenv("WEAVIATE_URL", "localhost")
     WEAVIATE_PORT = os.getenv("WEAVIATE_PORT", "8001")
+    # In-memory copy of both collections that answers queries while Weaviate is unavailable (refreshed every N s)
+    WEAVIATE_LOCAL_INDEX = os.getenv("WEAVIATE_LOCAL_INDEX", "false")
+    WEAVIATE_LOCAL_INDEX_REFRESH_SECONDS = float(os.getenv("WEAVIATE_LOCAL_INDEX_REFRESH_SECONDS", "600"))
     # Development config
     TEST_MODE = os.getenv("TEST_MODE")
     DELETE_BEFORE_INIT = os.getenv("DELETE_BEFORE_INIT", "false")
@@ -21,6 +24,47 @@ class Config:
     GPU_MODEL = os.getenv("GPU_MODEL")
     GPU_EMBED_MODEL = os.getenv("GPU_EMBED_MODEL")
     GPU_HOST = os.getenv("GPU_HOST")
+    # Comma-separated list of Ollama URLs; requests are balanced over them (default: GPU_URL)
+    GPU_URLS = os.getenv("GPU_URLS", os.getenv("GPU_URL", ""))
+    GPU_MAX_FAILURES = int(os.getenv("GPU_MAX_FAILURES", "3"))
+    GPU_EJECTION_SECONDS = float(os.getenv("GPU_EJECTION_SECONDS", "30"))
+    GPU_HEALTH_CHECK_INTERVAL = float(os.getenv("GPU_HEALTH_CHECK_INTERVAL", "10"))
+    # Load-aware spillover: providers in order of preference, e.g. "ollama,azure" (completions only)
+    MODEL_SPILLOVER = os.getenv("MODEL_SPILLOVER")
+    MODEL_SPILLOVER_MAX_IN_FLIGHT = os.getenv("MODEL_SPILLOVER_MAX_IN_FLIGHT", "8,64")
+    MODEL_SPILLOVER_LATENCY_BUDGET_MS = os.getenv("MODEL_SPILLOVER_LATENCY_BUDGET_MS", "8000,30000")
+    # Per-task models: JSON {"<answer|judge|classify|history_rewrite>": {"provider", "model", "max_tokens", "temperature"}}
+    TASK_MODELS = os.getenv("TASK_MODELS")
+    # Async model clients (connection pool per worker, timeouts in seconds)
+    MODEL_MAX_CONNECTIONS = int(os.getenv("MODEL_MAX_CONNECTIONS", "100"))
+    MODEL_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("MODEL_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    MODEL_TIMEOUT = float(os.getenv("MODEL_TIMEOUT", "60"))
+    MODEL_CONNECT_TIMEOUT = float(os.getenv("MODEL_CONNECT_TIMEOUT", "5"))
+    # Resilience: deadline per attempt (s), retries with jittered exponential backoff, hedged duplicates for the
+    # given call kinds ("completion", "embedding") and a per-provider concurrency limit adapting to rate limiting
+    MODEL_CALL_TIMEOUT = float(os.getenv("MODEL_CALL_TIMEOUT", "60"))
+    MODEL_EMBED_TIMEOUT = float(os.getenv("MODEL_EMBED_TIMEOUT", "10"))
+    MODEL_RETRIES = int(os.getenv("MODEL_RETRIES", "2"))
+    MODEL_RETRY_BACKOFF_MS = float(os.getenv("MODEL_RETRY_BACKOFF_MS", "200"))
+    MODEL_RETRY_BACKOFF_MAX_MS = float(os.getenv("MODEL_RETRY_BACKOFF_MAX_MS", "5000"))
+    MODEL_HEDGING = os.getenv("MODEL_HEDGING", "")
+    MODEL_HEDGE_MIN_DELAY_MS = float(os.getenv("MODEL_HEDGE_MIN_DELAY_MS", "500"))
+    MODEL_ADAPTIVE_CONCURRENCY = os.getenv("MODEL_ADAPTIVE_CONCURRENCY", "true")
+    MODEL_CONCURRENCY_MIN = int(os.getenv("MODEL_CONCURRENCY_MIN", "2"))
+    MODEL_CONCURRENCY_MAX = int(os.getenv("MODEL_CONCURRENCY_MAX", "64"))
+    # Circuit breakers (model providers, reranker, Weaviate): consecutive failures until a breaker opens and
+    # seconds until it lets a probe request through again
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RECOVERY_SECONDS = float(os.getenv("BREAKER_RECOVERY_SECONDS", "30"))
+    # Usage accounting: JSON {"<model>": {"prompt": .., "completion": .., "cached": ..}} per 1M tokens
+    MODEL_PRICES = os.getenv("MODEL_PRICES")
+    # Embedding micro-batching
+    EMBED_BATCHING = os.getenv("EMBED_BATCHING", "true")
+    EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+    EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "16"))
+    # /ask: answer and judge verdict in one structured call; share of fused answers re-checked by the separate judge
+    FUSED_JUDGE = os.getenv("FUSED_JUDGE", "false")
+    FUSED_JUDGE_AUDIT_RATE = os.getenv("FUSED_JUDGE_AUDIT_RATE", "0.1")
     # OpenAI
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     OPENAI_MODEL = os.getenv("OPENAI_MODEL")
@@ -42,8 +86,80 @@ class Config:
     COHERE_API_KEY = os.getenv("COHERE_API_KEY")
     COHERE_API_KEY_MULTI = os.getenv("COHERE_API_KEY_MULTI")
     COHERE_API_KEY_EN = os.getenv("COHERE_API_KEY_EN")
+    RERANK_TIMEOUT = float(os.getenv("RERANK_TIMEOUT", "5"))
+    RERANK_MAX_CONNECTIONS = int(os.getenv("RERANK_MAX_CONNECTIONS", "20"))
+    # Documents are cut to about this many tokens before reranking (0 sends them in full)
+    RERANK_MAX_TOKENS = int(os.getenv("RERANK_MAX_TOKENS", "256"))
+    # Rank by vector distance instead of reranking when there are few candidates or the distances clearly
+    # separate relevant from irrelevant ones (calibrate with testing/benchmark/rerank_policy.py)
+    RERANK_SKIP = os.getenv("RERANK_SKIP", "false")
+    RERANK_SKIP_MAX_CANDIDATES = int(os.getenv("RERANK_SKIP_MAX_CANDIDATES", "2"))
+    RERANK_SKIP_MAX_DISTANCE = float(os.getenv("RERANK_SKIP_MAX_DISTANCE", "0.45"))
+    RERANK_SKIP_GAP = float(os.getenv("RERANK_SKIP_GAP", "0.1"))
+    # Intent gate: answer small talk in the chat without retrieval; off-topic detection by similarity to the
+    # knowledge base centroid is disabled with 0
+    INTENT_GATE = os.getenv("INTENT_GATE", "false")
+    INTENT_GATE_MAX_WORDS = int(os.getenv("INTENT_GATE_MAX_WORDS", "8"))
+    INTENT_GATE_PROTOTYPE_SIMILARITY = float(os.getenv("INTENT_GATE_PROTOTYPE_SIMILARITY", "0.85"))
+    INTENT_GATE_OFF_TOPIC_SIMILARITY = float(os.getenv("INTENT_GATE_OFF_TOPIC_SIMILARITY", "0"))
+    # Number of chat messages whose detected language is cached
+    LANGUAGE_CACHE_SIZE = int(os.getenv("LANGUAGE_CACHE_SIZE", "4096"))
+    # Server-side history of chats that send a conversationId, per worker process
+    SESSIONS = os.getenv("SESSIONS", "true")
+    SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+    SESSION_MAX_MB = int(os.getenv("SESSION_MAX_MB", "64"))
+    # Keep only the last turns of the chat history verbatim and summarize the earlier ones in the background
+    # (with the "history_rewrite" task model)
+    HISTORY_SUMMARY = os.getenv("HISTORY_SUMMARY", "false")
+    HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "3"))
+    HISTORY_SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "1500"))
+    # Time budget per request (0 disables); optional stages are skipped or cut off so that DEADLINE_RESERVE_SECONDS
+    # remain for generation and evaluation
+    CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "30"))
+    ASK_DEADLINE_SECONDS = float(os.getenv("ASK_DEADLINE_SECONDS", "60"))
+    DEADLINE_RESERVE_SECONDS = float(os.getenv("DEADLINE_RESERVE_SECONDS", "10"))
+    # Concurrent identical questions share one answer
+    SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true")
+    # Concurrency limit and fair queueing of the question endpoints per organisation, weighted by endpoint
+    ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true")
+    ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "16"))
+    ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+    ADMISSION_MAX_QUEUE_PER_ORG = int(os.getenv("ADMISSION_MAX_QUEUE_PER_ORG", "16"))
+    ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "10"))
+    ADMISSION_WEIGHTS = os.getenv("ADMISSION_WEIGHTS", "chat:4,ask:1")
+    # Batches of email questions: at most ASK_BATCH_MAX_SIZE questions per request, answered ASK_BATCH_PARALLELISM
+    # at a time
+    ASK_BATCH_MAX_SIZE = int(os.getenv("ASK_BATCH_MAX_SIZE", "200"))
+    ASK_BATCH_PARALLELISM = int(os.getenv("ASK_BATCH_PARALLELISM", "4"))
+    # Return the curated answer of a near-identical sample question without generation (thresholds depend on the
+    # reranker and embedding model)
+    FAQ_FAST_PATH = os.getenv("FAQ_FAST_PATH", "false")
+    FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "0.9"))
+    FAQ_MAX_DISTANCE = float(os.getenv("FAQ_MAX_DISTANCE", "0.1"))
+    # Server
+    HOST = os.getenv("HOST", "0.0.0.0")
+    PORT = int(os.getenv("PORT", "8000"))
+    WEB_CONCURRENCY = os.getenv("WEB_CONCURRENCY")
+    GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+    WORKER_TIMEOUT = int(os.getenv("WORKER_TIMEOUT", "120"))
+    KEEP_ALIVE = int(os.getenv("KEEP_ALIVE", "75"))
+    SHARED_STATE_PREPARED = os.getenv("SHARED_STATE_PREPARED", "false")
+    # How long the server waits for the one-time initialization before binding the port (0 skips it)
+    PREPARE_TIMEOUT_SECONDS = float(os.getenv("PREPARE_TIMEOUT_SECONDS", "10"))
     # Safeguard
     ANGELOS_APP_API_KEY = os.getenv("ANGELOS_APP_API_KEY")
+    # Offline stand-in backends (no network required)
+    USE_FAKE_BACKENDS = os.getenv("USE_FAKE_BACKENDS", "false")
+    USE_FAKE_MODEL = os.getenv("USE_FAKE_MODEL", USE_FAKE_BACKENDS)
+    USE_FAKE_RERANKER = os.getenv("USE_FAKE_RERANKER", USE_FAKE_BACKENDS)
+    USE_IN_MEMORY_DB = os.getenv("USE_IN_MEMORY_DB", USE_FAKE_BACKENDS)
+    FAKE_LLM_MODE = os.getenv("FAKE_LLM_MODE", "canned")
+    FAKE_LLM_RESPONSE = os.getenv("FAKE_LLM_RESPONSE")
+    FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "constant:0")
+    FAKE_EMBED_LATENCY = os.getenv("FAKE_EMBED_LATENCY", "constant:0")
+    FAKE_RERANK_LATENCY = os.getenv("FAKE_RERANK_LATENCY", "constant:0")
+    FAKE_EMBED_DIM = int(os.getenv("FAKE_EMBED_DIM", "384"))
+    FAKE_SEED = int(os.getenv("FAKE_SEED", "0"))
 
 
 config = Config()
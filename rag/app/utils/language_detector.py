@@ -1,16 +1,88 @@
-from langdetect import detect
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, Optional
+
+from langdetect.detector_factory import DetectorFactory, PROFILES_DIRECTORY
+from langdetect.lang_detect_exception import LangDetectException
+
+from app.utils.environment import config
 
 lang_map = {
     'en': 'English',
     'de': 'German'
 }
+DEFAULT_LANGUAGE = 'English'
 
 
 class LanguageDetector:
+    """
+    langdetect restricted to the languages we answer in. Only their profiles are loaded (once, at startup), the
+    random sampling is seeded, so the same text always gets the same language, and results are kept in a bounded
+    LRU cache.
+    """
+    # A chat message is decided long before this; longer texts only cost time
+    MAX_TEXT_LENGTH = 500
+
+    _factory: Optional[DetectorFactory] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def initialize(cls):
+        """Loads the language profiles. Called during bootstrap, otherwise on first use."""
+        with cls._lock:
+            if cls._factory is not None:
+                return
+            factory = DetectorFactory()
+            profiles = []
+            for code in lang_map:
+                with open(os.path.join(PROFILES_DIRECTORY, code), encoding='utf-8') as file:
+                    profiles.append(file.read())
+            factory.load_json_profile(profiles)
+            factory.set_seed(0)
+            cls._factory = factory
+            logging.info(f"Language detector initialized for {', '.join(lang_map)}")
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip()[:LanguageDetector.MAX_TEXT_LENGTH]
+
     @staticmethod
     def get_language(text):
+        if not text:
+            return DEFAULT_LANGUAGE
+        return _detect(LanguageDetector.normalize(text))
+
+    @classmethod
+    def get_probabilities(cls, text: str) -> Dict[str, float]:
+        """Probability per supported language, uncached (for evaluation)."""
+        cls.initialize()
+        detector = cls._factory.create()
+        detector.set_max_text_length(cls.MAX_TEXT_LENGTH)
+        detector.append(cls.normalize(text))
         try:
-            lang = detect(text)
-            return lang_map.get(lang, 'English')
-        except Exception as e:
-            return 'English'
+            return {lang_map[result.lang]: result.prob for result in detector.get_probabilities()}
+        except LangDetectException:
+            return {}
+
+    @classmethod
+    def detect(cls, text: str) -> str:
+        """Most probable supported language, uncached."""
+        probabilities = cls.get_probabilities(text)
+        # Text without any letters (numbers, emojis, URLs only) has no features to decide on
+        return max(probabilities, key=probabilities.get) if probabilities else DEFAULT_LANGUAGE
+
+    @staticmethod
+    def cache_info():
+        return _detect.cache_info()
+
+    @staticmethod
+    def cache_clear():
+        _detect.cache_clear()
+
+
+@lru_cache(maxsize=config.LANGUAGE_CACHE_SIZE)
+def _detect(text: str) -> str:
+    return LanguageDetector.detect(text)
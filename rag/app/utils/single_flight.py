@@ -0,0 +1,54 @@
+import asyncio
+import re
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.utils.metrics import metrics, stage_timer
+
+T = TypeVar("T")
+
+
+def normalize_question(question: str) -> str:
+    """Questions that differ only in case and whitespace are identical."""
+    return re.sub(r"\s+", " ", question).strip().casefold()
+
+
+class SingleFlight:
+    """
+    Lets concurrent identical requests share one computation: the first request (the leader) starts it, requests
+    with the same key that arrive while it is running wait for it and receive the same result or exception.
+
+    The computation runs as its own task, so it is not cancelled when the leader's client disconnects. It runs in
+    the leader's context, so its model usage and stage timings are booked to the leader; the other requests report
+    the time they waited as the stage "coalesced".
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, group: str, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        :param group: Name of the request type, for the metrics.
+        :param key: Identifies identical requests.
+        :param factory: Starts the computation.
+        """
+        if not self.enabled:
+            return await factory()
+        task = self._calls.get(key)
+        if task is not None:
+            metrics.increment("single_flight_total", group=group, role="follower")
+            with stage_timer("coalesced"):
+                return await asyncio.shield(task)
+
+        metrics.increment("single_flight_total", group=group, role="leader")
+        task = asyncio.ensure_future(factory())
+        self._calls[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Marks the exception as retrieved in case every waiting request was cancelled
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,233 @@
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.environment import config
+from app.utils.metrics import metrics, current_stage
+
+UNATTRIBUTED = "unattributed"
+
+
+@dataclass
+class UsageScope:
+    """Who a model call is billed to: the organisation and the API endpoint that triggered it."""
+    org_id: Optional[int] = None
+    endpoint: Optional[str] = None
+
+
+@dataclass
+class UsageRecord:
+    model: str
+    kind: str  # "completion" or "embedding"
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    seconds: float = 0.0
+    scope: Optional[UsageScope] = None
+    stage: Optional[str] = None
+
+
+@dataclass
+class UsageTotals:
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    seconds: float = 0.0
+    cost: float = 0.0
+    models: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, record: UsageRecord, cost: float):
+        self.calls += 1
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cached_tokens += record.cached_tokens
+        self.seconds += record.seconds
+        self.cost += cost
+        self.models[record.model] = self.models.get(record.model, 0) + 1
+
+    def merge(self, other: "UsageTotals"):
+        self.calls += other.calls
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.cached_tokens += other.cached_tokens
+        self.seconds += other.seconds
+        self.cost += other.cost
+        for model, calls in other.models.items():
+            self.models[model] = self.models.get(model, 0) + calls
+
+    def to_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "seconds": round(self.seconds, 3),
+            "cost": round(self.cost, 6),
+            "models": dict(self.models),
+        }
+
+
+_scope: ContextVar[Optional[UsageScope]] = ContextVar("usage_scope", default=None)
+# When set, records are collected here instead of being booked (see `capture_usage`)
+_capture: ContextVar[Optional[List[UsageRecord]]] = ContextVar("usage_capture", default=None)
+
+
+def load_prices(raw: Optional[str]) -> Dict[str, Dict[str, float]]:
+    """Parses MODEL_PRICES: {"<model>": {"prompt": .., "completion": .., "cached": ..}} in currency per 1M tokens."""
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        logging.error(f"Ignoring invalid MODEL_PRICES: {e}")
+        return {}
+
+
+class UsageLedger:
+    """Aggregates token usage and estimated cost per organisation, endpoint, pipeline stage and model."""
+
+    def __init__(self, prices: Optional[Dict[str, Dict[str, float]]] = None):
+        self.prices = prices or {}
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str, str, str], UsageTotals] = {}
+
+    def cost(self, record: UsageRecord) -> float:
+        price = self.prices.get(record.model)
+        if not price:
+            return 0.0
+        uncached = max(record.prompt_tokens - record.cached_tokens, 0)
+        cached_price = price.get("cached", price.get("prompt", 0.0))
+        return (uncached * price.get("prompt", 0.0)
+                + record.cached_tokens * cached_price
+                + record.completion_tokens * price.get("completion", 0.0)) / 1_000_000
+
+    def book(self, record: UsageRecord):
+        scope = record.scope or UsageScope()
+        org = str(scope.org_id) if scope.org_id is not None else UNATTRIBUTED
+        endpoint = scope.endpoint or UNATTRIBUTED
+        stage = record.stage or record.kind
+        cost = self.cost(record)
+        with self._lock:
+            key = (org, endpoint, stage, record.model)
+            totals = self._totals.get(key)
+            if totals is None:
+                totals = self._totals[key] = UsageTotals()
+            totals.add(record, cost)
+
+        metrics.increment("model_calls_total", model=record.model, stage=stage)
+        metrics.increment("model_tokens_total", record.prompt_tokens, model=record.model, stage=stage, type="prompt")
+        metrics.increment("model_tokens_total", record.completion_tokens, model=record.model, stage=stage,
+                          type="completion")
+        metrics.increment("model_tokens_total", record.cached_tokens, model=record.model, stage=stage, type="cached")
+        metrics.observe("model_call_seconds", record.seconds, model=record.model, kind=record.kind)
+
+    def snapshot(self) -> Dict:
+        """Returns the totals grouped by organisation, endpoint, stage and model, plus the raw combinations."""
+        with self._lock:
+            items = [(key, totals) for key, totals in self._totals.items()]
+
+        grouped: Dict[str, Dict[str, UsageTotals]] = {"by_org": {}, "by_endpoint": {}, "by_stage": {}, "by_model": {}}
+        overall = UsageTotals()
+        for (org, endpoint, stage, model), totals in items:
+            for group, name in (("by_org", org), ("by_endpoint", endpoint), ("by_stage", stage), ("by_model", model)):
+                grouped[group].setdefault(name, UsageTotals()).merge(totals)
+            overall.merge(totals)
+
+        return {
+            "total": overall.to_dict(),
+            **{group: {name: totals.to_dict() for name, totals in values.items()} for group, values in grouped.items()},
+            "entries": [
+                {"org_id": org, "endpoint": endpoint, "stage": stage, "model": model, **totals.to_dict()}
+                for (org, endpoint, stage, model), totals in items
+            ],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+usage_ledger = UsageLedger(prices=load_prices(config.MODEL_PRICES))
+
+
+@contextmanager
+def usage_scope(org_id: Optional[int] = None, endpoint: Optional[str] = None):
+    """Attributes all model calls made within the block (including awaited tasks and threads) to org and endpoint."""
+    token = _scope.set(UsageScope(org_id=org_id, endpoint=endpoint))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> Optional[UsageScope]:
+    return _scope.get()
+
+
+@contextmanager
+def capture_usage():
+    """Collects the records of the calls made within the block instead of booking them, so the caller can
+    apportion shared calls (e.g. one batched embedding request serving several requests)."""
+    records: List[UsageRecord] = []
+    token = _capture.set(records)
+    try:
+        yield records
+    finally:
+        _capture.reset(token)
+
+
+def apportion_usage(record: UsageRecord, shares: List[Tuple[float, Optional[UsageScope], Optional[str]]]):
+    """Books one shared provider call split across (weight, scope, stage) shares, proportionally to the weights."""
+    total_weight = sum(weight for weight, _, _ in shares) or 1.0
+    for weight, scope, stage in shares:
+        fraction = weight / total_weight
+        usage_ledger.book(UsageRecord(
+            model=record.model, kind=record.kind,
+            prompt_tokens=round(record.prompt_tokens * fraction),
+            completion_tokens=round(record.completion_tokens * fraction),
+            cached_tokens=round(record.cached_tokens * fraction),
+            seconds=record.seconds * fraction, scope=scope, stage=stage
+        ))
+
+
+def record_usage(model: str, kind: str, prompt_tokens: Optional[int] = 0, completion_tokens: Optional[int] = 0,
+                 cached_tokens: Optional[int] = 0, seconds: float = 0.0):
+    """Called by the model clients after every provider call."""
+    record = UsageRecord(model=model or "unknown", kind=kind, prompt_tokens=prompt_tokens or 0,
+                         completion_tokens=completion_tokens or 0, cached_tokens=cached_tokens or 0,
+                         seconds=seconds, scope=_scope.get(), stage=current_stage())
+    captured = _capture.get()
+    if captured is not None:
+        captured.append(record)
+    else:
+        usage_ledger.book(record)
+
+
+def record_openai_usage(model: str, kind: str, usage: Any, seconds: float):
+    """Books the `usage` block of an OpenAI-compatible response (chat completion or embedding)."""
+    if usage is None:
+        record_usage(model, kind, seconds=seconds)
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        cached = details.get("cached_tokens")
+    else:
+        cached = getattr(details, "cached_tokens", None)
+    record_usage(model, kind, prompt_tokens=getattr(usage, "prompt_tokens", 0),
+                 completion_tokens=getattr(usage, "completion_tokens", 0), cached_tokens=cached, seconds=seconds)
+
+
+def record_ollama_usage(model: str, kind: str, data: Dict, seconds: float):
+    """Books an Ollama response: prompt_eval_count/eval_count are the tokens, the *_duration fields are in ns."""
+    record_usage(model, kind, prompt_tokens=data.get("prompt_eval_count"), completion_tokens=data.get("eval_count"),
+                 seconds=seconds)
+    if data.get("load_duration"):
+        # Non-trivial load times mean the model was evicted from GPU memory between calls
+        metrics.observe("ollama_load_seconds", data["load_duration"] / 1e9, model=model)
+    if data.get("eval_count") and data.get("eval_duration"):
+        metrics.observe("ollama_tokens_per_second", data["eval_count"] / (data["eval_duration"] / 1e9), model=model)
@@ -0,0 +1,62 @@
+import random
+from collections import defaultdict
+from typing import List, Dict
+
+from testing.test_data_models.qa_data import QAData
+
+
+class Conversation:
+    def __init__(self, conversation_id: str, study_program: str, language: str, turns: List[QAData]):
+        """
+        A scripted multi-turn conversation. Each turn is a student question; the assistant messages in between
+        are filled in at run time with the answers returned by the server.
+
+        :param conversation_id: Identifier of the conversation within a benchmark run.
+        :param study_program: The study program all questions of the conversation belong to.
+        :param language: The language of the first question.
+        :param turns: The questions, in the order they are asked.
+        """
+        self.conversation_id = conversation_id
+        self.study_program = study_program
+        self.language = language
+        self.turns = turns
+
+    def __repr__(self):
+        return f"Conversation(id='{self.conversation_id}', study_program='{self.study_program}', turns={len(self.turns)})"
+
+
+class ConversationBuilder:
+    def __init__(self, qa_data: List[QAData], max_turns: int = 4, seed: int = 0):
+        """
+        Builds realistic conversations from the QA test data by chaining questions of the same study program.
+
+        :param qa_data: The loaded test questions.
+        :param max_turns: Maximum number of user turns per conversation.
+        :param seed: Seed for reproducible conversation lengths and ordering.
+        """
+        self.qa_data = qa_data
+        self.max_turns = max(1, max_turns)
+        self.random = random.Random(seed)
+
+    def build(self) -> List[Conversation]:
+        by_program: Dict[str, List[QAData]] = defaultdict(list)
+        for qa in self.qa_data:
+            by_program[qa.classification or "general"].append(qa)
+
+        conversations: List[Conversation] = []
+        for study_program, questions in by_program.items():
+            questions = list(questions)
+            self.random.shuffle(questions)
+            index = 0
+            while index < len(questions):
+                length = self.random.randint(1, self.max_turns)
+                turns = questions[index:index + length]
+                index += length
+                conversations.append(Conversation(
+                    conversation_id=f"conv-{len(conversations)}",
+                    study_program=study_program,
+                    language=turns[0].language,
+                    turns=turns,
+                ))
+        self.random.shuffle(conversations)
+        return conversations
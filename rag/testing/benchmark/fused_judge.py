@@ -0,0 +1,195 @@
+"""
+Compares the two-call /ask flow (answer, then LLM-as-a-judge) with the fused single structured call.
+
+For every QA item the same answer prompt is built once (the reference answer as context, plus unrelated answers as
+distractors; a share of the items only gets distractors so the model should decline) and sent through both flows
+against the configured model. The fused answer is also checked by the separate judge, so the report shows how
+often the self-assessed verdict agrees with the judge, how often both flows reach the same outcome (answered vs.
+"False"), and the latency of each flow.
+
+Examples (run from the rag folder, uses the model configured in the environment / .env):
+    python -m testing.benchmark.fused_judge --limit 50
+    USE_FAKE_BACKENDS=true python -m testing.benchmark.fused_judge --data test_data.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from testing.benchmark.report import latency_summary
+from testing.test_data_models.qa_data import QAData
+from testing.tests.test_data_loader import load_qa_data_from_json
+
+load_dotenv(os.path.join(os.path.dirname(__file__), "../testing.env"))
+
+# Import after loading the environment, the app reads its configuration on import
+from app.managers.request_handler import RequestHandler  # noqa: E402
+from app.models.model_loader import get_model  # noqa: E402
+from app.post_retrieval.response_evaluator import ResponseEvaluator  # noqa: E402
+from app.prompt.prompt_manager import PromptManager  # noqa: E402
+from app.prompt.text_formatter import TextFormatter  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "..", "results")
+
+
+class FusedJudgeBenchmark:
+    def __init__(self, qa_data: List[QAData], distractors: int = 3, unanswerable_share: float = 0.2,
+                 concurrency: int = 4, seed: int = 0):
+        """
+        :param qa_data: The QA items used as questions and contexts.
+        :param distractors: Number of unrelated answers added to the context of every question.
+        :param unanswerable_share: Share of questions whose reference answer is left out of the context.
+        :param concurrency: Number of items evaluated in parallel.
+        :param seed: Seed for the choice of distractors and unanswerable items.
+        """
+        self.qa_data = qa_data
+        self.distractors = distractors
+        self.unanswerable_share = unanswerable_share
+        self.concurrency = concurrency
+        self.seed = seed
+
+        self.model = get_model()
+        self.formatter = TextFormatter()
+        self.prompt_manager = PromptManager(formatter=self.formatter)
+        self.evaluator = ResponseEvaluator(model=self.model, prompt_manager=self.prompt_manager)
+        # Only used for its structured generation, retrieval is replaced by the synthetic contexts
+        self.request_handler = RequestHandler(weaviate_manager=None, reranker=None, formatter=self.formatter,
+                                              model=self.model, prompt_manager=self.prompt_manager,
+                                              response_evaluator=self.evaluator, fused_judge=True)
+
+    def build_context(self, index: int, rng: random.Random, answerable: bool) -> str:
+        others = [qa for position, qa in enumerate(self.qa_data) if position != index]
+        documents = rng.sample(others, min(self.distractors, len(others)))
+        if answerable:
+            documents.insert(rng.randint(0, len(documents)), self.qa_data[index])
+        return self.formatter.format_context([{"content": qa.answer} for qa in documents])
+
+    async def evaluate_item(self, index: int, answerable: bool, context: str) -> Dict:
+        qa = self.qa_data[index]
+        language = qa.language.lower()
+
+        # Two calls: answer, then the separate judge
+        messages = self.prompt_manager.create_messages(context, "", "", qa.question, language, qa.classification)
+        start = time.perf_counter()
+        two_call_answer = await self.model.acomplete(messages)
+        two_call_valid = two_call_answer != "False" and await self.evaluator.evaluate_response(
+            question=qa.question, response=two_call_answer, language=language)
+        two_call_ms = (time.perf_counter() - start) * 1000
+
+        # One structured call with the self-assessed verdict
+        messages = self.prompt_manager.create_fused_messages(context, "", "", qa.question, language,
+                                                             qa.classification)
+        start = time.perf_counter()
+        fused_answer, verdict = await self.request_handler.generate_fused(messages)
+        fused_ms = (time.perf_counter() - start) * 1000
+        fused_valid = fused_answer not in (None, "False") and verdict == "OK"
+
+        # The judge's opinion on the fused answer (not part of the timed flow); None if it could not be parsed
+        judge_on_fused: Optional[bool] = None
+        if fused_answer not in (None, "False"):
+            judge_on_fused = await self.evaluator.evaluate_response(question=qa.question, response=fused_answer,
+                                                                    language=language)
+
+        return {
+            "question": qa.question, "language": language, "answerable": answerable,
+            "two_call": {"answer": two_call_answer, "answered": two_call_valid, "latency_ms": two_call_ms},
+            "fused": {"answer": fused_answer, "verdict": verdict, "answered": fused_valid, "latency_ms": fused_ms},
+            "judge_on_fused": judge_on_fused,
+        }
+
+    async def run(self) -> Dict:
+        rng = random.Random(self.seed)
+        items = []
+        for index in range(len(self.qa_data)):
+            answerable = rng.random() >= self.unanswerable_share
+            items.append((index, answerable, self.build_context(index, rng, answerable)))
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def evaluate(item):
+            async with semaphore:
+                try:
+                    return await self.evaluate_item(*item)
+                except Exception as e:
+                    logging.error(f"Evaluating '{self.qa_data[item[0]].question}' failed: {e}")
+                    return None
+
+        results = [result for result in await asyncio.gather(*(evaluate(item) for item in items)) if result]
+        return self.summarize(results)
+
+    def summarize(self, results: List[Dict]) -> Dict:
+        judged = [result for result in results if result["judge_on_fused"] is not None]
+        verdict_agreement = [
+            (result["fused"]["verdict"] == "OK") == result["judge_on_fused"] for result in judged
+            if result["fused"]["verdict"] is not None
+        ]
+        outcome_agreement = [result["two_call"]["answered"] == result["fused"]["answered"] for result in results]
+
+        def rate(values: List[bool]) -> Optional[float]:
+            return sum(values) / len(values) if values else None
+
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "config": {"items": len(self.qa_data), "distractors": self.distractors,
+                       "unanswerable_share": self.unanswerable_share, "concurrency": self.concurrency,
+                       "seed": self.seed, "model": self.model.model},
+            "evaluated": len(results),
+            "verdict_agreement": rate(verdict_agreement),
+            "outcome_agreement": rate(outcome_agreement),
+            "parse_failures": sum(1 for result in results if result["fused"]["verdict"] is None),
+            "answered": {
+                "two_call": rate([result["two_call"]["answered"] for result in results]),
+                "fused": rate([result["fused"]["answered"] for result in results]),
+            },
+            "latency_ms": {
+                "two_call": latency_summary([result["two_call"]["latency_ms"] for result in results]),
+                "fused": latency_summary([result["fused"]["latency_ms"] for result in results]),
+            },
+            "results": results,
+        }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the fused answer+judge call with the two-call flow.")
+    parser.add_argument("--data", default="test_data.json", help="QA test data (relative to testing/tests)")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N items")
+    parser.add_argument("--distractors", type=int, default=3)
+    parser.add_argument("--unanswerable-share", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Output JSON path")
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    qa_data = load_qa_data_from_json(args.data)[:args.limit]
+    benchmark = FusedJudgeBenchmark(qa_data, distractors=args.distractors,
+                                    unanswerable_share=args.unanswerable_share, concurrency=args.concurrency,
+                                    seed=args.seed)
+    summary = asyncio.run(benchmark.run())
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"fused_judge_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(summary, file, indent=2, ensure_ascii=False)
+
+    for flow in ("two_call", "fused"):
+        latency = summary["latency_ms"][flow]
+        logging.info(f"[{flow}] answered {summary['answered'][flow]}, p50={latency['p50']} p95={latency['p95']} ms")
+    logging.info(f"Verdict agreement with the judge: {summary['verdict_agreement']}, outcome agreement: "
+                 f"{summary['outcome_agreement']}, parse failures: {summary['parse_failures']}")
+    logging.info(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Micro-benchmark of the language detection: plain langdetect (all profiles, unseeded) against the LanguageDetector
+(English and German profiles only, seeded, cached).
+
+The texts are the questions and answers of the QA data plus their first few words, since short chat messages are
+where detection is least certain. Reported are the profile load time, the latency per call (langdetect, detector
+cache miss and hit), how many texts get a different language when detected repeatedly, and the agreement with the
+language labels of the questions.
+
+Examples (run from the rag folder):
+    python -m testing.benchmark.language_detection
+    python -m testing.benchmark.language_detection --repeats 20 --prefix-words 2
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from dotenv import load_dotenv
+
+from testing.benchmark.report import latency_summary
+from testing.test_data_models.qa_data import QAData
+from testing.tests.test_data_loader import load_qa_data_from_json
+
+load_dotenv(os.path.join(os.path.dirname(__file__), "../testing.env"))
+
+# Import after loading the environment, the app reads its configuration on import
+import langdetect  # noqa: E402
+from app.utils.language_detector import LanguageDetector, lang_map  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "..", "results")
+
+
+def langdetect_language(text: str) -> str:
+    """The previous implementation."""
+    try:
+        return lang_map.get(langdetect.detect(text), 'English')
+    except Exception:
+        return 'English'
+
+
+class LanguageDetectionBenchmark:
+    def __init__(self, qa_data: List[QAData], repeats: int = 10, prefix_words: int = 3):
+        """
+        :param qa_data: The QA items whose questions and answers are detected.
+        :param repeats: How often every text is detected to check that the result is stable.
+        :param prefix_words: Number of leading words of each question used as an additional short text.
+        """
+        self.qa_data = qa_data
+        self.repeats = repeats
+        self.texts = ([qa.question for qa in qa_data] + [qa.answer for qa in qa_data]
+                      + [" ".join(qa.question.split()[:prefix_words]) for qa in qa_data])
+
+    @staticmethod
+    def timed(function: Callable[[], None]) -> float:
+        start = time.perf_counter()
+        function()
+        return (time.perf_counter() - start) * 1000
+
+    def latencies(self, detect: Callable[[str], str]) -> List[float]:
+        return [self.timed(lambda: detect(text)) for text in self.texts]
+
+    def unstable(self, detect: Callable[[str], str]) -> int:
+        """Number of texts that are not always assigned the same language."""
+        return sum(1 for text in self.texts if len({detect(text) for _ in range(self.repeats)}) > 1)
+
+    def accuracy(self, detect: Callable[[str], str]) -> float:
+        correct = sum(1 for qa in self.qa_data if detect(qa.question).lower() == qa.language.lower())
+        return correct / len(self.qa_data) if self.qa_data else None
+
+    def run(self) -> Dict:
+        load_ms = {
+            "langdetect": self.timed(lambda: langdetect_language("warm up")),
+            "detector": self.timed(LanguageDetector.initialize),
+        }
+        uncached = LanguageDetector.detect
+        # Fill the cache so that only hits are measured
+        for text in self.texts:
+            LanguageDetector.get_language(text)
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "config": {"texts": len(self.texts), "repeats": self.repeats},
+            "load_ms": load_ms,
+            "latency_ms": {
+                "langdetect": latency_summary(self.latencies(langdetect_language)),
+                "detector_miss": latency_summary(self.latencies(uncached)),
+                "detector_hit": latency_summary(self.latencies(LanguageDetector.get_language)),
+            },
+            "unstable_texts": {"langdetect": self.unstable(langdetect_language), "detector": self.unstable(uncached)},
+            "accuracy": {"langdetect": self.accuracy(langdetect_language), "detector": self.accuracy(uncached)},
+            "disagreements": [text for text in self.texts if langdetect_language(text) != uncached(text)],
+        }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare langdetect with the cached, seeded language detector.")
+    parser.add_argument("--data", default="test_data.json", help="QA test data (relative to testing/tests)")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N items")
+    parser.add_argument("--repeats", type=int, default=10, help="Detections per text for the stability check")
+    parser.add_argument("--prefix-words", type=int, default=3, help="Words of each question used as a short text")
+    parser.add_argument("--output", default=None, help="Output JSON path")
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    qa_data = load_qa_data_from_json(args.data)[:args.limit]
+    summary = LanguageDetectionBenchmark(qa_data, repeats=args.repeats, prefix_words=args.prefix_words).run()
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"language_detection_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(summary, file, indent=2, ensure_ascii=False)
+
+    for variant, latency in summary["latency_ms"].items():
+        logging.info(f"[{variant}] p50 {latency['p50']:.3f} ms, p99 {latency['p99']:.3f} ms")
+    logging.info(f"Profile load: {summary['load_ms']}, unstable texts: {summary['unstable_texts']}, "
+                 f"accuracy: {summary['accuracy']}, {len(summary['disagreements'])} disagreements")
+    logging.info(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Load test and latency benchmark for the question endpoints.
+
+Drives /api/v1/question/chat and /api/v1/question/ask with multi-turn conversations built from the QA test data,
+either closed-loop (fixed number of concurrent users) or open-loop (Poisson arrivals at a fixed rate), and stores
+throughput, latency percentiles, error rate and the per-stage breakdown (Server-Timing header) as JSON.
+
+Examples (run from the rag folder):
+    python -m testing.benchmark.load_test --base-url http://localhost:8000 --endpoint chat --concurrency 8 --duration 60
+    python -m testing.benchmark.load_test --endpoint both --rate 2 --duration 120 --seed-knowledge
+
+Against the offline stand-in backends, start the server with USE_FAKE_BACKENDS=true and pass --seed-knowledge so
+the in-memory store is filled with the test data before the run.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import List, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from testing.benchmark.conversations import Conversation, ConversationBuilder
+from testing.benchmark.report import BenchmarkReport, RequestResult, parse_server_timing, compare_reports
+from testing.test_data_models.qa_data import QAData
+from testing.tests.test_data_loader import load_qa_data_from_json
+
+load_dotenv(os.path.join(os.path.dirname(__file__), "../testing.env"))
+
+CHAT_PATH = "/api/v1/question/chat"
+ASK_PATH = "/api/v1/question/ask"
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "..", "results")
+
+
+class LoadTestRunner:
+    def __init__(self, base_url: str, api_key: str, conversations: List[Conversation], endpoint: str = "chat",
+                 concurrency: int = 4, rate: float = 0.0, duration_s: float = 60.0, max_requests: Optional[int] = None,
+                 org_id: int = 2, filter_by_org: bool = True, think_time_s: float = 0.0, timeout_s: float = 120.0,
+                 seed: int = 0, sessions: bool = False):
+        """
+        :param base_url: Base URL of the RAG service.
+        :param api_key: Value of the x-api-key header.
+        :param conversations: The scripted conversations to replay (cycled if the run outlasts them).
+        :param endpoint: "chat", "ask" or "both" (conversations alternate between the endpoints).
+        :param concurrency: Maximum number of conversations in flight.
+        :param rate: Conversation arrivals per second (Poisson). 0 runs closed-loop with `concurrency` users.
+        :param duration_s: Stop starting new conversations after this many seconds.
+        :param max_requests: Optional cap on the number of requests sent.
+        :param org_id: Organisation ID used for all requests.
+        :param filter_by_org: Value of the filterByOrg query parameter for /chat.
+        :param think_time_s: Pause between the turns of a conversation.
+        :param timeout_s: Per-request client timeout.
+        :param seed: Seed for arrivals and endpoint selection.
+        :param sessions: Send a conversationId with every /chat turn so the server keeps the conversation.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"x-api-key": api_key or "", "Content-Type": "application/json"}
+        self.conversations = conversations
+        self.endpoint = endpoint
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.duration_s = duration_s
+        self.max_requests = max_requests
+        self.org_id = org_id
+        self.filter_by_org = filter_by_org
+        self.think_time_s = think_time_s
+        self.timeout_s = timeout_s
+        self.random = random.Random(seed)
+        self.sessions = sessions
+        self.results: List[RequestResult] = []
+        self._sent = 0
+        self._deadline = 0.0
+
+    def _budget_left(self) -> bool:
+        if time.monotonic() >= self._deadline:
+            return False
+        return self.max_requests is None or self._sent < self.max_requests
+
+    async def _post(self, client: httpx.AsyncClient, endpoint: str, path: str, payload: Dict,
+                    params: Optional[Dict] = None, turn: int = 1) -> Optional[Dict]:
+        self._sent += 1
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            response = await client.post(path, json=payload, params=params, headers=self.headers)
+            latency_ms = (time.perf_counter() - start) * 1000.0
+            self.results.append(RequestResult(
+                endpoint=endpoint, started_at=started_at, latency_ms=latency_ms, status_code=response.status_code,
+                stages=parse_server_timing(response.headers.get("server-timing")), turn=turn,
+            ))
+            if response.status_code == 200:
+                return response.json()
+        except Exception as e:
+            latency_ms = (time.perf_counter() - start) * 1000.0
+            self.results.append(RequestResult(endpoint=endpoint, started_at=started_at, latency_ms=latency_ms,
+                                              status_code=None, error=type(e).__name__, turn=turn))
+        return None
+
+    async def run_conversation(self, client: httpx.AsyncClient, conversation: Conversation, endpoint: str):
+        messages: List[Dict] = []
+        conversation_id = uuid.uuid4().hex
+        for turn, qa in enumerate(conversation.turns, start=1):
+            if not self._budget_left():
+                return
+            if endpoint == "ask":
+                await self._post(client, "ask", ASK_PATH, {
+                    "message": qa.question,
+                    "study_program": qa.classification or "general",
+                    "language": qa.language,
+                    "org_id": self.org_id,
+                }, turn=turn)
+            else:
+                messages.append({"message": qa.question, "type": "user"})
+                payload = {"messages": messages, "study_program": qa.classification, "orgId": self.org_id}
+                if self.sessions:
+                    payload["conversationId"] = conversation_id
+                body = await self._post(client, "chat", CHAT_PATH, payload, params={"filterByOrg": str(self.filter_by_org).lower()}, turn=turn)
+                answer = body.get("answer") if body else None
+                messages.append({"message": answer or qa.answer, "type": "assistant"})
+            if self.think_time_s:
+                await asyncio.sleep(self.think_time_s)
+
+    def _next_endpoint(self) -> str:
+        if self.endpoint == "both":
+            return self.random.choice(["chat", "ask"])
+        return self.endpoint
+
+    async def _closed_loop(self, client: httpx.AsyncClient):
+        index = 0
+
+        async def user():
+            nonlocal index
+            while self._budget_left():
+                conversation = self.conversations[index % len(self.conversations)]
+                index += 1
+                await self.run_conversation(client, conversation, self._next_endpoint())
+
+        await asyncio.gather(*(user() for _ in range(self.concurrency)))
+
+    async def _open_loop(self, client: httpx.AsyncClient):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = []
+        index = 0
+
+        async def start(conversation: Conversation, endpoint: str):
+            async with semaphore:
+                await self.run_conversation(client, conversation, endpoint)
+
+        while self._budget_left():
+            conversation = self.conversations[index % len(self.conversations)]
+            index += 1
+            tasks.append(asyncio.create_task(start(conversation, self._next_endpoint())))
+            await asyncio.sleep(self.random.expovariate(self.rate))
+        await asyncio.gather(*tasks)
+
+    async def seed_knowledge(self, client: httpx.AsyncClient, qa_data: List[QAData]):
+        """Loads the test data as documents and sample questions, e.g. into the in-memory store."""
+        websites = [{
+            "id": f"bench-doc-{i}", "orgId": self.org_id, "title": qa.question[:80], "link": f"https://bench.local/{i}",
+            "studyPrograms": [] if (qa.classification or "general") == "general" else [qa.classification],
+            "content": qa.answer, "type": "CIT",
+        } for i, qa in enumerate(qa_data)]
+        sample_questions = [{
+            "id": f"bench-sq-{i}", "orgId": self.org_id, "question": qa.question, "answer": qa.answer,
+            "topic": qa.classification or "general", "studyPrograms": [],
+        } for i, qa in enumerate(qa_data[::2])]
+        for path, payload in (("/api/knowledge/website/addBatch", websites),
+                              ("/api/knowledge/sample-question/addBatch", sample_questions)):
+            response = await client.post(path, json=payload, headers=self.headers)
+            logging.info(f"Seeded {len(payload)} items via {path}: {response.status_code}")
+
+    async def run(self, seed_data: Optional[List[QAData]] = None, client: Optional[httpx.AsyncClient] = None) -> BenchmarkReport:
+        limits = httpx.Limits(max_connections=self.concurrency * 2, max_keepalive_connections=self.concurrency * 2)
+        own_client = client is None
+        client = client or httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout_s, limits=limits)
+        try:
+            if seed_data:
+                await self.seed_knowledge(client, seed_data)
+            self.results = []
+            self._sent = 0
+            start = time.monotonic()
+            self._deadline = start + self.duration_s
+            if self.rate > 0:
+                await self._open_loop(client)
+            else:
+                await self._closed_loop(client)
+            wall_time_s = time.monotonic() - start
+        finally:
+            if own_client:
+                await client.aclose()
+        return BenchmarkReport(config=self.describe(), results=self.results, wall_time_s=wall_time_s)
+
+    def describe(self) -> Dict:
+        return {
+            "base_url": self.base_url, "endpoint": self.endpoint, "concurrency": self.concurrency,
+            "rate": self.rate, "duration_s": self.duration_s, "max_requests": self.max_requests,
+            "org_id": self.org_id, "filter_by_org": self.filter_by_org, "think_time_s": self.think_time_s,
+            "conversations": len(self.conversations), "sessions": self.sessions,
+        }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the RAG question endpoints.")
+    parser.add_argument("--base-url", default=os.getenv("BENCHMARK_URL", "http://localhost:8000"))
+    parser.add_argument("--api-key", default=os.getenv("TEST_API_KEY"))
+    parser.add_argument("--data", default="test_data.json", help="QA test data (relative to testing/tests)")
+    parser.add_argument("--endpoint", choices=["chat", "ask", "both"], default="chat")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0.0, help="Conversation arrivals per second, 0 = closed loop")
+    parser.add_argument("--duration", type=float, default=60.0, help="Run duration in seconds")
+    parser.add_argument("--max-requests", type=int, default=None)
+    parser.add_argument("--max-turns", type=int, default=4)
+    parser.add_argument("--think-time", type=float, default=0.0)
+    parser.add_argument("--org-id", type=int, default=2)
+    parser.add_argument("--no-filter-by-org", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sessions", action="store_true", help="Send a conversationId with the chat turns")
+    parser.add_argument("--seed-knowledge", action="store_true", help="Add the test data to the knowledge base first")
+    parser.add_argument("--label", default="run", help="Label used in the output file name")
+    parser.add_argument("--output", default=None, help="Output JSON path")
+    parser.add_argument("--baseline", default=None, help="Saved report to compare against")
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    qa_data = load_qa_data_from_json(args.data)
+    conversations = ConversationBuilder(qa_data, max_turns=args.max_turns, seed=args.seed).build()
+    runner = LoadTestRunner(
+        base_url=args.base_url, api_key=args.api_key, conversations=conversations, endpoint=args.endpoint,
+        concurrency=args.concurrency, rate=args.rate, duration_s=args.duration, max_requests=args.max_requests,
+        org_id=args.org_id, filter_by_org=not args.no_filter_by_org, think_time_s=args.think_time, seed=args.seed,
+        sessions=args.sessions,
+    )
+    report = asyncio.run(runner.run(seed_data=qa_data if args.seed_knowledge else None))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"benchmark_{args.label}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json")
+    report.save(output)
+    summary = report.to_dict()
+    for endpoint, stats in summary["endpoints"].items():
+        latency = stats["latency_ms"]
+        logging.info(f"[{endpoint}] {stats['requests']} requests, {stats['throughput_rps']:.2f} req/s, "
+                     f"p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} ms, "
+                     f"error rate {stats['error_rate']:.2%}")
+    logging.info(f"Results saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            for line in compare_reports(json.load(file), summary):
+                logging.info(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import json
+import os
+from collections import defaultdict
+from typing import List, Dict, Optional
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def latency_summary(values: List[float]) -> Dict:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Parses a Server-Timing header ("stage;dur=12.3, other;dur=4.5") into {stage: milliseconds}."""
+    timings: Dict[str, float] = {}
+    if not header:
+        return timings
+    for entry in header.split(","):
+        parts = [part.strip() for part in entry.split(";")]
+        for part in parts[1:]:
+            if part.startswith("dur="):
+                try:
+                    timings[parts[0]] = float(part[4:])
+                except ValueError:
+                    pass
+    return timings
+
+
+class RequestResult:
+    def __init__(self, endpoint: str, started_at: float, latency_ms: float, status_code: Optional[int],
+                 error: Optional[str] = None, stages: Optional[Dict[str, float]] = None, turn: int = 1):
+        self.endpoint = endpoint
+        self.started_at = started_at
+        self.latency_ms = latency_ms
+        self.status_code = status_code
+        self.error = error
+        self.stages = stages or {}
+        self.turn = turn
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status_code == 200
+
+
+class BenchmarkReport:
+    def __init__(self, config: Dict, results: List[RequestResult], wall_time_s: float):
+        """
+        Aggregates the raw request results of a benchmark run.
+
+        :param config: The benchmark configuration, stored alongside the results for comparison.
+        :param results: All request results of the run.
+        :param wall_time_s: Duration of the run in seconds.
+        """
+        self.config = config
+        self.results = results
+        self.wall_time_s = wall_time_s
+
+    def summarize(self, results: List[RequestResult]) -> Dict:
+        ok = [r for r in results if r.ok]
+        stage_values: Dict[str, List[float]] = defaultdict(list)
+        for result in ok:
+            for stage, duration in result.stages.items():
+                stage_values[stage].append(duration)
+        errors: Dict[str, int] = defaultdict(int)
+        for result in results:
+            if not result.ok:
+                errors[result.error or f"HTTP {result.status_code}"] += 1
+        return {
+            "requests": len(results),
+            "successful": len(ok),
+            "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+            "throughput_rps": len(ok) / self.wall_time_s if self.wall_time_s else 0.0,
+            "latency_ms": latency_summary([r.latency_ms for r in ok]),
+            "stages_ms": {stage: latency_summary(values) for stage, values in sorted(stage_values.items())},
+            "errors": dict(errors),
+        }
+
+    def to_dict(self) -> Dict:
+        by_endpoint: Dict[str, List[RequestResult]] = defaultdict(list)
+        for result in self.results:
+            by_endpoint[result.endpoint].append(result)
+        return {
+            "config": self.config,
+            "wall_time_s": self.wall_time_s,
+            "overall": self.summarize(self.results),
+            "endpoints": {endpoint: self.summarize(results) for endpoint, results in by_endpoint.items()},
+        }
+
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, indent=2)
+        return path
+
+
+def compare_reports(baseline: Dict, current: Dict) -> List[str]:
+    """Returns human-readable deltas of the headline metrics between two saved reports."""
+    lines = []
+    for endpoint, summary in current.get("endpoints", {}).items():
+        base = baseline.get("endpoints", {}).get(endpoint)
+        if not base:
+            continue
+        for key in ("p50", "p95", "p99"):
+            old, new = base["latency_ms"].get(key), summary["latency_ms"].get(key)
+            if old and new:
+                lines.append(f"{endpoint} {key}: {old:.1f} ms -> {new:.1f} ms ({(new - old) / old * 100:+.1f}%)")
+        lines.append(f"{endpoint} throughput: {base['throughput_rps']:.2f} -> {summary['throughput_rps']:.2f} req/s")
+        lines.append(f"{endpoint} error rate: {base['error_rate']:.2%} -> {summary['error_rate']:.2%}")
+    return lines
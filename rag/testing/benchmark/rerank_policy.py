@@ -0,0 +1,176 @@
+"""
+Retrieval evaluation of the rerank policy: how often it skips the reranker and what that costs in ranking quality.
+
+Every answer of the QA data is indexed as a document in an in-memory store (embedded with the configured model).
+For each question the nearest documents are retrieved and ranked twice: always by the reranker, and as the
+RequestHandler does with the rerank policy (by vector distance when the policy skips the reranker). Both rankings
+are filtered by the general relevance threshold and compared by whether the question's own answer is kept and at
+which rank (hit@1, hit@k, MRR). The distances of the relevant and the nearest irrelevant documents are reported
+as well, to calibrate RERANK_SKIP_MAX_DISTANCE and RERANK_SKIP_GAP.
+
+Examples (run from the rag folder, uses the model and reranker configured in the environment / .env):
+    python -m testing.benchmark.rerank_policy --limit 100
+    USE_FAKE_BACKENDS=true python -m testing.benchmark.rerank_policy --max-distance 0.3 --gap 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from testing.benchmark.report import latency_summary, percentile
+from testing.test_data_models.qa_data import QAData
+from testing.tests.test_data_loader import load_qa_data_from_json
+
+load_dotenv(os.path.join(os.path.dirname(__file__), "../testing.env"))
+
+# Import after loading the environment, the app reads its configuration on import
+from app.data.database_requests import DatabaseDocument  # noqa: E402
+from app.managers.in_memory_manager import InMemoryWeaviateManager  # noqa: E402
+from app.managers.request_handler import RequestHandler  # noqa: E402
+from app.models.model_loader import get_model  # noqa: E402
+from app.post_retrieval.rerank_policy import RerankPolicy  # noqa: E402
+from app.utils.dependencies import create_reranker  # noqa: E402
+from app.utils.environment import config  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "..", "results")
+ORG_ID = 1
+
+
+class RerankPolicyEvaluation:
+    def __init__(self, qa_data: List[QAData], policy: RerankPolicy, limit: int = 10):
+        """
+        :param qa_data: The QA items used as questions and documents.
+        :param policy: The rerank policy to evaluate (enabled).
+        :param limit: Number of documents retrieved per question.
+        """
+        self.qa_data = qa_data
+        self.policy = policy
+        self.limit = limit
+
+        self.model = get_model()
+        self.reranker = create_reranker(self.model)
+        self.store = InMemoryWeaviateManager(embedding_model=self.model, reranker=self.reranker)
+
+    def seed(self):
+        self.store.add_documents([
+            DatabaseDocument(id=f"eval-doc-{i}", study_programs=["general"], content=qa.answer, org_id=ORG_ID)
+            for i, qa in enumerate(self.qa_data)
+        ])
+
+    @staticmethod
+    def kept_ranking(contexts: List[Dict], results: List[Dict]) -> List[str]:
+        """Contents in ranked order that pass the general relevance threshold, like the RequestHandler keeps them."""
+        kept = [contexts[result['index']]['content'] for result in results
+                if result['relevance_score'] >= RequestHandler.GEN_THRESH]
+        return list(dict.fromkeys(kept))[:RequestHandler.MAX_GENERAL]
+
+    async def evaluate_item(self, qa: QAData) -> Dict:
+        embedding = await self.model.aembed(qa.question)
+        contexts = self.store.get_relevant_context(embedding, "general", ORG_ID, limit=self.limit)
+        distances = [x['distance'] for x in contexts]
+
+        start = time.perf_counter()
+        reranked = await self.reranker.arerank_with_cohere(context_list=[x['content'] for x in contexts],
+                                                           query=qa.question, language=qa.language.lower(),
+                                                           top_n=len(contexts))
+        rerank_ms = (time.perf_counter() - start) * 1000
+
+        skip_reason = self.policy.skip_reason(distances)
+        policy_results = self.policy.score(distances) if skip_reason else reranked
+
+        relevant = [x['distance'] for x in contexts if x['content'] == qa.answer]
+        irrelevant = [x['distance'] for x in contexts if x['content'] != qa.answer]
+        return {
+            "question": qa.question,
+            "candidates": len(contexts),
+            "skip_reason": skip_reason,
+            "rerank_ms": rerank_ms,
+            "relevant_distance": relevant[0] if relevant else None,
+            "nearest_irrelevant_distance": min(irrelevant) if irrelevant else None,
+            "always": self.rank_of(qa.answer, self.kept_ranking(contexts, reranked)),
+            "policy": self.rank_of(qa.answer, self.kept_ranking(contexts, policy_results)),
+        }
+
+    @staticmethod
+    def rank_of(answer: str, ranking: List[str]) -> Optional[int]:
+        return ranking.index(answer) + 1 if answer in ranking else None
+
+    async def run(self) -> Dict:
+        self.seed()
+        results = [await self.evaluate_item(qa) for qa in self.qa_data]
+        return self.summarize(results)
+
+    def summarize(self, results: List[Dict]) -> Dict:
+        def quality(variant: str) -> Dict:
+            ranks = [result[variant] for result in results]
+            return {
+                "hit@1": sum(1 for rank in ranks if rank == 1) / len(ranks) if ranks else None,
+                f"hit@{RequestHandler.MAX_GENERAL}": sum(1 for rank in ranks if rank) / len(ranks) if ranks else None,
+                "mrr": sum(1 / rank for rank in ranks if rank) / len(ranks) if ranks else None,
+            }
+
+        skipped = [result for result in results if result["skip_reason"]]
+        relevant = [result["relevant_distance"] for result in results if result["relevant_distance"] is not None]
+        irrelevant = [result["nearest_irrelevant_distance"] for result in results
+                      if result["nearest_irrelevant_distance"] is not None]
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "config": {"items": len(self.qa_data), "limit": self.limit, "model": self.model.embed_model,
+                       "max_candidates": self.policy.max_candidates, "max_distance": self.policy.max_distance,
+                       "gap": self.policy.gap},
+            "skip_rate": len(skipped) / len(results) if results else None,
+            "skip_reasons": {reason: sum(1 for result in skipped if result["skip_reason"] == reason)
+                             for reason in ("few_candidates", "no_match", "clear_gap")},
+            "quality": {"always_rerank": quality("always"), "policy": quality("policy")},
+            "changed_outcomes": sum(1 for result in results if result["always"] != result["policy"]),
+            "saved_rerank_ms": sum(result["rerank_ms"] for result in skipped),
+            "rerank_ms": latency_summary([result["rerank_ms"] for result in results]),
+            "calibration": {
+                "relevant_distance": {"p50": percentile(relevant, 50), "p90": percentile(relevant, 90)},
+                "nearest_irrelevant_distance": {"p10": percentile(irrelevant, 10), "p50": percentile(irrelevant, 50)},
+            },
+            "results": results,
+        }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate the skip-rerank policy on the retrieval test data.")
+    parser.add_argument("--data", default="test_data.json", help="QA test data (relative to testing/tests)")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N items")
+    parser.add_argument("--retrieve", type=int, default=10, help="Documents retrieved per question")
+    parser.add_argument("--max-candidates", type=int, default=config.RERANK_SKIP_MAX_CANDIDATES)
+    parser.add_argument("--max-distance", type=float, default=config.RERANK_SKIP_MAX_DISTANCE)
+    parser.add_argument("--gap", type=float, default=config.RERANK_SKIP_GAP)
+    parser.add_argument("--output", default=None, help="Output JSON path")
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    qa_data = load_qa_data_from_json(args.data)[:args.limit]
+    policy = RerankPolicy(enabled=True, max_candidates=args.max_candidates, max_distance=args.max_distance,
+                          gap=args.gap)
+    summary = asyncio.run(RerankPolicyEvaluation(qa_data, policy, limit=args.retrieve).run())
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"rerank_policy_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(summary, file, indent=2, ensure_ascii=False)
+
+    for variant, quality in summary["quality"].items():
+        logging.info(f"[{variant}] {quality}")
+    logging.info(f"Skipped {summary['skip_rate']} of the reranks ({summary['skip_reasons']}), "
+                 f"{summary['changed_outcomes']} changed outcomes, calibration: {summary['calibration']}")
+    logging.info(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
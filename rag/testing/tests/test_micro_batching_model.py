@@ -0,0 +1,54 @@
+import asyncio
+from typing import List
+
+from app.models.base_model import BaseModelClient
+from app.models.micro_batching_model import MicroBatchingModel
+
+
+class BatchRecorder(BaseModelClient):
+    """Embeds every text as its length and records the batches it was called with."""
+    batches: List[List[str]] = []
+    fail: bool = False
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        self.batches.append(list(texts))
+        if self.fail:
+            raise ConnectionError("provider down")
+        return [[float(len(text))] for text in texts]
+
+
+def batching_model(fail: bool = False) -> MicroBatchingModel:
+    return MicroBatchingModel(client=BatchRecorder(model="m", embed_model="e", fail=fail), max_wait_ms=50)
+
+
+def test_cancelled_caller_does_not_block_its_batch():
+    model = batching_model()
+
+    async def run():
+        cancelled = asyncio.ensure_future(model.aembed("cancelled"))
+        other = asyncio.ensure_future(model.aembed("other"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await asyncio.wait_for(other, 2)
+
+    assert asyncio.run(run()) == [5.0]
+    assert model.embed("sync") == [4.0]
+    assert model.client.batches[0] == ["cancelled", "other"]
+    model.close_session()
+
+
+def test_cancelled_caller_does_not_block_a_failed_batch():
+    model = batching_model(fail=True)
+
+    async def run():
+        cancelled = asyncio.ensure_future(model.aembed("cancelled"))
+        other = asyncio.ensure_future(model.aembed("other"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        try:
+            await asyncio.wait_for(other, 2)
+        except ConnectionError as e:
+            return e
+
+    assert isinstance(asyncio.run(run()), ConnectionError)
+    model.close_session()